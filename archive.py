@@ -0,0 +1,327 @@
+"""
+Модуль archive
+
+Архивный режим для выбранных поддеревьев (archive_paths), например резервных копий
+исходников с тысячами мелких текстовых файлов. Вместо отдельной загрузки каждого файла
+(запрос URL и PUT на файл) мелкие файлы упаковываются в сжатые пачки tar.gz, а крупные
+сжимаются gzip на лету во время загрузки. В облаке поддерево хранится в папке
+`.fsarchive/<поддерево>/`:
+- bundle-<id>.tar.gz — пачки мелких файлов до BUNDLE_SIZE байт до сжатия,
+- blob-<id>.gz — крупный файл, сжатый на лету (blob-<id> — плохо сжимаемый, как есть),
+- index.json.gz — индекс: путь → объект, размер, mtime.
+
+Тот же индекс хранится в снимке состояния; по нему находятся новые, изменённые
+и удалённые файлы, а list_files и restore работают с облачной копией индекса.
+Новая версия файла попадает в новый объект; пачка, в которой живых данных осталось
+меньше REPACK_RATIO, переупаковывается вместе с изменениями, а объекты без живых
+файлов удаляются после загрузки индекса.
+"""
+
+import gzip
+import json
+import logging
+import os
+import tarfile
+import tempfile
+import time
+import uuid
+import zlib
+
+# Папка архивов в облаке; её содержимое не синхронизируется как обычные файлы
+ARCHIVE_ROOT = ".fsarchive"
+INDEX_NAME = "index.json.gz"
+# Предельный объём пачки мелких файлов до сжатия
+BUNDLE_SIZE = 64 * 1024 * 1024
+# Файлы от этого размера загружаются отдельными объектами со сжатием на лету
+LARGE_FILE = 8 * 1024 * 1024
+# Пачка, где живых данных меньше этой доли, переупаковывается
+REPACK_RATIO = 0.5
+# Крупный файл сжимается, если пробный фрагмент сжимается хотя бы до этой доли
+MIN_RATIO = 0.9
+SAMPLE_SIZE = 256 * 1024
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class ArchiveSet():
+    """
+    Набор поддеревьев, синхронизируемых в архивном режиме.
+
+    :param Iterable[str] prefixes: пути каталогов относительно папки синхронизации, через '/';
+                                   вложенные поддеревья относятся к ближайшему из них
+    """
+
+    def __init__(self, prefixes=()):
+        self.prefixes = tuple(sorted({p.strip().strip("/") for p in prefixes if p.strip().strip("/")}))
+
+    def __bool__(self):
+        return bool(self.prefixes)
+
+    def prefix_of(self, rel):
+        """
+        Возвращает поддерево, к которому относится путь.
+
+        :param str rel: относительный путь через '/'
+        :return: префикс поддерева или None
+        :rtype: Optional[str]
+        """
+        best = None
+        for prefix in self.prefixes:
+            if (rel == prefix or rel.startswith(prefix + "/")) and (best is None or len(prefix) > len(best)):
+                best = prefix
+        return best
+
+    def covers(self, rel):
+        """Проверяет, относится ли путь к архивному поддереву."""
+        return self.prefix_of(rel) is not None
+
+    def excludes_remote(self, rel):
+        """
+        Проверяет, нужно ли пропустить путь облачного листинга: служебная папка архивов
+        и прежние (до включения архивного режима) копии файлов поддеревьев.
+
+        :param str rel: путь относительно облачной папки
+        :rtype: bool
+        """
+        return rel == ARCHIVE_ROOT or rel.startswith(ARCHIVE_ROOT + "/") or self.covers(rel)
+
+
+class _GzipStream():
+    """Сжимает файл в формат gzip блоками при переборе; каждый перебор начинается сначала."""
+
+    def __init__(self, path, level=6):
+        self._path = path
+        self._level = level
+
+    def __iter__(self):
+        compressor = zlib.compressobj(self._level, zlib.DEFLATED, 31)
+        with open(self._path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                yield compressor.compress(chunk)
+        yield compressor.flush()
+
+
+def _remote_dir(prefix):
+    return f"{ARCHIVE_ROOT}/{prefix}"
+
+
+def _object_id():
+    return f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def _compressible(path):
+    """Проверяет по пробному фрагменту, стоит ли сжимать файл."""
+    with open(path, "rb") as f:
+        sample = f.read(SAMPLE_SIZE)
+    return bool(sample) and len(zlib.compress(sample, 1)) < len(sample) * MIN_RATIO
+
+
+def _batches(paths, files):
+    """Делит пути на пачки не больше BUNDLE_SIZE байт до сжатия."""
+    batch, size = [], 0
+    for path in paths:
+        if batch and size + files[path].size > BUNDLE_SIZE:
+            yield batch
+            batch, size = [], 0
+        batch.append(path)
+        size += files[path].size
+    if batch:
+        yield batch
+
+
+def _put_bundle(client, local_folder, remote_path, paths):
+    """
+    Упаковывает файлы в tar.gz во временный файл и загружает его.
+
+    :return: список упакованных путей (пропавшие во время упаковки пропускаются) или None,
+             если загрузка не удалась
+    :rtype: Optional[List[str]]
+    """
+    fd, tmp_path = tempfile.mkstemp(prefix=".fsarchive-", suffix=".tar.gz")
+    os.close(fd)
+    packed = []
+    try:
+        with tarfile.open(tmp_path, "w:gz", compresslevel=6) as tar:
+            for path in paths:
+                try:
+                    tar.add(os.path.join(local_folder, path), arcname=path, recursive=False)
+                except OSError as exc:
+                    logging.warning(f"Файл {path} не добавлен в архив: {exc}")
+                    continue
+                packed.append(path)
+        if not client.load(tmp_path, remote_path):
+            return None
+    finally:
+        os.remove(tmp_path)
+    return packed
+
+
+def sync_archives(client, local_folder, archives, files, state):
+    """
+    Синхронизирует архивные поддеревья по локальному индексу в снимке состояния.
+
+    :param client: Yandex_disc (методы mkdir, load, put_stream, delete, list_names)
+    :param str local_folder: абсолютный путь к локальной папке синхронизации
+    :param ArchiveSet archives: архивные поддеревья
+    :param files: отображение путь → FileStat для всех локальных файлов этих поддеревьев
+    :param state: SyncState; в нём хранятся индексы и строки файлов (для пропуска
+                  запроса к облаку, когда ничего не изменилось)
+    :return: список кортежей (action, path, ok, error) по загруженным и удалённым объектам
+    :rtype: List[tuple]
+    """
+    trees = {prefix: {} for prefix in archives.prefixes}
+    for path, file_stat in files.items():
+        trees[archives.prefix_of(path)][path] = file_stat
+    results = []
+    for prefix, tree in trees.items():
+        results.extend(_sync_tree(client, local_folder, prefix, tree, state))
+    return results
+
+
+def _sync_tree(client, local_folder, prefix, tree, state):
+    """Синхронизирует одно архивное поддерево; см. sync_archives."""
+    index = state.get_archive(prefix) or {"files": {}, "objects": {}}
+    entries, objects = index["files"], index["objects"]
+    changed = {path for path, st in tree.items() if entries.get(path, [None])[1:] != [st.size, st.mtime_ns]}
+    gone = [path for path in entries if path not in tree]
+    if not changed and not gone:
+        return []
+    for path in gone:
+        del entries[path]
+
+    live = {}
+    for path, (name, size, _) in entries.items():
+        if path not in changed:
+            live[name] = live.get(name, 0) + size
+    repack = {name for name, total in objects.items()
+              if name.startswith("bundle-") and 0 < live.get(name, 0) < total * REPACK_RATIO}
+    pack = sorted(changed | {path for path, entry in entries.items() if entry[0] in repack})
+
+    remote = _remote_dir(prefix)
+    if not objects:
+        parts = remote.split("/")
+        for depth in range(1, len(parts) + 1):
+            client.mkdir("/".join(parts[:depth]))
+
+    results, archived = [], []
+    small = [path for path in pack if tree[path].size < LARGE_FILE]
+    for batch in _batches(small, tree):
+        name = f"bundle-{_object_id()}.tar.gz"
+        packed = _put_bundle(client, local_folder, f"{remote}/{name}", batch)
+        results.append(("archive", f"{remote}/{name}", packed is not None,
+                        None if packed is not None else "пачка не загружена"))
+        if packed is not None:
+            objects[name] = sum(tree[path].size for path in packed)
+            archived.extend((path, name) for path in packed)
+    for path in pack:
+        if tree[path].size < LARGE_FILE:
+            continue
+        full = os.path.join(local_folder, path)
+        try:
+            if _compressible(full):
+                name = f"blob-{_object_id()}.gz"
+                ok = client.put_stream(f"{remote}/{name}", _GzipStream(full)) is not None
+            else:
+                name = f"blob-{_object_id()}"
+                ok = client.load(full, f"{remote}/{name}")
+        except OSError as exc:
+            logging.warning(f"Файл {path} не загружен в архив: {exc}")
+            continue
+        results.append(("archive", f"{remote}/{name}", ok, None if ok else "файл не загружен"))
+        if ok:
+            objects[name] = tree[path].size
+            archived.append((path, name))
+
+    for path, name in archived:
+        entries[path] = [name, tree[path].size, tree[path].mtime_ns]
+    referenced = {entry[0] for entry in entries.values()}
+    index["objects"] = {name: size for name, size in objects.items() if name in referenced}
+
+    # Индекс загружается после объектов: облачная копия не ссылается на незагруженное
+    data = gzip.compress(json.dumps(index, ensure_ascii=False).encode("utf-8"))
+    if client.put_stream(f"{remote}/{INDEX_NAME}", [data]) is None:
+        results.append(("archive", f"{remote}/{INDEX_NAME}", False, "индекс не загружен"))
+        return results
+    state.save_archive(prefix, index)
+    state.update(((path, tree[path], None, None) for path, _ in archived), gone)
+
+    for name in client.list_names(remote):
+        if name != INDEX_NAME and name not in index["objects"]:
+            ok = client.delete(f"{remote}/{name}", permanently=True)
+            results.append(("archive_delete", f"{remote}/{name}", ok, None if ok else "объект не удалён"))
+    logging.info(f"Архив {prefix}: упаковано файлов {len(archived)}, удалено {len(gone)}, "
+                 f"объектов {len(index['objects'])}")
+    return results
+
+
+def _download_index(client, prefix, folder):
+    """Скачивает облачный индекс поддерева во временную папку folder; None, если его нет."""
+    path = os.path.join(folder, INDEX_NAME)
+    if not client.download(f"{_remote_dir(prefix)}/{INDEX_NAME}", path):
+        return None
+    with gzip.open(path, "rb") as f:
+        return json.loads(f.read().decode("utf-8"))
+
+
+def list_files(client, prefix):
+    """
+    Перечисляет файлы архивного поддерева по облачному индексу.
+
+    :param client: Yandex_disc
+    :param str prefix: поддерево
+    :return: словарь путь → (size, mtime_ns); пустой, если архива нет
+    :rtype: Dict[str, Tuple[int, int]]
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        index = _download_index(client, prefix, folder)
+    if index is None:
+        return {}
+    return {path: (size, mtime_ns) for path, (_, size, mtime_ns) in index["files"].items()}
+
+
+def restore(client, prefix, local_folder):
+    """
+    Восстанавливает файлы архивного поддерева в local_folder по облачному индексу.
+
+    :param client: Yandex_disc
+    :param str prefix: поддерево
+    :param str local_folder: корень, относительно которого записываются пути из индекса
+    :return: True, если восстановлены все файлы индекса, иначе False
+    :rtype: bool
+    :raises ValueError: если путь в индексе выходит за пределы local_folder
+    """
+    root = os.path.abspath(local_folder)
+    with tempfile.TemporaryDirectory() as folder:
+        index = _download_index(client, prefix, folder)
+        if index is None:
+            return False
+        by_object = {}
+        for path, (name, _, mtime_ns) in index["files"].items():
+            by_object.setdefault(name, []).append((path, mtime_ns))
+        for name, paths in by_object.items():
+            local = os.path.join(folder, name)
+            if not client.download(f"{_remote_dir(prefix)}/{name}", local):
+                return False
+            if name.startswith("bundle-"):
+                with tarfile.open(local, "r:gz") as tar:
+                    for path, mtime_ns in paths:
+                        _write_file(root, path, tar.extractfile(tar.getmember(path)), mtime_ns)
+            else:
+                with (gzip.open if name.endswith(".gz") else open)(local, "rb") as src:
+                    _write_file(root, paths[0][0], src, paths[0][1])
+            os.remove(local)
+    return True
+
+
+def _write_file(root, path, src, mtime_ns):
+    """Атомарно записывает содержимое src в root/path и восстанавливает mtime."""
+    target = os.path.abspath(os.path.join(root, *path.split("/")))
+    if not target.startswith(root + os.sep):
+        raise ValueError(f"путь {path} вне папки восстановления")
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_path = target + ".part"
+    with open(tmp_path, "wb") as f:
+        for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+            f.write(chunk)
+    os.utime(tmp_path, ns=(mtime_ns, mtime_ns))
+    os.replace(tmp_path, target)
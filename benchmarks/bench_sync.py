@@ -0,0 +1,187 @@
+"""
+Бенчмарк синхронизации против локального MockDiskServer.
+
+Сценарии на синтетических деревьях:
+- tiny  — много мелких файлов (первичная загрузка),
+- huge  — несколько крупных файлов,
+- deep  — глубокая вложенность каталогов,
+- churn — изменение, удаление, добавление и переименование части файлов после
+          первичной синхронизации (замеряется второй цикл),
+- idle  — повторный цикл без изменений: снимок состояния совпадает с деревом,
+          облако не запрашивается,
+- recheck — то же дерево, но полная сверка с облаком (force=True).
+
+Каждый сценарий выполняется в отдельном процессе, чтобы пиковый RSS относился
+только к нему. Результат — files/s, MB/s, число вызовов API за цикл и пиковый RSS.
+
+Запуск из корня репозитория:
+
+    python -m benchmarks.bench_sync --scale 0.1 --save bench_baseline.json
+    python -m benchmarks.bench_sync --scale 0.1 --compare bench_baseline.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from disc_API import Yandex_disc
+from state import SyncState
+from sync import sync_cycle
+from tests.mock_server import MockDiskServer
+
+SCENARIOS = ("tiny", "huge", "deep", "churn", "idle", "recheck")
+
+
+def _write(path, size, seed=0):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    block = (str(seed).encode() * 64)[:64] * 16384
+    with open(path, "wb") as f:
+        while size > 0:
+            f.write(block[:size])
+            size -= len(block)
+
+
+def _build(name, root, scale):
+    """Создаёт дерево для сценария; возвращает функцию, готовящую замеряемый цикл."""
+    if name == "tiny":
+        for i in range(max(1, int(10000 * scale))):
+            _write(os.path.join(root, f"d{i % 100:02d}", f"f{i}.txt"), 100, i)
+        return None
+    if name == "huge":
+        for i in range(3):
+            _write(os.path.join(root, f"big{i}.bin"), max(1, int(256 * 1024 * 1024 * scale)), i)
+        return None
+    if name == "deep":
+        path = root
+        for depth in range(max(2, int(40 * scale))):
+            path = os.path.join(path, f"level{depth}")
+            for i in range(5):
+                _write(os.path.join(path, f"f{i}.txt"), 1000, depth * 10 + i)
+        return None
+
+    count = max(20, int(5000 * scale))
+    for i in range(count):
+        _write(os.path.join(root, f"d{i % 50:02d}", f"f{i}.txt"), 2000, i)
+
+    def mutate():
+        if name in ("idle", "recheck"):
+            return
+        for i in range(0, count, 10):
+            _write(os.path.join(root, f"d{i % 50:02d}", f"f{i}.txt"), 2500, i + 1)
+        for i in range(1, count, 20):
+            os.remove(os.path.join(root, f"d{i % 50:02d}", f"f{i}.txt"))
+        for i in range(count, count + count // 20):
+            _write(os.path.join(root, "new", f"n{i}.txt"), 2000, i + 7)
+        os.rename(os.path.join(root, "d03"), os.path.join(root, "d03-renamed"))
+
+    return mutate
+
+
+def _run(name, scale, latency, workers, queue):
+    """Выполняет один сценарий и кладёт метрики в queue."""
+    work = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    root = os.path.join(work, "root")
+    os.makedirs(root)
+    try:
+        with MockDiskServer(latency=latency) as server:
+            server.add_file("bench/.keep", b"")
+            client = Yandex_disc("bench", "token", base_url=server.base_url,
+                                 pool_size=max(10, workers))
+            state = SyncState(os.path.join(work, "state.db"))
+            prepare = _build(name, root, scale)
+            if prepare is not None:
+                sync_cycle(client, root, max_workers=workers, state=state)
+                prepare()
+                server.reset_counters()
+
+            started = time.perf_counter()
+            results = sync_cycle(client, root, max_workers=workers, state=state, force=name != "idle")
+            elapsed = time.perf_counter() - started
+
+            transferred = server.bytes_uploaded
+            queue.put({
+                "operations": len(results),
+                "failed": sum(1 for r in results if not r.ok),
+                "seconds": round(elapsed, 4),
+                "files_per_s": round(len(results) / elapsed, 1) if elapsed else 0.0,
+                "mb_per_s": round(transferred / 1024 / 1024 / elapsed, 2) if elapsed else 0.0,
+                "bytes_uploaded": transferred,
+                "api_calls": server.total_calls(),
+                "api_calls_by_endpoint": dict(server.calls),
+                "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            })
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def run_all(names, scale, latency, workers):
+    """Запускает сценарии по одному в отдельном процессе."""
+    ctx = multiprocessing.get_context("spawn")
+    report = {"params": {"scale": scale, "latency": latency, "workers": workers}, "scenarios": {}}
+    for name in names:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_run, args=(name, scale, latency, workers, queue))
+        proc.start()
+        proc.join()
+        if proc.exitcode != 0:
+            raise RuntimeError(f"Сценарий {name} завершился с кодом {proc.exitcode}")
+        report["scenarios"][name] = queue.get()
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """
+    Сравнивает отчёт с базовым: время не должно вырасти больше чем на tolerance,
+    число вызовов API и пиковый RSS — больше чем на tolerance от базового.
+
+    :return: список строк с описанием регрессий
+    :rtype: List[str]
+    """
+    problems = []
+    for name, current in report["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+        for metric in ("seconds", "api_calls", "peak_rss_mb"):
+            if current[metric] > base[metric] * (1 + tolerance):
+                problems.append(f"{name}: {metric} {base[metric]} → {current[metric]}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--scale", type=float, default=1.0, help="множитель размера деревьев")
+    parser.add_argument("--latency", type=float, default=0.005, help="задержка сервера на запрос, с")
+    parser.add_argument("--workers", type=int, default=8, help="max_workers для sync_cycle")
+    parser.add_argument("--save", help="сохранить отчёт как базовый JSON")
+    parser.add_argument("--compare", help="сравнить с базовым JSON и вернуть 1 при регрессии")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="допустимое ухудшение (доля)")
+    args = parser.parse_args(argv)
+
+    report = run_all(args.scenarios, args.scale, args.latency, args.workers)
+    for name, metrics in report["scenarios"].items():
+        print(f"{name:6} {metrics['seconds']:8.3f} с  {metrics['files_per_s']:9.1f} файл/с  "
+              f"{metrics['mb_per_s']:8.2f} МБ/с  API={metrics['api_calls']:6}  "
+              f"RSS={metrics['peak_rss_mb']:7.1f} МБ  ошибок={metrics['failed']}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"РЕГРЕССИЯ {problem}")
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
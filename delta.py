@@ -0,0 +1,201 @@
+"""
+Модуль delta
+
+Дельта-загрузка крупных файлов, которые растут (логи, дампы) или меняются небольшими
+участками. API Яндекс.Диска не позволяет дописать или изменить часть существующего
+файла, поэтому в облаке хранится базовая копия файла, а рядом, в папке
+«<имя>.fsdelta», — пронумерованные патчи с изменёнными и дописанными участками.
+Актуальное содержимое = база + все патчи по порядку (см. restore).
+
+Для каждого такого файла в снимке состояния хранятся md5 блоков по block_size байт;
+при перезаписи файл заново хэшируется поблочно, и в патч попадают только блоки,
+чей хэш изменился, а при дописывании — только новые байты. Когда патчей становится
+больше MAX_PATCHES или их суммарный объём превышает MAX_PATCH_RATIO размера файла,
+а также при уменьшении файла он загружается целиком, а патчи удаляются.
+
+Формат патча: заголовок (магическая строка, новый размер файла, число участков), затем
+для каждого участка — смещение, длина и данные.
+"""
+
+import hashlib
+import os
+import struct
+
+# Суффикс папки с патчами рядом с базовой копией файла
+SIDECAR_SUFFIX = ".fsdelta"
+# Размер блока, по которому считаются хэши
+BLOCK_SIZE = 4 * 1024 * 1024
+# После стольких патчей файл загружается целиком
+MAX_PATCHES = 64
+# Доля размера файла, при превышении которой суммарным объёмом патчей файл загружается целиком
+MAX_PATCH_RATIO = 0.5
+
+CHUNK_SIZE = 1024 * 1024
+
+_MAGIC = b"FSDELTA1"
+_HEADER = struct.Struct(">8sQI")
+_RANGE = struct.Struct(">QQ")
+
+
+def sidecar(remote_path):
+    """Возвращает путь папки с патчами для файла remote_path."""
+    return remote_path + SIDECAR_SUFFIX
+
+
+def is_sidecar(rel):
+    """
+    Проверяет, лежит ли путь внутри папки с патчами (такие файлы не синхронизируются).
+
+    :param str rel: относительный путь в облачной папке, через '/'
+    :rtype: bool
+    """
+    return any(part.endswith(SIDECAR_SUFFIX) for part in rel.split("/")[:-1])
+
+
+def block_hashes(path, block_size=BLOCK_SIZE):
+    """
+    Считает md5 каждого блока файла.
+
+    :param str path: путь к файлу
+    :param int block_size: размер блока в байтах
+    :return: список md5 (16 байт) по блокам; последний блок может быть неполным
+    :rtype: List[bytes]
+    :raises OSError: при ошибке чтения файла
+    """
+    hashes = []
+    with open(path, "rb") as f:
+        while True:
+            digest = _hash_read(f, block_size)
+            if digest is None:
+                return hashes
+            hashes.append(digest)
+
+
+def _hash_read(f, length):
+    """Хэширует следующие length байт файла; None, если файл закончился."""
+    digest, read = hashlib.md5(), 0
+    while read < length:
+        chunk = f.read(min(CHUNK_SIZE, length - read))
+        if not chunk:
+            break
+        digest.update(chunk)
+        read += len(chunk)
+    return digest.digest() if read else None
+
+
+def changed_ranges(path, old_size, old_hashes, new_size, new_hashes, block_size=BLOCK_SIZE):
+    """
+    Находит участки файла, изменившиеся с момента подсчёта old_hashes.
+
+    Неполный последний блок старой версии сравнивается по своей длине, так что при
+    дописывании в конец в патч попадают только новые байты.
+
+    :param str path: путь к файлу (для сравнения неполного последнего блока)
+    :param int old_size: размер файла при подсчёте old_hashes
+    :param old_hashes: хэши блоков старой версии
+    :param int new_size: текущий размер файла
+    :param new_hashes: хэши блоков текущей версии (block_hashes)
+    :param int block_size: размер блока
+    :return: отсортированный список непересекающихся (offset, length) или None, если файл
+             уменьшился и патчем его не описать
+    :rtype: Optional[List[Tuple[int, int]]]
+    """
+    if new_size < old_size:
+        return None
+    ranges = []
+    for index, digest in enumerate(new_hashes):
+        start = index * block_size
+        if index < len(old_hashes) and old_hashes[index] == digest:
+            continue
+        tail = old_size - start
+        if index == len(old_hashes) - 1 and 0 < tail < block_size:
+            with open(path, "rb") as f:
+                f.seek(start)
+                if _hash_read(f, tail) == old_hashes[index]:
+                    start = old_size
+        end = min(new_size, (index + 1) * block_size)
+        if ranges and ranges[-1][0] + ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end - ranges[-1][0])
+        elif end > start:
+            ranges.append((start, end - start))
+    return ranges
+
+
+def write_patch(path, ranges, new_size, out):
+    """
+    Записывает патч с участками файла path в открытый двоичный файл out.
+
+    :param str path: путь к файлу-источнику
+    :param ranges: список (offset, length)
+    :param int new_size: размер файла после применения патча
+    :param out: файл, открытый на запись в двоичном режиме
+    :return: None
+    :raises OSError: при ошибке чтения или записи
+    """
+    out.write(_HEADER.pack(_MAGIC, new_size, len(ranges)))
+    with open(path, "rb") as f:
+        for offset, length in ranges:
+            out.write(_RANGE.pack(offset, length))
+            f.seek(offset)
+            left = length
+            while left:
+                chunk = f.read(min(CHUNK_SIZE, left))
+                if not chunk:
+                    raise OSError(f"файл {path} уменьшился во время создания патча")
+                out.write(chunk)
+                left -= len(chunk)
+
+
+def apply_patch(patch, target):
+    """
+    Применяет патч к файлу.
+
+    :param patch: патч, открытый на чтение в двоичном режиме
+    :param target: файл, открытый в режиме "r+b"
+    :return: None
+    :raises ValueError: если patch — не патч этого формата или обрезан
+    """
+    header = patch.read(_HEADER.size)
+    if len(header) != _HEADER.size or header[:len(_MAGIC)] != _MAGIC:
+        raise ValueError("неверный формат патча")
+    _, new_size, count = _HEADER.unpack(header)
+    target.truncate(new_size)
+    for _ in range(count):
+        head = patch.read(_RANGE.size)
+        if len(head) != _RANGE.size:
+            raise ValueError("патч обрезан")
+        offset, length = _RANGE.unpack(head)
+        target.seek(offset)
+        while length:
+            chunk = patch.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                raise ValueError("патч обрезан")
+            target.write(chunk)
+            length -= len(chunk)
+
+
+def restore(client, remote_path, local_path):
+    """
+    Скачивает файл, загруженный в режиме дельты, и применяет к нему патчи.
+
+    :param client: Yandex_disc
+    :param str remote_path: относительный путь файла в облачной папке
+    :param str local_path: куда сохранить восстановленный файл
+    :return: True, если файл восстановлен, иначе False
+    :rtype: bool
+    """
+    if not client.download(remote_path, local_path):
+        return False
+    patches = sorted(name for name in client.list_names(sidecar(remote_path)) if name.endswith(".patch"))
+    tmp_patch = f"{local_path}.patch.part"
+    try:
+        with open(local_path, "r+b") as target:
+            for name in patches:
+                if not client.download(f"{sidecar(remote_path)}/{name}", tmp_patch):
+                    return False
+                with open(tmp_patch, "rb") as patch:
+                    apply_patch(patch, target)
+    finally:
+        if os.path.exists(tmp_patch):
+            os.remove(tmp_patch)
+    return True
@@ -3,14 +3,188 @@
 
 Содержит класс Yandex_disc для работы с API Яндекс.Диска:
 - формирование URL для загрузки файлов,
-- загрузка новых файлов,
-- перезапись существующих,
-- удаление и
-- получение информации о содержимом папки в облаке.
+- загрузка новых файлов (крупных — частями с продолжением после обрыва),
+- перезапись существующих (крупных растущих файлов — патчами с изменёнными участками,
+  см. delta.py),
+- удаление (в том числе асинхронное, с ожиданием операции),
+- перемещение (переименование) файлов и папок на стороне сервера,
+- скачивание файлов (во временный файл с атомарной заменой, крупные — диапазонами параллельно),
+- создание папок,
+- получение информации о содержимом папки в облаке (постранично и рекурсивно) и
+- получение ревизии Диска для проверки, изменилось ли что-нибудь (см. remote_cache.py).
+
+Все запросы идут через общую requests.Session с пулом keep-alive соединений.
+Временные ошибки (429, 5xx, обрывы соединения) повторяются с экспоненциальной
+задержкой и случайным разбросом; заголовок Retry-After учитывается.
 """
 
+import hashlib
 import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import NamedTuple, Optional
+
 import requests
+from requests.adapters import HTTPAdapter
+
+import delta
+from metrics import NULL_METRICS
+
+# Поля ресурса, которые нужны синхронизации; остальное API не передаёт
+LIST_FIELDS = ("path", "type", "size", "modified", "md5", "sha256", "revision")
+
+# Коды ответа, при которых запрос имеет смысл повторить
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Служебная папка (не синхронизируется, см. delta.is_sidecar), где проверяется поддержка
+# загрузки частями, и ключ, под которым результат сохраняется в upload_store
+RANGE_PROBE_FOLDER = delta.sidecar(".range-probe")
+RANGED_UPLOADS_KEY = "ranged_uploads"
+
+
+class Uploaded(NamedTuple):
+    """
+    Итог успешной загрузки: md5 отправленного содержимого и modified файла в облаке.
+
+    Любое из полей может быть None, если оно неизвестно (загрузка продолжена после
+    обрыва, файл обновлён патчем, modified не запрашивался).
+    """
+
+    md5: Optional[str]
+    modified: Optional[str]
+
+def make_session(pool_size=10):
+    """
+    Создаёт requests.Session с пулом keep-alive соединений.
+
+    Одну сессию можно передать нескольким клиентам Yandex_disc (например, заданиям с
+    разными токенами): заголовок авторизации передаётся в каждом запросе отдельно.
+
+    :param int pool_size: размер пула соединений на один хост
+    :rtype: requests.Session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class _UploadReader:
+    """
+    Файлоподобная обёртка для потоковой отправки тела PUT-запроса.
+
+    requests определяет Content-Length через __len__ и читает тело блоками через read(),
+    поэтому в памяти одновременно находится не больше одного блока. После каждого блока
+    вызывается progress; seek(0) позволяет повторить запрос с начала. Если заданы start
+    и length, отправляется только часть файла [start, start + length). Если передан
+    digest, отправленные байты добавляются в него (см. свойство digest).
+
+    :param file: файл, открытый в режиме "rb"
+    :param int chunk_size: максимальный размер одного блока в байтах
+    :param str name: путь файла в облаке, передаётся в progress
+    :param progress: callback(name, sent, total, elapsed) или None
+    :param int start: смещение начала части в файле
+    :param int length: длина части в байтах (по умолчанию — до конца файла)
+    :param throttle: ограничитель скорости с методом consume(bytes) или None
+    :param digest: объект hashlib с уже посчитанным хэшем предшествующих байт файла или None
+    """
+
+    def __init__(self, file, chunk_size, name, progress=None, start=0, length=None, throttle=None,
+                 digest=None):
+        self._file = file
+        self._chunk_size = chunk_size
+        self._name = name
+        self._progress = progress
+        self._size = os.fstat(file.fileno()).st_size
+        self._start = start
+        self._total = self._size - start if length is None else length
+        self._throttle = throttle
+        self._digest_start = digest
+        self._digest = digest.copy() if digest is not None else None
+        self._sent = 0
+        self._started = time.monotonic()
+        file.seek(start)
+
+    def __len__(self):
+        return self._total
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self._chunk_size:
+            size = self._chunk_size
+        chunk = self._file.read(min(size, self._total - self._sent))
+        if chunk:
+            self._sent += len(chunk)
+            if self._digest is not None:
+                self._digest.update(chunk)
+            if self._throttle is not None:
+                self._throttle.consume(len(chunk))
+            if self._progress is not None:
+                self._progress(self._name, self._start + self._sent, self._size,
+                               time.monotonic() - self._started)
+        return chunk
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_END:
+            offset += self._total
+        elif whence == os.SEEK_CUR:
+            offset += self._sent
+        if offset != self._sent and self._digest_start is not None:
+            # Хэш нельзя отмотать: при повторе запроса с начала он считается заново
+            self._digest = self._digest_start.copy() if offset == 0 else None
+        self._file.seek(self._start + offset)
+        self._sent = offset
+        return self._sent
+
+    def tell(self):
+        return self._sent
+
+    @property
+    def digest(self):
+        """Хэш файла по конец части, если часть отправлена целиком, иначе None."""
+        return self._digest if self._sent == self._total else None
+
+    def finish(self):
+        """Пишет в лог среднюю скорость передачи крупного файла."""
+        elapsed = time.monotonic() - self._started
+        if self._total >= 64 * self._chunk_size and elapsed > 0:
+            logging.getLogger(__name__).info(
+                f"{self._name}: {self._total / 1024 / 1024:.1f} МБ за {elapsed:.1f} с "
+                f"({self._total / 1024 / 1024 / elapsed:.2f} МБ/с)")
+
+
+class _StreamBody():
+    """
+    Тело PUT-запроса неизвестной заранее длины (Transfer-Encoding: chunked).
+
+    requests перебирает тело заново при каждой попытке, поэтому повтор запроса
+    начинает поток сначала.
+
+    :param stream: итерируемый объект с блоками bytes, допускающий повторный перебор
+    :param throttle: ограничитель скорости с методом consume(bytes) или None
+    """
+
+    def __init__(self, stream, throttle=None):
+        self._stream = stream
+        self._throttle = throttle
+        self.sent = 0
+
+    def __iter__(self):
+        self.sent = 0
+        for chunk in self._stream:
+            if not chunk:
+                continue
+            if self._throttle is not None:
+                self._throttle.consume(len(chunk))
+            self.sent += len(chunk)
+            yield chunk
+
 
 class Yandex_disc():
     """
@@ -18,17 +192,195 @@ class Yandex_disc():
 
     :param str cloud_folder: имя папки на Яндекс.Диске, куда будут загружаться файлы
     :param str token: OAuth-токен для доступа к API Яндекс.Диска
+    :param int page_size: сколько элементов запрашивать за один вызов при листинге
+    :param str base_url: адрес ресурса /v1/disk/resources (для тестового сервера)
+    :param int pool_size: размер пула соединений на один хост
+    :param int max_retries: сколько раз повторять запрос при временной ошибке
+    :param float backoff: базовая задержка перед повтором в секундах (удваивается)
+    :param float max_backoff: верхняя граница задержки между повторами в секундах
+    :param timeout: таймаут requests (соединение, чтение) в секундах
+    :param int chunk_size: размер блока при потоковой загрузке файла в байтах
+    :param progress: необязательный callback(remote_path, sent, total, elapsed),
+                     вызывается после каждого отправленного блока
+    :param bool permanently: удалять ресурсы мимо корзины
+    :param float poll_interval: начальный интервал опроса асинхронных операций в секундах
+    :param float operation_timeout: сколько секунд ждать завершения асинхронной операции
+    :param int download_connections: сколько диапазонов крупного файла скачивать параллельно
+    :param int range_threshold: размер файла в байтах, начиная с которого скачивание
+                                делится на диапазоны
+    :param int resumable_threshold: размер файла в байтах, начиная с которого загрузка
+                                    идёт частями по upload_part_size с Content-Range
+                                    (0 — всегда одним запросом)
+    :param int upload_part_size: размер одной части такой загрузки в байтах
+    :param upload_store: объект с методами get_upload, save_upload и drop_upload
+                         (например, SyncState), где сохраняется прогресс загрузки частями,
+                         чтобы продолжить её после обрыва или перезапуска; None — не сохранять.
+                         Если у него есть get_meta и set_meta, там же запоминается,
+                         поддерживает ли сервер загрузку частями
+    :param throttle: общий ограничитель скорости передачи с методом consume(bytes)
+                     (например, scheduler.TokenBucket) или None
+    :param session: общая requests.Session (см. make_session); по умолчанию создаётся своя
+                    с пулом на pool_size соединений
+    :param metrics: metrics.Metrics (или представление с метками) для гистограмм задержек
+                    API, счётчиков ошибок и повторов и длительности передач; None — не собирать
+    :param int delta_threshold: размер файла в байтах, начиная с которого перезапись идёт
+                                в режиме дельты — патчами с изменёнными участками рядом
+                                с базовой копией (см. delta.py); 0 — выключено. Требует
+                                upload_store с методами get_blocks, save_blocks и drop_blocks
+    :param int delta_block_size: размер блока, по которому ищутся изменения
+    :param bool fetch_modified: запрашивать поле modified загруженного файла, если md5
+                                отправленного содержимого неизвестен (загрузка продолжена
+                                после перезапуска): двустороннему режиму нужна хотя бы одна
+                                облачная отметка загруженной версии
     """
 
-    def __init__(self,cloud_folder, token):
+    def __init__(self,cloud_folder, token, page_size=1000, pool_size=10, max_retries=5,
+                 backoff=0.5, max_backoff=30.0, timeout=(10, 300), chunk_size=1024 * 1024,
+                 progress=None, permanently=False, poll_interval=0.5, operation_timeout=3600.0,
+                 base_url='https://cloud-api.yandex.net/v1/disk/resources', download_connections=4,
+                 range_threshold=64 * 1024 * 1024, resumable_threshold=256 * 1024 * 1024,
+                 upload_part_size=32 * 1024 * 1024, upload_store=None, throttle=None,
+                 session=None, metrics=None, delta_threshold=0, delta_block_size=delta.BLOCK_SIZE,
+                 fetch_modified=False):
         self.cloud_folder = cloud_folder
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.permanently = permanently
+        self.poll_interval = poll_interval
+        self.operation_timeout = operation_timeout
+        self.download_connections = download_connections
+        self.range_threshold = range_threshold
+        self.resumable_threshold = resumable_threshold
+        self.upload_part_size = upload_part_size
+        self.upload_store = upload_store
+        self.throttle = throttle
+        self.metrics = metrics if metrics is not None else NULL_METRICS
+        self.delta_threshold = delta_threshold if upload_store is not None else 0
+        self.delta_block_size = delta_block_size
+        self.fetch_modified = fetch_modified
+        # Поддерживает ли сервер Content-Range при загрузке; None — ещё не проверено
+        self._ranged_uploads = None
+        self._probe_lock = threading.Lock()
+        self.page_size = page_size
         self.token = token
-        self.base_url = 'https://cloud-api.yandex.net/v1/disk/resources'
+        self.base_url = base_url
         self.headers ={
             "Authorization": f"OAuth {self.token}"
         }
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.session = session if session is not None else make_session(pool_size)
+        self._stats = {}
+        self._stats_lock = threading.Lock()
         self._logger = logging.getLogger(__name__)
 
+    def _request(self, method, url, endpoint, retry=True, **kwargs):
+        """
+        Выполняет HTTP-запрос через общую сессию с повторами при временных ошибках.
+
+        Повторяются ответы из RETRY_STATUSES и сетевые ошибки. Задержка растёт
+        экспоненциально со случайным разбросом (full jitter), но не меньше значения
+        Retry-After, если сервер его прислал. Файловое тело запроса перед повтором
+        перематывается в начало.
+
+        :param str method: HTTP-метод
+        :param str url: адрес запроса
+        :param str endpoint: имя эндпоинта для статистики (list, upload, delete, ...)
+        :param bool retry: False — для неидемпотентных запросов, выполняются один раз
+        :param kwargs: дополнительные аргументы requests.Session.request
+        :return: последний полученный ответ (статус не проверяется)
+        :rtype: requests.Response
+        :raises requests.RequestException: если сетевая ошибка повторилась max_retries раз
+        """
+
+        kwargs.setdefault("headers", self.headers)
+        kwargs.setdefault("timeout", self.timeout)
+        attempts = self.max_retries + 1 if retry else 1
+        body = kwargs.get("data")
+
+        for attempt in range(attempts):
+            if attempt and hasattr(body, "seek"):
+                body.seek(0)
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                self._record(endpoint, time.monotonic() - started, error=True)
+                if attempt + 1 >= attempts:
+                    raise
+                delay = self._backoff_delay(attempt, None)
+                self._logger.warning(f"{method} {endpoint}: {exc}; повтор через {delay:.1f} с")
+            else:
+                failed = response.status_code >= 400
+                self._record(endpoint, time.monotonic() - started, error=failed)
+                if response.status_code not in RETRY_STATUSES or attempt + 1 >= attempts:
+                    return response
+                delay = self._backoff_delay(attempt, response)
+                self._logger.warning(
+                    f"{method} {endpoint}: ответ {response.status_code}; повтор через {delay:.1f} с")
+            self._record_retry(endpoint)
+            time.sleep(delay)
+
+    def _backoff_delay(self, attempt, response):
+        """
+        Считает задержку перед повтором: full jitter, но не меньше Retry-After.
+
+        :param int attempt: номер неудачной попытки, начиная с 0
+        :param response: ответ сервера или None при сетевой ошибке
+        :return: задержка в секундах
+        :rtype: float
+        """
+
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                wait = float(retry_after)
+            except ValueError:
+                try:
+                    wait = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    wait = 0.0
+            delay = max(delay, min(wait, self.max_backoff))
+        return delay
+
+    def _record(self, endpoint, elapsed, error=False):
+        """Учитывает один HTTP-вызов в статистике эндпоинта и в метриках."""
+        self.metrics.observe("api_request_seconds", elapsed, endpoint=endpoint)
+        if error:
+            self.metrics.inc("api_errors_total", endpoint=endpoint)
+        with self._stats_lock:
+            stat = self._stats.setdefault(
+                endpoint, {"calls": 0, "retries": 0, "errors": 0, "total_time": 0.0, "max_time": 0.0})
+            stat["calls"] += 1
+            stat["total_time"] += elapsed
+            stat["max_time"] = max(stat["max_time"], elapsed)
+            if error:
+                stat["errors"] += 1
+
+    def _record_retry(self, endpoint):
+        """Учитывает повтор запроса в статистике эндпоинта и в метриках."""
+        self.metrics.inc("api_retries_total", endpoint=endpoint)
+        with self._stats_lock:
+            self._stats[endpoint]["retries"] += 1
+
+    def get_stats(self):
+        """
+        Возвращает счётчики HTTP-вызовов по эндпоинтам.
+
+        :return: словарь endpoint → {calls, retries, errors, total_time, max_time, avg_time}
+                 (время в секундах)
+        :rtype: Dict[str, dict]
+        """
+
+        with self._stats_lock:
+            stats = {name: dict(stat) for name, stat in self._stats.items()}
+        for stat in stats.values():
+            stat["avg_time"] = stat["total_time"] / stat["calls"] if stat["calls"] else 0.0
+        return stats
+
     def _get_upload_url(self, remote_path, overwrite=False):
         """
        Запрашивает у API URL для загрузки файла.
@@ -44,7 +396,7 @@ class Yandex_disc():
             "path": f"{self.cloud_folder}/{remote_path}",
             "overwrite": str(overwrite).lower()
         }
-        resp = requests.get(f"{self.base_url}/upload", headers=self.headers, params=params)
+        resp = self._request("GET", f"{self.base_url}/upload", "upload_url", params=params)
         resp.raise_for_status()
         return resp.json()["href"]
 
@@ -52,64 +404,561 @@ class Yandex_disc():
         """
         Загружает файл в облако, если его там ещё нет.
 
-        Читает весь файл из local_path и отправляет по URL, полученному из _get_upload_url.
+        Передаёт содержимое local_path потоком по URL, полученному из _get_upload_url;
+        файл от resumable_threshold байт — частями (см. _put_parts).
 
         :param str local_path: путь к файлу на локальной машине
         :param str remote_path: имя (или относительный путь) файла в облачной папке
-        :return: None
+        :return: Uploaded с md5 отправленного содержимого, если файл загружен, иначе False
+        :rtype: Union[Uploaded, bool]
         :raises OSError: при ошибке чтения файла
         """
 
-        href = self._get_upload_url(remote_path, overwrite=False)
-        with open(local_path, "rb") as f:
-            data = f.read()
-        response = requests.put(href, data=data, headers=self.headers)
+        with self.metrics.span("client_seconds", op="load"):
+            if self._uses_delta(local_path):
+                return self._put_delta(local_path, remote_path, overwrite=False)
+            response, md5 = self._upload(local_path, remote_path, overwrite=False)
         try:
             response.raise_for_status()
         except requests.RequestException as e:
             self._logger.error(f"Не удалось загрузить {local_path}:{e}")
+            return False
         else:
             self._logger.info(f"Файл {local_path} успешно загружен в {self.cloud_folder}/{remote_path}")
+            return Uploaded(md5, self._get_modified(remote_path) if md5 is None else None)
 
     def reload(self,local_path, remote_path):
         """
        Перезаписывает существующий в облаке файл.
 
        Использует overwrite=True при запросе URL, чтобы заменить старую версию.
+       Содержимое передаётся потоком, как и в load. Файл от delta_threshold байт
+       передаётся патчем с изменившимися участками (см. _put_delta).
 
        :param str local_path: путь к файлу на локальной машине
        :param str remote_path: имя (или относительный путь) файла в облачной папке
-       :return: None
+       :return: Uploaded с md5 отправленного содержимого, если файл перезаписан, иначе False
+       :rtype: Union[Uploaded, bool]
        :raises OSError: при ошибке чтения файла
        """
-        href = self._get_upload_url(remote_path, overwrite=True)
-        with open(local_path, "rb") as f:
-            data = f.read()
-        response = requests.put(href, data=data, headers=self.headers)
+        with self.metrics.span("client_seconds", op="reload"):
+            if self._uses_delta(local_path):
+                return self._put_delta(local_path, remote_path, overwrite=True)
+            response, md5 = self._upload(local_path, remote_path, overwrite=True)
         try:
             response.raise_for_status()
         except requests.RequestException as e:
             self._logger.error(f"Не удалось перезаписать {remote_path}:{e}")
+            return False
         else:
             self._logger.info(f"Файл {local_path} успешно перезаписан в {self.cloud_folder}/{remote_path}")
+            return Uploaded(md5, self._get_modified(remote_path) if md5 is None else None)
 
-    def delete(self, local_path):
+    def _get_modified(self, remote_path):
         """
-        Удаляет файл из облачного хранилища.
+        Запрашивает поле modified загруженного файла, если задан fetch_modified.
+        Вызывается, только когда md5 загрузки неизвестен: иначе modified заполнит
+        следующий листинг.
 
-        :param str remote_path: имя (или относительный путь) файла в облачной папке
-        :return: None
+        :return: modified в формате API или None (не запрашивался или запрос не удался)
+        :rtype: Optional[str]
+        """
+
+        if not self.fetch_modified:
+            return None
+        params = {"path": f"{self.cloud_folder}/{remote_path}", "fields": "modified"}
+        try:
+            response = self._request("GET", self.base_url, "modified", params=params)
+            response.raise_for_status()
+            return response.json().get("modified")
+        except requests.RequestException as e:
+            self._logger.warning(f"Не удалось получить modified для {remote_path}: {e}")
+            return None
+
+    def _uses_delta(self, local_path):
+        """Проверяет, загружается ли файл в режиме дельты."""
+        return bool(self.delta_threshold) and os.path.getsize(local_path) >= self.delta_threshold
+
+    def _put_delta(self, local_path, remote_path, overwrite):
+        """
+        Загружает файл в режиме дельты.
+
+        Если для файла сохранены хэши блоков, а изменения описываются патчем в пределах
+        delta.MAX_PATCHES и delta.MAX_PATCH_RATIO, в облако отправляется только патч.
+        Иначе папка с патчами удаляется, файл загружается целиком и его хэши блоков
+        запоминаются для следующих перезаписей.
+
+        :return: Uploaded (md5 известен, только если файл загружен целиком), если облачная
+                 копия (с патчами) совпадает с файлом, иначе False
+        :rtype: Union[Uploaded, bool]
+        :raises OSError: при ошибке чтения файла
+        :raises requests.RequestException: при сетевой ошибке
+        """
+
+        size = os.path.getsize(local_path)
+        hashes = delta.block_hashes(local_path, self.delta_block_size)
+        saved = self.upload_store.get_blocks(remote_path)
+        if overwrite and saved is not None and saved[1] == self.delta_block_size:
+            old_size, _, old_hashes, patches, patch_bytes = saved
+            ranges = delta.changed_ranges(local_path, old_size, old_hashes, size, hashes,
+                                          self.delta_block_size)
+            length = sum(length for _, length in ranges or ())
+            if (ranges is not None and patches < delta.MAX_PATCHES
+                    and patch_bytes + length <= size * delta.MAX_PATCH_RATIO):
+                if ranges and not self._put_patch(local_path, remote_path, ranges, size, patches + 1):
+                    return False
+                self.upload_store.save_blocks(remote_path, size, self.delta_block_size, hashes,
+                                              patches + bool(ranges), patch_bytes + length)
+                self._logger.info(f"Файл {local_path} обновлён в {self.cloud_folder}/{remote_path} "
+                                  f"патчем: {len(ranges)} участков, {length} из {size} байт")
+                return Uploaded(None, None)
+
+        # Старые патчи относятся к прежней базовой копии и удаляются до её замены
+        if (saved is None or saved[3]) and not self.delete(delta.sidecar(remote_path), permanently=True):
+            return False
+        response, md5 = self._upload(local_path, remote_path, overwrite=overwrite)
+        try:
+            response.raise_for_status()
+        except requests.RequestException as e:
+            self._logger.error(f"Не удалось загрузить {local_path}:{e}")
+            return False
+        self.upload_store.save_blocks(remote_path, size, self.delta_block_size, hashes, 0, 0)
+        self._logger.info(f"Файл {local_path} загружен целиком в {self.cloud_folder}/{remote_path}")
+        return Uploaded(md5, None)
+
+    def _put_patch(self, local_path, remote_path, ranges, size, number):
+        """
+        Записывает патч с участками ranges во временный файл и загружает его под номером number.
+
+        :return: True, если патч загружен, иначе False
+        :rtype: bool
+        """
+
+        folder = delta.sidecar(remote_path)
+        if number == 1:
+            self.mkdir(folder)
+        fd, tmp_path = tempfile.mkstemp(prefix=".fsdelta-", suffix=".patch")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                delta.write_patch(local_path, ranges, size, out)
+            patch_size = os.path.getsize(tmp_path)
+            response, _ = self._upload(tmp_path, f"{folder}/{number:06d}.patch", overwrite=True)
+        finally:
+            os.remove(tmp_path)
+        if not response.ok:
+            self._logger.error(f"Не удалось загрузить патч {number} для {remote_path}: ответ {response.status_code}")
+            return False
+        self.metrics.inc("delta_patch_bytes_total", patch_size)
+        return True
+
+    def put_stream(self, remote_path, stream, overwrite=True):
+        """
+        Загружает в облако данные, размер которых заранее неизвестен (например, сжимаемые
+        на лету), одним PUT-запросом с Transfer-Encoding: chunked.
+
+        :param str remote_path: относительный путь файла в облачной папке
+        :param stream: итерируемый объект с блоками bytes; при повторе запроса перебирается заново
+        :param bool overwrite: перезаписать существующий файл
+        :return: число переданных байт или None, если загрузка не удалась
+        :rtype: Optional[int]
+        :raises OSError: при ошибке чтения источника потока
+        """
+
+        body = _StreamBody(stream, self.throttle)
+        try:
+            href = self._get_upload_url(remote_path, overwrite=overwrite)
+            self._request("PUT", href, "upload", data=body).raise_for_status()
+        except requests.RequestException as e:
+            self._logger.error(f"Не удалось загрузить {remote_path}:{e}")
+            return None
+        self._logger.info(f"Поток {body.sent} байт загружен в {self.cloud_folder}/{remote_path}")
+        return body.sent
+
+    def _upload(self, local_path, remote_path, overwrite):
+        """
+        Загружает файл одним запросом или частями, в зависимости от размера.
+
+        :return: (ответ сервера на последний запрос, md5 отправленного содержимого или None)
+        :rtype: Tuple[requests.Response, Optional[str]]
+        :raises OSError: при ошибке чтения файла
+        """
+
+        size = os.path.getsize(local_path)
+        if self.resumable_threshold and size >= self.resumable_threshold and self._supports_ranged_uploads():
+            return self._put_parts(local_path, remote_path, overwrite)
+        href = self._get_upload_url(remote_path, overwrite=overwrite)
+        return self._put_file(href, local_path, remote_path)
+
+    def _supports_ranged_uploads(self):
+        """
+        Проверяет, принимает ли сервер загрузку частями с Content-Range.
+
+        Результат берётся из upload_store, а если его там нет — из пробной загрузки
+        (см. _probe_ranged_uploads) и сохраняется туда. Если проверка не удалась, файл
+        загружается одним запросом, а проверка повторится при следующей крупной загрузке.
+
+        :rtype: bool
+        """
+
+        with self._probe_lock:
+            if self._ranged_uploads is None:
+                store = self.upload_store if hasattr(self.upload_store, "get_meta") else None
+                saved = store.get_meta(RANGED_UPLOADS_KEY) if store is not None else None
+                if saved:
+                    self._ranged_uploads = saved == "1"
+                else:
+                    self._ranged_uploads = self._probe_ranged_uploads()
+                    if self._ranged_uploads is not None and store is not None:
+                        store.set_meta(RANGED_UPLOADS_KEY, int(self._ranged_uploads))
+            return bool(self._ranged_uploads)
+
+    def _probe_ranged_uploads(self):
+        """
+        Отправляет первый байт двухбайтового файла с Content-Range в служебную папку
+        RANGE_PROBE_FOLDER: ответ 202 значит, что части поддерживаются, а любой другой
+        успешный — что сервер сохранил часть как целый файл. Файлы пользователя при
+        проверке не затрагиваются; служебная папка затем удаляется.
+
+        :return: True или False; None, если проверить не удалось
+        :rtype: Optional[bool]
+        """
+
+        try:
+            self.mkdir(RANGE_PROBE_FOLDER)
+            href = self._get_upload_url(f"{RANGE_PROBE_FOLDER}/probe", overwrite=True)
+            response = self._request("PUT", href, "upload_probe", data=b"\0",
+                                     headers={**self.headers, "Content-Range": "bytes 0-0/2"})
+        except requests.RequestException as e:
+            self._logger.warning(f"Не удалось проверить поддержку загрузки частями: {e}")
+            return None
+        finally:
+            try:
+                self.delete(RANGE_PROBE_FOLDER, permanently=True)
+            except requests.RequestException as e:
+                self._logger.warning(f"Не удалось удалить {RANGE_PROBE_FOLDER}: {e}")
+        if response.status_code == 202:
+            return True
+        if response.ok:
+            self._logger.warning("Сервер не поддерживает загрузку частями, "
+                                 "файлы будут загружаться одним запросом")
+            return False
+        self._logger.warning(f"Не удалось проверить поддержку загрузки частями: ответ {response.status_code}")
+        return None
+
+    def _put_parts(self, local_path, remote_path, overwrite):
+        """
+        Загружает файл частями по upload_part_size с заголовком Content-Range.
+
+        После каждой принятой части (ответ 202) смещение сохраняется в upload_store, и
+        прерванная загрузка того же, не изменившегося файла продолжается с этого места,
+        в том числе после перезапуска. Если URL загрузки устарел (404/410/416), загрузка
+        начинается заново. Поддержка Content-Range проверяется заранее (см.
+        _supports_ranged_uploads); если сервер всё же принял часть как целый файл,
+        файл перезаписывается одним запросом, и дальше клиент частями не загружает.
+        md5 считается по ходу отправки, кроме загрузки, продолженной после перезапуска.
+
+        :return: (ответ сервера на последний запрос, md5 отправленного содержимого или None)
+        :rtype: Tuple[requests.Response, Optional[str]]
+        :raises OSError: при ошибке чтения файла
+        :raises requests.RequestException: при сетевой ошибке (прогресс при этом сохранён)
+        """
+
+        st = os.stat(local_path)
+        size = st.st_size
+        saved = self.upload_store.get_upload(remote_path) if self.upload_store is not None else None
+        if saved is not None and saved[:2] == (size, st.st_mtime_ns):
+            href, offset = saved[2:]
+            self._logger.info(f"Продолжение загрузки {remote_path} с {offset} из {size} байт")
+            digest = None
+        else:
+            href, offset = self._get_upload_url(remote_path, overwrite=overwrite), 0
+            digest = hashlib.md5()
+
+        with open(local_path, "rb") as f:
+            while True:
+                length = min(self.upload_part_size, size - offset)
+                reader = _UploadReader(f, self.chunk_size, remote_path, self.progress, offset, length,
+                                       self.throttle, digest)
+                headers = {**self.headers,
+                           "Content-Range": f"bytes {offset}-{offset + length - 1}/{size}"}
+                response = self._request("PUT", href, "upload", data=reader, headers=headers)
+
+                if response.status_code == 202:
+                    offset += length
+                    digest = reader.digest
+                    if self.upload_store is not None:
+                        self.upload_store.save_upload(remote_path, size, st.st_mtime_ns, href, offset)
+                    continue
+                if offset and response.status_code in (404, 410, 416):
+                    self._logger.warning(f"Загрузка {remote_path} не может быть продолжена "
+                                         f"(ответ {response.status_code}), начинаю заново")
+                    href, offset = self._get_upload_url(remote_path, overwrite=overwrite), 0
+                    digest = hashlib.md5()
+                    continue
+                if not response.ok:
+                    return response, None
+                if self.upload_store is not None:
+                    self.upload_store.drop_upload(remote_path)
+                if offset + length < size:
+                    self._logger.warning("Сервер не поддерживает загрузку частями, "
+                                         "файлы будут загружаться одним запросом")
+                    self._ranged_uploads = False
+                    if hasattr(self.upload_store, "set_meta"):
+                        self.upload_store.set_meta(RANGED_UPLOADS_KEY, 0)
+                    href = self._get_upload_url(remote_path, overwrite=True)
+                    return self._put_file(href, local_path, remote_path)
+                reader.finish()
+                digest = reader.digest
+                return response, digest.hexdigest() if digest is not None else None
+
+    def _put_file(self, href, local_path, remote_path):
+        """
+        Отправляет файл PUT-запросом, читая его блоками по chunk_size.
+
+        Файл не загружается в память целиком: объём памяти на передачу ограничен
+        размером блока независимо от размера файла.
+
+        :param str href: URL для загрузки, полученный из _get_upload_url
+        :param str local_path: путь к файлу на локальной машине
+        :param str remote_path: относительный путь файла в облачной папке (для progress)
+        :return: (ответ сервера, md5 отправленного содержимого или None, если тело
+                 не было прочитано целиком)
+        :rtype: Tuple[requests.Response, Optional[str]]
+        :raises OSError: при ошибке чтения файла
+        """
+
+        with open(local_path, "rb") as f:
+            reader = _UploadReader(f, self.chunk_size, remote_path, self.progress,
+                                   throttle=self.throttle, digest=hashlib.md5())
+            response = self._request("PUT", href, "upload", data=reader)
+        reader.finish()
+        digest = reader.digest
+        return response, digest.hexdigest() if digest is not None else None
+
+    def _get_download_url(self, remote_path):
+        """
+        Запрашивает у API URL для скачивания файла.
+
+        :param str remote_path: относительный путь файла внутри cloud_folder
+        :return: URL для HTTP GET содержимого
+        :rtype: str
+        :raises requests.HTTPError: при не-200 ответе от сервера
+        """
+
+        params = {"path": f"{self.cloud_folder}/{remote_path}"}
+        resp = self._request("GET", f"{self.base_url}/download", "download_url", params=params)
+        resp.raise_for_status()
+        return resp.json()["href"]
+
+    def download(self, remote_path, local_path, size=None, mtime=None):
+        """
+        Скачивает файл из облака и атомарно заменяет им local_path.
+
+        Данные пишутся во временный файл рядом с local_path и переименовываются только
+        после успешного окончания, так что прерванное скачивание не портит локальную копию.
+        Файл от range_threshold байт скачивается download_connections параллельными
+        Range-запросами; если сервер диапазоны не поддерживает — одним потоком.
+
+        :param str remote_path: относительный путь файла в облачной папке
+        :param str local_path: куда сохранить файл
+        :param int size: размер файла из листинга (нужен для деления на диапазоны)
+        :param float mtime: время модификации, которое выставить скачанному файлу
+        :return: True, если файл скачан, иначе False
+        :rtype: bool
+        """
+
+        folder = os.path.dirname(local_path) or "."
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".", suffix=".part")
+        os.close(fd)
+        try:
+            with self.metrics.span("client_seconds", op="download"):
+                href = self._get_download_url(remote_path)
+                ranged = size and size >= self.range_threshold and self.download_connections > 1
+                if not (ranged and self._download_ranges(href, tmp_path, size)):
+                    self._download_stream(href, tmp_path)
+            if mtime is not None:
+                os.utime(tmp_path, (mtime, mtime))
+            os.replace(tmp_path, local_path)
+        except (requests.RequestException, OSError) as e:
+            self._logger.error(f"Не удалось скачать {remote_path}:{e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+        self._logger.info(f"Файл {self.cloud_folder}/{remote_path} успешно скачан в {local_path}")
+        return True
+
+    def _download_stream(self, href, tmp_path):
+        """Скачивает содержимое одним GET-запросом, записывая его блоками."""
+        response = self._request("GET", href, "download", stream=True)
+        with response:
+            response.raise_for_status()
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_content(self.chunk_size):
+                    f.write(chunk)
+                    if self.throttle is not None:
+                        self.throttle.consume(len(chunk))
+
+    def _download_ranges(self, href, tmp_path, size):
+        """
+        Скачивает файл параллельными Range-запросами в заранее выделенный файл.
+
+        Все диапазоны запрашиваются сразу. Поддержка Range определяется по статусу ответа
+        до чтения тела: если сервер ответил не 206, тело не читается, а ещё не начатые
+        диапазоны не запрашиваются.
+
+        :return: False, если сервер не поддерживает диапазоны
+        :rtype: bool
+        :raises requests.RequestException: при ошибке любого из диапазонов
+        """
+        part = -(-size // self.download_connections)
+        ranges = [(start, min(start + part, size) - 1) for start in range(0, size, part)]
+        with open(tmp_path, "wb") as f:
+            f.truncate(size)
+        unsupported = threading.Event()
+
+        def fetch(byte_range):
+            if unsupported.is_set():
+                return False
+            start, end = byte_range
+            response = self._request("GET", href, "download", stream=True,
+                                     headers={**self.headers, "Range": f"bytes={start}-{end}"})
+            with response:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    unsupported.set()
+                    return False
+                with open(tmp_path, "r+b") as f:
+                    f.seek(start)
+                    for chunk in response.iter_content(self.chunk_size):
+                        f.write(chunk)
+                        if self.throttle is not None:
+                            self.throttle.consume(len(chunk))
+            return True
+
+        with ThreadPoolExecutor(max_workers=self.download_connections) as pool:
+            done = list(pool.map(fetch, ranges))
+        if all(done):
+            return True
+        self._logger.info("Сервер не поддерживает Range-запросы, файл скачивается одним потоком")
+        return False
+
+    def delete(self, local_path, permanently=None):
+        """
+        Удаляет файл или папку из облачного хранилища.
+
+        Удаление папки сервер может выполнять асинхронно (ответ 202 со ссылкой на операцию);
+        тогда метод дожидается завершения операции через wait_operation.
+
+        :param str remote_path: имя (или относительный путь) файла или папки в облачной папке
+        :param bool permanently: удалить мимо корзины; None — значение из конструктора
+        :return: True, если ресурс удалён, иначе False
+        :rtype: bool
         :raises requests.RequestException: при неудачном HTTP-запросе
         """
 
-        url = f"{self.base_url}?path={self.cloud_folder}/{local_path}"
-        response = requests.delete(url, headers=self.headers)
+        if permanently is None:
+            permanently = self.permanently
+        params = {"path": f"{self.cloud_folder}/{local_path}", "permanently": str(permanently).lower()}
+        response = self._request("DELETE", self.base_url, "delete", params=params)
+        if response.status_code == 404:
+            self._logger.info(f"Файл {local_path} уже отсутствует в {self.cloud_folder}")
+            return True
         try:
             response.raise_for_status()
         except requests.RequestException as e:
             self._logger.error(f"Не удалось удалить {local_path}:{e}")
-        else:
-            self._logger.info(f"Файл {local_path} успешно удален из {self.cloud_folder}/{local_path}")
+            return False
+        if response.status_code == 202 and not self.wait_operation(response.json()["href"]):
+            self._logger.error(f"Не удалось удалить {local_path}: асинхронная операция завершилась ошибкой")
+            return False
+        self._logger.info(f"Файл {local_path} успешно удален из {self.cloud_folder}/{local_path}")
+        if self.delta_threshold:
+            saved = self.upload_store.get_blocks(local_path)
+            if saved is not None:
+                if saved[3]:
+                    self.delete(delta.sidecar(local_path), permanently=True)
+                self.upload_store.drop_blocks(local_path)
+        return True
+
+    def wait_operation(self, href, timeout=None):
+        """
+        Опрашивает асинхронную операцию API до её завершения.
+
+        Интервал опроса растёт от poll_interval вдвое, но не больше max_backoff.
+
+        :param str href: ссылка на операцию из ответа 202
+        :param float timeout: сколько секунд ждать; None — operation_timeout из конструктора
+        :return: True при статусе success, False при failed или по истечении времени
+        :rtype: bool
+        """
+
+        deadline = time.monotonic() + (self.operation_timeout if timeout is None else timeout)
+        interval = self.poll_interval
+        while True:
+            response = self._request("GET", href, "operation")
+            try:
+                response.raise_for_status()
+                status = response.json().get("status")
+            except (requests.RequestException, ValueError) as e:
+                self._logger.error(f"Не удалось получить статус операции {href}:{e}")
+                return False
+            if status == "success":
+                return True
+            if status == "failed":
+                return False
+            if time.monotonic() + interval > deadline:
+                self._logger.error(f"Операция {href} не завершилась за отведённое время")
+                return False
+            time.sleep(interval)
+            interval = min(interval * 2, self.max_backoff)
+
+    def move(self, src_path, dst_path):
+        """
+        Перемещает (переименовывает) файл или папку внутри cloud_folder без передачи данных.
+
+        Запрос не повторяется автоматически: повтор уже выполненного перемещения
+        завершился бы ошибкой 404, а невыполненное повторит следующий цикл.
+
+        :param str src_path: текущий относительный путь в облачной папке
+        :param str dst_path: новый относительный путь в облачной папке
+        :return: True, если перемещение выполнено (асинхронное — дожидается завершения), иначе False
+        :rtype: bool
+        """
+
+        params = {
+            "from": f"{self.cloud_folder}/{src_path}",
+            "path": f"{self.cloud_folder}/{dst_path}",
+            "overwrite": "false",
+        }
+        response = self._request("POST", f"{self.base_url}/move", "move", retry=False, params=params)
+        try:
+            response.raise_for_status()
+        except requests.RequestException as e:
+            self._logger.error(f"Не удалось переместить {src_path} в {dst_path}:{e}")
+            return False
+        if response.status_code == 202 and not self.wait_operation(response.json()["href"]):
+            self._logger.error(f"Не удалось переместить {src_path} в {dst_path}: операция завершилась ошибкой")
+            return False
+        self._logger.info(f"{self.cloud_folder}/{src_path} перемещён в {self.cloud_folder}/{dst_path}")
+        if self.delta_threshold:
+            self._move_blocks(src_path, dst_path)
+        return True
+
+    def _move_blocks(self, src_path, dst_path):
+        """
+        Переносит патчи и хэши блоков файла вслед за перемещённой базовой копией.
+        Если патчи перенести не удалось, хэши забываются и файл при следующей
+        перезаписи загружается целиком.
+        """
+
+        saved = self.upload_store.get_blocks(src_path)
+        if saved is None:
+            return
+        self.upload_store.drop_blocks(src_path)
+        if saved[3] and not self.move(delta.sidecar(src_path), delta.sidecar(dst_path)):
+            return
+        self.upload_store.save_blocks(dst_path, *saved)
 
     def get_info(self):
         """
@@ -122,9 +971,9 @@ class Yandex_disc():
         :raises requests.RequestException: при ошибке HTTP-запроса — возвращает пустой dict
         """
 
-        url = f"{self.base_url}?path={self.cloud_folder}"
+        params = {"path": self.cloud_folder}
         try:
-            response = requests.get(url, headers=self.headers)
+            response = self._request("GET", self.base_url, "info", params=params)
             response.raise_for_status()
             data = response.json()
             count = len(data.get("_embedded", {}).get("items", []))
@@ -132,4 +981,138 @@ class Yandex_disc():
             return data
         except requests.RequestException as e:
             self._logger.error("Не удалось получить данные: %s", e)
-            return {}
\ No newline at end of file
+            return {}
+
+    def mkdir(self, remote_path):
+        """
+        Создаёт папку в облаке. Уже существующая папка ошибкой не считается.
+
+        :param str remote_path: относительный путь папки внутри cloud_folder
+        :return: None
+        :raises requests.HTTPError: при ответе сервера, отличном от 201 и 409
+        """
+
+        params = {"path": f"{self.cloud_folder}/{remote_path}"}
+        response = self._request("PUT", self.base_url, "mkdir", params=params)
+        if response.status_code == 409:
+            return
+        response.raise_for_status()
+        self._logger.info(f"Создана папка {self.cloud_folder}/{remote_path}")
+
+    def list_names(self, remote_path):
+        """
+        Возвращает имена ресурсов внутри папки облака.
+
+        :param str remote_path: относительный путь папки внутри cloud_folder
+        :return: список имён; пустой, если папки нет
+        :rtype: List[str]
+        :raises requests.HTTPError: при ответе сервера, отличном от 200 и 404
+        """
+
+        try:
+            items = list(self._list_folder(f"{self.cloud_folder}/{remote_path}"))
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return []
+            raise
+        return [item["path"].rsplit("/", 1)[-1] for item in items]
+
+    def get_revision(self):
+        """
+        Возвращает ревизию Диска — число, которое растёт при любом изменении на Диске.
+
+        Запрашивается одно поле ресурса /v1/disk, поэтому запрос дешёвый: по нему
+        remote_cache.RemoteCache понимает, что облачное дерево не изменилось и листинг
+        можно пропустить.
+
+        :return: ревизия или None, если API её не вернул
+        :rtype: Optional[int]
+        :raises requests.RequestException: при ошибке HTTP-запроса
+        """
+
+        url = self.base_url.rsplit("/resources", 1)[0]
+        resp = self._request("GET", url, "revision", params={"fields": "revision"})
+        resp.raise_for_status()
+        return resp.json().get("revision")
+
+    def iter_items(self, flat=False, prune=None):
+        """
+        Перечисляет все ресурсы внутри cloud_folder, включая вложенные папки.
+
+        Элементы отдаются генератором по мере получения страниц, поэтому вызывающий код
+        может начинать обработку, не дожидаясь конца листинга. Запрашиваются только поля
+        из LIST_FIELDS.
+
+        :param bool flat: если True — использовать плоский эндпоинт /resources/files
+                          (только файлы, без папок); выгоднее, когда cloud_folder занимает
+                          большую часть диска и в нём много мелких папок
+        :param prune: функция item → bool для папок; True — содержимое папки не запрашивать
+                      (сама папка при этом отдаётся); при flat не используется
+        :return: генератор словарей с метаданными ресурсов (папки имеют type == 'dir')
+        :rtype: Iterator[dict]
+        :raises requests.RequestException: при ошибке HTTP-запроса — листинг не должен
+                быть неполным, иначе синхронизация удалит или перезагрузит лишнее
+        """
+
+        if flat:
+            yield from self._iter_flat()
+            return
+
+        count = 0
+        folders = deque([self.cloud_folder])
+        while folders:
+            folder = folders.popleft()
+            for item in self._list_folder(folder):
+                if item.get("type") == "dir" and not (prune and prune(item)):
+                    folders.append(item["path"])
+                count += 1
+                yield item
+        self._logger.info(f"В папке {self.cloud_folder} найдено {count} элементов")
+
+    def _list_folder(self, folder):
+        """
+        Постранично (limit/offset) перечисляет содержимое одной папки без рекурсии.
+
+        :param str folder: путь папки на диске (с префиксом disk:/ или без него)
+        :return: генератор словарей с метаданными ресурсов
+        :rtype: Iterator[dict]
+        """
+
+        fields = ",".join(["_embedded.total"] + [f"_embedded.items.{f}" for f in LIST_FIELDS])
+        offset = 0
+        while True:
+            params = {"path": folder, "limit": self.page_size, "offset": offset, "fields": fields}
+            resp = self._request("GET", self.base_url, "list", params=params)
+            resp.raise_for_status()
+            embedded = resp.json().get("_embedded", {})
+            items = embedded.get("items", [])
+            yield from items
+            offset += len(items)
+            if not items or offset >= embedded.get("total", 0):
+                return
+
+    def _iter_flat(self):
+        """
+        Перечисляет файлы cloud_folder через плоский список всех файлов диска.
+
+        :return: генератор словарей с метаданными файлов внутри cloud_folder
+        :rtype: Iterator[dict]
+        """
+
+        prefix = f"disk:/{self.cloud_folder}/"
+        fields = ",".join(f"items.{f}" for f in LIST_FIELDS)
+        count = 0
+        offset = 0
+        while True:
+            params = {"limit": self.page_size, "offset": offset, "fields": fields}
+            resp = self._request("GET", f"{self.base_url}/files", "list", params=params)
+            resp.raise_for_status()
+            items = resp.json().get("items", [])
+            for item in items:
+                if item["path"].startswith(prefix):
+                    count += 1
+                    yield item
+            offset += len(items)
+            if len(items) < self.page_size:
+                break
+        self._logger.info(f"В папке {self.cloud_folder} найдено {count} файлов")
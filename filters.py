@@ -0,0 +1,163 @@
+"""
+Модуль filters
+
+Правила включения и исключения файлов из синхронизации в стиле .gitignore:
+- `*.tmp`, `node_modules/` — шаблон без '/' внутри действует на любой глубине,
+- `/build`, `docs/*.pdf` — шаблон с '/' отсчитывается от корня папки синхронизации,
+- `**` — любое число каталогов, завершающий '/' — только каталоги,
+- `!шаблон` — вернуть ранее исключённое (последнее совпавшее правило побеждает;
+  файл внутри исключённого каталога вернуть нельзя — каталог не обходится).
+
+Шаблоны один раз компилируются в регулярные выражения; без правил с '!' все они
+сливаются в одно выражение. Кроме шаблонов поддерживаются ограничения на размер
+файла и на минимальный «возраст» (время с последнего изменения), чтобы не трогать
+файлы, которые ещё пишутся.
+"""
+
+import re
+import time
+from functools import lru_cache
+
+
+def _translate(pattern):
+    """Переводит шаблон .gitignore (без '!' и завершающего '/') в регулярное выражение."""
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    regex, i = [], 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            regex.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            regex.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            regex.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 2:]:
+            end = pattern.index("]", i + 2)
+            body = pattern[i + 1:end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            regex.append("[" + body.replace("\\", "\\\\") + "]")
+            i = end + 1
+        else:
+            regex.append(re.escape(pattern[i]))
+            i += 1
+    return ("" if anchored else "(?:.*/)?") + "".join(regex)
+
+
+class _Matcher():
+    """Упорядоченный набор правил (regex, negated) с семантикой «последнее совпавшее»."""
+
+    def __init__(self, rules):
+        self._rules = [(re.compile(regex), negated) for regex, negated in rules]
+        self._combined = None
+        if rules and not any(negated for _, negated in rules):
+            self._combined = re.compile("|".join(f"(?:{regex})" for regex, _ in rules))
+
+    def __bool__(self):
+        return bool(self._rules)
+
+    def excluded(self, path):
+        if self._combined is not None:
+            return self._combined.fullmatch(path) is not None
+        for regex, negated in reversed(self._rules):
+            if regex.fullmatch(path):
+                return not negated
+        return False
+
+
+class PathFilter():
+    """
+    Скомпилированный набор правил исключения.
+
+    :param Iterable[str] patterns: шаблоны в стиле .gitignore, по порядку
+    :param int max_size: файлы больше этого размера в байтах пропускаются (None — без ограничения)
+    :param float min_age: файлы, изменённые менее min_age секунд назад, пропускаются до
+                          следующего цикла (None — без ограничения)
+    """
+
+    def __init__(self, patterns=(), max_size=None, min_age=None):
+        dir_rules, file_rules = [], []
+        for pattern in patterns:
+            pattern = pattern.strip()
+            if not pattern or pattern.startswith("#"):
+                continue
+            negated = pattern.startswith("!")
+            pattern = pattern[1:] if negated else pattern
+            dir_only = pattern.endswith("/")
+            regex = _translate(pattern.rstrip("/"))
+            dir_rules.append((regex, negated))
+            if not dir_only:
+                file_rules.append((regex, negated))
+        self._dirs = _Matcher(dir_rules)
+        self._files = _Matcher(file_rules)
+        self.max_size = max_size
+        self.min_age = min_age
+        self.excludes_dir = lru_cache(maxsize=65536)(self._excludes_dir)
+
+    def __bool__(self):
+        return bool(self._dirs) or self.max_size is not None or self.min_age is not None
+
+    def _excludes_dir(self, rel):
+        """
+        Проверяет, исключён ли каталог (его содержимое тогда не обходится).
+
+        :param str rel: путь каталога относительно корня, через '/'
+        :rtype: bool
+        """
+        return self._dirs.excluded(rel)
+
+    def excludes_path(self, rel):
+        """
+        Проверяет, исключён ли файл по шаблонам (без учёта размера и возраста).
+
+        :param str rel: путь файла относительно корня, через '/'
+        :rtype: bool
+        """
+        return self._files.excluded(rel)
+
+    def skips(self, size, mtime):
+        """
+        Проверяет ограничения на размер и возраст файла.
+
+        :param int size: размер в байтах
+        :param float mtime: время последнего изменения в секундах
+        :return: True, если файл сейчас синхронизировать не нужно
+        :rtype: bool
+        """
+        if self.max_size is not None and size > self.max_size:
+            return True
+        return self.min_age is not None and time.time() - mtime < self.min_age
+
+    def excludes_remote(self, rel, size=None):
+        """
+        Применяет правила к файлу из облачного листинга так же, как при обходе локальной
+        папки: файл исключён, если исключён он сам или любой из его каталогов.
+
+        :param str rel: путь файла относительно облачной папки
+        :param int size: размер файла (для ограничения max_size) или None
+        :rtype: bool
+        """
+        if self.max_size is not None and size is not None and size > self.max_size:
+            return True
+        parts = rel.split("/")
+        for depth in range(1, len(parts)):
+            if self.excludes_dir("/".join(parts[:depth])):
+                return True
+        return self.excludes_path(rel)
+
+
+def parse_patterns(value):
+    """
+    Разбирает список шаблонов из config.ini: через запятую или по одному в строке.
+
+    :param str value: значение параметра
+    :return: список шаблонов
+    :rtype: List[str]
+    """
+    return [item.strip() for line in value.splitlines() for item in line.split(",") if item.strip()]
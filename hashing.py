@@ -0,0 +1,82 @@
+"""
+Модуль hashing
+
+Подсчёт md5 локальных файлов для сравнения с полем md5, которое отдаёт API Яндекс.Диска.
+Хэши кэшируются в SyncState по ключу (size, mtime_ns, inode), поэтому файл читается
+заново только если он действительно изменился. Крупные файлы хэшируются в пуле
+потоков (hashlib и чтение файла отпускают GIL, а fork многопоточного процесса
+небезопасен), мелкие — в текущем потоке, где передача в пул стоила бы дороже самого хэша.
+"""
+
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Файлы от этого размера (в байтах) хэшируются параллельно в пуле потоков
+POOL_THRESHOLD = 32 * 1024 * 1024
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_md5(path):
+    """
+    Считает md5 файла, читая его блоками.
+
+    :param str path: путь к файлу
+    :return: шестнадцатеричный md5
+    :rtype: str
+    :raises OSError: при ошибке чтения файла
+    """
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_files(root, files, cache=None, max_workers=None):
+    """
+    Возвращает md5 для набора файлов, используя кэш там, где файл не менялся.
+
+    :param str root: абсолютный путь к папке синхронизации
+    :param files: словарь относительный путь → FileStat
+    :param cache: объект с методами get_hash(path, stat) и put_hashes(rows) (например,
+                  SyncState) или None
+    :param int max_workers: размер пула потоков для крупных файлов (None — по числу CPU)
+    :return: словарь относительный путь → md5; файлы, которые не удалось прочитать, пропускаются
+    :rtype: Dict[str, str]
+    """
+    result = {}
+    small, large = [], []
+    for path, stat in files.items():
+        cached = cache.get_hash(path, stat) if cache is not None else None
+        if cached is not None:
+            result[path] = cached
+        elif stat.size >= POOL_THRESHOLD:
+            large.append(path)
+        else:
+            small.append(path)
+
+    computed = {}
+    for path in small:
+        try:
+            computed[path] = file_md5(os.path.join(root, path))
+        except OSError as exc:
+            logging.warning(f"Не удалось посчитать хэш {path}: {exc}")
+
+    if large:
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+            futures = {path: pool.submit(file_md5, os.path.join(root, path)) for path in large}
+            for path, future in futures.items():
+                try:
+                    computed[path] = future.result()
+                except OSError as exc:
+                    logging.warning(f"Не удалось посчитать хэш {path}: {exc}")
+
+    if computed:
+        logging.info(f"Посчитаны хэши {len(computed)} файлов, из кэша {len(result)}")
+        if cache is not None:
+            cache.put_hashes((path, files[path], md5) for path, md5 in computed.items())
+    result.update(computed)
+    return result
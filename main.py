@@ -1,109 +1,485 @@
 """
 main.py — точка входа сервиса синхронизации файлов.
+
+Кроме основной пары папок из [SETTINGS], config.ini может содержать секции
+[job:<имя>] — дополнительные задания синхронизации со своими папками, токеном,
+периодом и параметрами (недостающие берутся из [SETTINGS]). Все задания работают
+в одном процессе: у каждого свой поток-цикл и снимок состояния, а пул соединений,
+планировщик передач и ограничение скорости — общие.
+
+Метрики всех заданий собираются в общий реестр с меткой job и выдаются по HTTP
+(metrics_port, формат Prometheus) и/или в JSON-файл (metrics_file) после каждого цикла.
+
+SIGTERM и SIGINT останавливают программу мягко: новые циклы не начинаются, не начатые
+передачи отменяются, а начатые дорабатывают не дольше shutdown_timeout секунд. Каждая
+операция перед началом записывается в журнал снимка состояния; если прошлый запуск
+прервался посреди цикла, первый цикл — полная сверка с облаком. Иначе (тёплый старт)
+задание начинается без проверки токена и без листинга облака: если локальное дерево
+совпадает с сохранённым снимком, запросов к API нет вовсе.
+
+Облачное дерево каждого задания кэшируется в снимке состояния (remote_cache = true):
+цикл, которому нужно облако, сначала запрашивает ревизию Диска и перечисляет папки,
+только если она изменилась, пропуская неизменные поддеревья.
+
+С ключом --dry-run программа для каждого задания сверяет папки с облаком, печатает план
+цикла (операции с оценкой объёма, недостающие папки) и завершается, ничего не меняя;
+--format json выводит план в JSON.
 """
 
 from __future__ import annotations
 
+import argparse
 import configparser
+import json
 import logging
 import os
+import signal
 import sys
+import threading
 import time
 from datetime import datetime
 from pathlib import Path
-from typing import Tuple
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 
 import requests
 
 from logger import setup_logger
-from disc_API import Yandex_disc
-from sync import sync_cycle
+from disc_API import Yandex_disc, make_session
+from archive import ArchiveSet
+from filters import PathFilter, parse_patterns
+from metrics import NULL_METRICS, Metrics, MetricsServer
+from remote_cache import RemoteCache
+from scheduler import TokenBucket, TransferScheduler, parse_limits, parse_rules
+from state import SyncState
+from sync import plan_cycle, sync_cycle, sync_paths
+from watcher import DirtyQueue, start_watcher
 
 
 CONFIG_PATH = "config.ini"
 REQUIRED_KEYS = ("local_folder", "cloud_folder", "token",
                  "sync_period", "log_path")
 
+# Префикс секций дополнительных заданий: [job:photos]
+JOB_PREFIX = "job:"
+# Параметры задания, которые не наследуются из [SETTINGS]
+OWN_KEYS = ("local_folder", "cloud_folder", "state_path")
 
-def _load_and_validate_config(path: str = CONFIG_PATH) -> Tuple[str, str, str, int, str]:
-    """Читает config.ini и проверяет обязательные параметры, завершая программу при ошибках."""
-    config = configparser.ConfigParser()
-    if not config.read(path):
-        print("config.ini не найден. Скопируйте config_template.ini и заполните параметры.")
+# Исключения по умолчанию: временные файлы скачивания и файлы редакторов
+DEFAULT_EXCLUDE = ".*.part, *.swp, *~, ~$*"
+
+
+class SyncJob(NamedTuple):
+    """Задание синхронизации: пара папок со своим токеном, периодом и параметрами."""
+
+    name: str
+    local_folder: str
+    cloud_folder: str
+    token: str
+    sync_period: int
+    options: Dict[str, Any]
+
+
+def _load_options(settings: configparser.SectionProxy) -> Dict[str, Any]:
+    """Читает необязательные параметры секции; при некорректном значении завершает программу."""
+    try:
+        options = {
+            "flat_listing": settings.getboolean("flat_listing", fallback=False),
+            "max_workers": settings.getint("max_workers", fallback=4),
+            "state_path": settings.get("state_path", fallback="").strip(),
+            "watch": settings.getboolean("watch", fallback=False),
+            "debounce": settings.getfloat("debounce", fallback=0.5),
+            "scan_workers": settings.getint("scan_workers", fallback=1),
+            "permanently_delete": settings.getboolean("permanently_delete", fallback=False),
+            "two_way": settings.getboolean("two_way", fallback=False),
+            "download_connections": settings.getint("download_connections", fallback=4),
+            "resumable_threshold_mb": settings.getint("resumable_threshold_mb", fallback=256),
+            "delta_threshold_mb": settings.getint("delta_threshold_mb", fallback=0),
+            "priority": parse_rules(settings.get("priority", fallback="small, recent")),
+            "concurrency_limits": parse_limits(settings.get("concurrency_limits", fallback="delete:2")),
+            "bandwidth_limit_kb": settings.getint("bandwidth_limit_kb", fallback=0),
+            "exclude": parse_patterns(settings.get("exclude", fallback=DEFAULT_EXCLUDE)),
+            "max_file_size_mb": settings.getint("max_file_size_mb", fallback=0),
+            "min_file_age": settings.getfloat("min_file_age", fallback=0.0),
+            "archive_paths": parse_patterns(settings.get("archive_paths", fallback="")),
+            "metrics_port": settings.getint("metrics_port", fallback=0),
+            "metrics_file": settings.get("metrics_file", fallback="").strip(),
+            "shutdown_timeout": settings.getfloat("shutdown_timeout", fallback=30.0),
+            "remote_cache": settings.getboolean("remote_cache", fallback=True),
+        }
+    except ValueError as exc:
+        print(f"Некорректное значение параметра: {exc}")
         sys.exit(1)
 
-    if "SETTINGS" not in config:
-        print("В config.ini отсутствует секция [SETTINGS]")
+    for key in ("max_workers", "scan_workers", "download_connections"):
+        if options[key] <= 0:
+            print(f"{key} должен быть целым числом > 0")
+            sys.exit(1)
+    for key in ("resumable_threshold_mb", "delta_threshold_mb", "bandwidth_limit_kb", "max_file_size_mb",
+                "metrics_port"):
+        if options[key] < 0:
+            print(f"{key} должен быть целым числом >= 0")
+            sys.exit(1)
+    for key in ("min_file_age", "shutdown_timeout"):
+        if options[key] < 0:
+            print(f"{key} должен быть числом >= 0")
+            sys.exit(1)
+    if options["delta_threshold_mb"] and options["two_way"]:
+        # В облаке лежит базовая копия без патчей: скачивать её обратно нельзя
+        print("delta_threshold_mb несовместим с two_way = true")
         sys.exit(1)
+    options["path_filter"] = PathFilter(options["exclude"],
+                                        max_size=options["max_file_size_mb"] * 1024 * 1024 or None,
+                                        min_age=options["min_file_age"] or None)
+    options["archives"] = ArchiveSet(options["archive_paths"])
+    return options
 
-    settings = config["SETTINGS"]
+
+def _load_job(name: str, settings: configparser.SectionProxy) -> SyncJob:
+    """Проверяет параметры одного задания, завершая программу при ошибках."""
+    where = "" if settings.name == "SETTINGS" else f" в секции [{settings.name}]"
     missing = [k for k in REQUIRED_KEYS if k not in settings or not settings[k].strip()]
     if missing:
-        print(f"Не заданы параметры: {', '.join(missing)}")
+        print(f"Не заданы параметры{where}: {', '.join(missing)}")
         sys.exit(1)
 
     local_folder = settings["local_folder"].strip()
-    cloud_folder = settings["cloud_folder"].strip()
-    token = settings["token"].strip()
-    log_path = settings["log_path"].strip()
-
     try:
         sync_period = int(settings["sync_period"])
         if sync_period <= 0:
             raise ValueError
     except ValueError:
-        print("sync_period должен быть целым числом > 0")
+        print(f"sync_period{where} должен быть целым числом > 0")
         sys.exit(1)
 
     if not Path(local_folder).is_dir():
         print(f"Папка синхронизации не найдена: {local_folder}")
         sys.exit(1)
 
-    return local_folder, cloud_folder, token, sync_period, log_path
+    return SyncJob(name, local_folder, settings["cloud_folder"].strip(), settings["token"].strip(),
+                   sync_period, _load_options(settings))
+
+
+def _load_and_validate_config(path: str = CONFIG_PATH) -> Tuple[str, Dict[str, Any], List[SyncJob]]:
+    """
+    Читает config.ini и проверяет параметры, завершая программу при ошибках.
+
+    :return: путь к логу, общие параметры процесса (из [SETTINGS]) и список заданий
+    """
+    config = configparser.ConfigParser()
+    if not config.read(path):
+        print("config.ini не найден. Скопируйте config_template.ini и заполните параметры.")
+        sys.exit(1)
+
+    if "SETTINGS" not in config:
+        print("В config.ini отсутствует секция [SETTINGS]")
+        sys.exit(1)
+
+    settings = config["SETTINGS"]
+    log_path = settings.get("log_path", "").strip()
+    if not log_path:
+        print("Не заданы параметры: log_path")
+        sys.exit(1)
+
+    sections = [name for name in config.sections() if name.lower().startswith(JOB_PREFIX)]
+    jobs = []
+    if "local_folder" in settings or not sections:
+        jobs.append(_load_job("main", settings))
+    for section in sections:
+        job_settings = config[section]
+        for key, value in settings.items():
+            if key not in OWN_KEYS and key not in job_settings:
+                job_settings[key] = value
+        jobs.append(_load_job(section[len(JOB_PREFIX):].strip(), job_settings))
+
+    names = [job.name for job in jobs]
+    folders = [os.path.abspath(job.local_folder) for job in jobs]
+    if len(set(names)) != len(names) or len(set(folders)) != len(folders):
+        print("Имена заданий и их папки local_folder не должны повторяться")
+        sys.exit(1)
+    return log_path, _load_options(settings), jobs
 
 
-def _check_token(client: Yandex_disc) -> None:
-    """Пробует запросить get_info(); завершает программу при 401/403."""
+def _check_token(client: Yandex_disc) -> bool:
+    """Запрашивает ревизию Диска; возвращает False при 401/403 или недоступности API."""
     try:
-        client.get_info()
+        client.get_revision()
     except requests.HTTPError as exc:
         if exc.response is not None and exc.response.status_code in (401, 403):
-            print("Неверный OAuth-токен — проверьте config.ini")
-            sys.exit(1)
+            print(f"Неверный OAuth-токен для папки {client.cloud_folder} — проверьте config.ini")
+            return False
         raise
     except requests.RequestException as exc:
         logging.error(f"Не удалось проверить токен: {exc}")
-        sys.exit(1)
+        return False
+    return True
+
+
+def _report_failures(results) -> None:
+    """Пишет в лог операции, завершившиеся ошибкой."""
+    for result in results:
+        if not result.ok:
+            logging.warning(f"Операция {result.action} для {result.path} не выполнена: {result.error}")
+
+
+def _scheduler(options: Dict[str, Any]) -> TransferScheduler:
+    """Создаёт планировщик передач по параметрам конфигурации."""
+    return TransferScheduler(options["max_workers"], rules=options["priority"],
+                             limits=options["concurrency_limits"])
+
+
+def _remote_cache(job: SyncJob, state: SyncState) -> Optional[RemoteCache]:
+    """Создаёт кэш облачного дерева задания, если он включён."""
+    return RemoteCache(state) if job.options["remote_cache"] else None
+
+
+def _run_cycle(job: SyncJob, client: Yandex_disc, state: SyncState, scheduler: TransferScheduler,
+               force: bool = False, remote: Optional[RemoteCache] = None) -> None:
+    """Выполняет один полный цикл синхронизации задания и пишет итоги в лог."""
+    options = job.options
+    results = sync_cycle(client, job.local_folder,
+                         flat_listing=options["flat_listing"],
+                         max_workers=options["max_workers"],
+                         state=state, force=force,
+                         scan_workers=options["scan_workers"],
+                         two_way=options["two_way"],
+                         scheduler=scheduler,
+                         path_filter=options["path_filter"],
+                         metrics=client.metrics,
+                         archives=options["archives"],
+                         remote_cache=remote)
+    _report_failures(results)
+    if options["metrics_file"]:
+        client.metrics.write_json(options["metrics_file"])
+    for endpoint, stat in client.get_stats().items():
+        logging.info(f"[{job.name}] API {endpoint}: вызовов={stat['calls']}, повторов={stat['retries']}, "
+                     f"ошибок={stat['errors']}, среднее={stat['avg_time']:.3f} с")
+
+
+def _warm_start(job: SyncJob, state: SyncState) -> bool:
+    """
+    Проверяет, можно ли начать задание без полной сверки с облаком: журнал прошлого
+    запуска пуст, а снимок не пуст и сделан для той же облачной папки.
+    """
+    pending = state.pending_operations()
+    if pending:
+        logging.warning(f"[{job.name}] Прошлый запуск прервался, незавершённых операций: {len(pending)}; "
+                        f"они будут перепроверены полной сверкой")
+        for action, path, _ in pending:
+            logging.info(f"[{job.name}] Незавершённая операция {action} для {path}")
+        return False
+    return len(state) > 0 and state.get_meta("cloud_folder") == job.cloud_folder
+
+
+def _run_job(job: SyncJob, client: Yandex_disc, state: SyncState, scheduler: TransferScheduler,
+             queue: Optional[DirtyQueue], stop: threading.Event, warm: bool = False) -> None:
+    """
+    Цикл одного задания в отдельном потоке. Ошибки задания пишутся в лог и не
+    затрагивают остальные задания; после установки stop новые циклы не начинаются.
+    """
+    remote = _remote_cache(job, state)
+    try:
+        _run_cycle(job, client, state, scheduler, force=not warm, remote=remote)
+        state.set_meta("cloud_folder", job.cloud_folder)
+    except Exception as exc:
+        logging.error(f"[{job.name}] Первая синхронизация завершилась с ошибкой: {exc}")
+        print(f"Первый запуск задания {job.name} неудачен, подробности в логе.")
+
+    if queue is not None:
+        _watch_loop(job, client, state, scheduler, queue, stop, remote)
+        return
+    while not stop.wait(job.sync_period):
+        try:
+            _run_cycle(job, client, state, scheduler, remote=remote)
+        except Exception as exc:
+            logging.error(f"[{job.name}] Ошибка в цикле синхронизации: {exc}")
+
+
+def _install_signal_handlers(stop: threading.Event) -> None:
+    """Устанавливает обработчики SIGTERM и SIGINT, запрашивающие мягкую остановку."""
+    def handle(signum, frame):
+        logging.info(f"Получен сигнал {signal.Signals(signum).name}, завершение работы")
+        stop.set()
 
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, handle)
 
-def main() -> None:
-    local_folder, cloud_folder, token, sync_period, log_path = _load_and_validate_config()
+
+def _drain(stop: threading.Event, scheduler: TransferScheduler, queues: List[DirtyQueue],
+           runners: List[threading.Thread], timeout: float) -> bool:
+    """
+    Останавливает задания: новые циклы и передачи не начинаются, начатые передачи
+    дорабатывают, после чего задания записывают результаты в снимок.
+
+    :return: True, если всё завершилось за timeout секунд
+    """
+    deadline = time.monotonic() + timeout
+    stop.set()
+    for queue in queues:
+        queue.close()
+    drained = scheduler.shutdown(timeout)
+    for runner in runners:
+        runner.join(max(0.0, deadline - time.monotonic()))
+    return drained and not any(runner.is_alive() for runner in runners)
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(description="Синхронизация локальных папок с Яндекс.Диском")
+    parser.add_argument("--config", default=CONFIG_PATH, help="путь к config.ini")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="показать план синхронизации каждого задания и выйти, ничего не меняя")
+    parser.add_argument("--format", choices=("text", "json"), default="text",
+                        help="формат вывода плана для --dry-run")
+    return parser.parse_args(argv)
+
+
+def _state_path(job: SyncJob, log_path: str) -> str:
+    """Возвращает путь к снимку состояния задания."""
+    default_state = "state.db" if job.name == "main" else f"state-{job.name}.db"
+    return job.options["state_path"] or os.path.join(os.path.dirname(log_path), default_state)
+
+
+def _dry_run(jobs: List[SyncJob], log_path: str, session: requests.Session, fmt: str) -> int:
+    """
+    Строит и печатает план полного цикла каждого задания, не выполняя его. Снимок
+    состояния открывается копией в памяти, так что кэши md5 и облачного дерева,
+    обновлённые при планировании, в файл не записываются.
+
+    :return: код завершения: 0, если планы построены для всех заданий, иначе 1
+    """
+    plans, code = {}, 0
+    for job in jobs:
+        state = SyncState(_state_path(job, log_path), in_memory=True)
+        client = Yandex_disc(job.cloud_folder, job.token, session=session, upload_store=state)
+        try:
+            if not _check_token(client):
+                code = 1
+                continue
+            plans[job.name] = plan_cycle(client, job.local_folder,
+                                         flat_listing=job.options["flat_listing"],
+                                         state=state, force=True,
+                                         scan_workers=job.options["scan_workers"],
+                                         two_way=job.options["two_way"],
+                                         path_filter=job.options["path_filter"],
+                                         archives=job.options["archives"],
+                                         remote_cache=_remote_cache(job, state))
+        except Exception as exc:
+            logging.error(f"[{job.name}] Не удалось построить план: {exc}")
+            print(f"Не удалось построить план задания {job.name}: {exc}")
+            code = 1
+        finally:
+            state.close()
+
+    if fmt == "json":
+        print(json.dumps({name: plan.to_dict() for name, plan in plans.items()}, ensure_ascii=False, indent=2))
+    else:
+        for name, plan in plans.items():
+            print(f"[{name}] " + "\n".join(plan.describe()))
+    return code
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = _parse_args(argv)
+    log_path, options, jobs = _load_and_validate_config(args.config)
+    if args.dry_run:
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        setup_logger(log_path)
+        sys.exit(_dry_run(jobs, log_path, make_session(10), args.format))
     print("Синхронизатор запущен.")
 
     os.makedirs(os.path.dirname(log_path), exist_ok=True)
     setup_logger(log_path)
-    logging.info(f"Запуск программы: {datetime.now().isoformat()}, папка={local_folder}")
+    logging.info(f"Запуск программы: {datetime.now().isoformat()}, "
+                 f"задания: {', '.join(f'{job.name}={job.local_folder}' for job in jobs)}")
 
-    disc = Yandex_disc(cloud_folder, token)
-    _check_token(disc)
+    # Общие для всех заданий ресурсы
+    session = make_session(max(10, options["max_workers"]))
+    scheduler = _scheduler(options)
+    throttle = TokenBucket(options["bandwidth_limit_kb"] * 1024)
+    collect = options["metrics_port"] or any(job.options["metrics_file"] for job in jobs)
+    metrics = Metrics() if collect else NULL_METRICS
 
+    stop = threading.Event()
+    _install_signal_handlers(stop)
+    runners, watchers, queues, server = [], [], [], None
     try:
-        sync_cycle(disc, local_folder)
-    except Exception as exc:
-        logging.error(f"Первая синхронизация завершилась с ошибкой: {exc}")
-        print("Первый запуск неудачен, подробности в логе.")
-        sys.exit(1)
+        if options["metrics_port"]:
+            server = MetricsServer(metrics, options["metrics_port"]).start()
+        for job in jobs:
+            state = SyncState(_state_path(job, log_path))
+            client = Yandex_disc(job.cloud_folder, job.token, session=session,
+                                 permanently=job.options["permanently_delete"],
+                                 download_connections=job.options["download_connections"],
+                                 resumable_threshold=job.options["resumable_threshold_mb"] * 1024 * 1024,
+                                 delta_threshold=job.options["delta_threshold_mb"] * 1024 * 1024,
+                                 upload_store=state, throttle=throttle,
+                                 fetch_modified=job.options["two_way"],
+                                 metrics=metrics.bind(job=job.name))
+            # При тёплом старте токен проверяется первым же запросом цикла
+            warm = _warm_start(job, state)
+            if warm:
+                logging.info(f"[{job.name}] Тёплый старт: используется сохранённый снимок ({len(state)} файлов)")
+            elif not _check_token(client):
+                logging.error(f"[{job.name}] Задание пропущено: токен не прошёл проверку")
+                continue
 
-    try:
-        while True:
-            time.sleep(sync_period)
-            try:
-                sync_cycle(disc, local_folder)
-            except Exception as exc:
-                logging.error(f"Ошибка в цикле синхронизации: {exc}")
+            queue = DirtyQueue(debounce=job.options["debounce"]) if job.options["watch"] else None
+            # Наблюдатель стартует до первой синхронизации, чтобы не потерять события во время неё
+            if queue is not None:
+                queues.append(queue)
+                watchers.append(start_watcher(job.local_folder, queue, poll_interval=job.sync_period,
+                                              path_filter=job.options["path_filter"]))
+            runner = threading.Thread(target=_run_job, args=(job, client, state, scheduler, queue, stop, warm),
+                                      name=f"job-{job.name}", daemon=True)
+            runner.start()
+            runners.append(runner)
+
+        if not runners:
+            print("Нет ни одного задания с действующим токеном.")
+            sys.exit(1)
+        while not stop.is_set() and any(runner.is_alive() for runner in runners):
+            stop.wait(1)
     except KeyboardInterrupt:
-        logging.info("Завершение работы программы")
+        pass
+    finally:
+        if _drain(stop, scheduler, queues, runners, options["shutdown_timeout"]):
+            logging.info("Завершение работы программы: начатые операции завершены")
+        else:
+            logging.warning("Завершение работы программы: не все операции завершились за shutdown_timeout, "
+                            "при следующем запуске они будут перепроверены")
         print("Синхронизатор остановлен.")
+        for watcher in watchers:
+            watcher.stop()
+        if server is not None:
+            server.stop()
+
+
+def _watch_loop(job: SyncJob, client: Yandex_disc, state: SyncState, scheduler: TransferScheduler,
+                queue: DirtyQueue, stop: threading.Event, remote: Optional[RemoteCache] = None) -> None:
+    """
+    Синхронизирует пачки изменённых путей по мере их появления и раз в sync_period
+    выполняет полную сверку с облаком на случай пропущенных событий.
+    """
+    next_full = time.monotonic() + job.sync_period
+    while not stop.is_set():
+        paths = queue.get(timeout=max(0.0, next_full - time.monotonic()))
+        if stop.is_set():
+            return
+        try:
+            if paths:
+                logging.info(f"[{job.name}] Изменено путей: {len(paths)}")
+                _report_failures(sync_paths(client, job.local_folder, paths, state,
+                                            max_workers=job.options["max_workers"],
+                                            scheduler=scheduler,
+                                            path_filter=job.options["path_filter"],
+                                            metrics=client.metrics,
+                                            archives=job.options["archives"],
+                                            remote_cache=remote))
+            if time.monotonic() >= next_full:
+                _run_cycle(job, client, state, scheduler, force=True, remote=remote)
+                next_full = time.monotonic() + job.sync_period
+        except Exception as exc:
+            logging.error(f"[{job.name}] Ошибка в цикле синхронизации: {exc}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,321 @@
+"""
+Модуль metrics
+
+Метрики циклов синхронизации и вызовов API:
+- Metrics — потокобезопасный реестр счётчиков, значений (gauge) и гистограмм с метками;
+- span и PhaseTimer — замер длительности блока или последовательных фаз цикла (скан,
+  листинг, сверка, передачи, ...) в гистограмму с записью в лог на уровне DEBUG;
+- выдача в текстовом формате Prometheus (MetricsServer, GET /metrics) или в JSON-файл
+  (Metrics.write_json), который обновляется после каждого цикла.
+
+Метрики заданий различаются меткой job: Metrics.bind(job=...) возвращает представление
+реестра, добавляющее метку ко всем записям.
+"""
+
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Границы корзин гистограмм длительности, в секундах
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+HELP = {
+    "sync_cycles_total": "Число выполненных циклов синхронизации",
+    "sync_cycle_seconds": "Длительность цикла синхронизации",
+    "sync_phase_seconds": "Длительность фаз цикла синхронизации",
+    "sync_last_cycle_timestamp": "Время окончания последнего цикла (unix)",
+    "sync_files": "Число файлов по сторонам на момент последнего цикла",
+    "sync_diff_files": "Размер расхождения в последнем цикле по видам",
+    "sync_operations_total": "Операции синхронизации по видам и результату",
+    "sync_bytes_total": "Переданные байты по направлениям",
+    "api_request_seconds": "Длительность HTTP-запросов к API по эндпоинтам",
+    "api_errors_total": "Ответы с ошибкой и сетевые сбои по эндпоинтам",
+    "api_retries_total": "Повторы запросов по эндпоинтам",
+    "client_seconds": "Длительность операций клиента (загрузка, скачивание)",
+    "delta_patch_bytes_total": "Объём патчей, загруженных в режиме дельты",
+    "remote_cache_total": "Обновления кэша облачного дерева: hit — без листинга, incremental, full",
+}
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class PhaseTimer():
+    """
+    Замер последовательных фаз: enter(phase) закрывает предыдущую фазу и открывает новую.
+
+    :param metrics: Metrics, BoundMetrics или NullMetrics
+    :param str name: имя гистограммы
+    :param dict labels: метки, добавляемые к каждой фазе
+    """
+
+    def __init__(self, metrics, name, labels):
+        self._metrics = metrics
+        self._name = name
+        self._labels = labels
+        self._phase = None
+        self._started = 0.0
+
+    def enter(self, phase):
+        """Начинает фазу phase, завершив текущую."""
+        self.finish()
+        self._phase = phase
+        self._started = time.perf_counter()
+
+    def finish(self):
+        """Завершает текущую фазу и записывает её длительность."""
+        if self._phase is None:
+            return
+        elapsed = time.perf_counter() - self._started
+        self._metrics.observe(self._name, elapsed, phase=self._phase, **self._labels)
+        logging.getLogger(__name__).debug(f"span {self._name} phase={self._phase}: {elapsed:.4f} с")
+        self._phase = None
+
+
+class Metrics():
+    """Реестр метрик. Все методы можно вызывать из любых потоков."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def bind(self, **labels):
+        """
+        Возвращает представление реестра, добавляющее метки ко всем записям.
+
+        :param labels: постоянные метки (например, job="photos")
+        :rtype: BoundMetrics
+        """
+        return BoundMetrics(self, labels)
+
+    def inc(self, name, value=1, **labels):
+        """Увеличивает счётчик name на value."""
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[_key(labels)] = series.get(_key(labels), 0) + value
+
+    def set(self, name, value, **labels):
+        """Устанавливает значение gauge name."""
+        with self._lock:
+            self._gauges.setdefault(name, {})[_key(labels)] = value
+
+    def observe(self, name, value, **labels):
+        """Добавляет наблюдение в гистограмму name."""
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(_key(labels))
+            if hist is None:
+                hist = series[_key(labels)] = {"buckets": [0] * len(BUCKETS), "count": 0, "sum": 0.0}
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    hist["buckets"][i] += 1
+            hist["count"] += 1
+            hist["sum"] += value
+
+    @contextmanager
+    def span(self, name, **labels):
+        """
+        Замеряет длительность блока и записывает её в гистограмму name.
+
+        :param str name: имя гистограммы (например, sync_phase_seconds)
+        :param labels: метки (например, phase="scan")
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.observe(name, elapsed, **labels)
+            logging.getLogger(__name__).debug(
+                f"span {name} {' '.join(f'{k}={v}' for k, v in sorted(labels.items()))}: {elapsed:.4f} с")
+
+    def phases(self, name, **labels):
+        """
+        Возвращает PhaseTimer для замера последовательных фаз в гистограмму name.
+
+        :rtype: PhaseTimer
+        """
+        return PhaseTimer(self, name, labels)
+
+    def snapshot(self):
+        """
+        Возвращает копию всех метрик.
+
+        :return: словарь {"counters", "gauges", "histograms"}; в каждом имя метрики →
+                 список {"labels": {...}, ...значения}
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                "counters": {name: [{"labels": dict(k), "value": v} for k, v in series.items()]
+                             for name, series in self._counters.items()},
+                "gauges": {name: [{"labels": dict(k), "value": v} for k, v in series.items()]
+                           for name, series in self._gauges.items()},
+                "histograms": {name: [{"labels": dict(k), "buckets": dict(zip(map(str, BUCKETS), h["buckets"])),
+                                       "count": h["count"], "sum": h["sum"]} for k, h in series.items()]
+                               for name, series in self._histograms.items()},
+            }
+
+    def render_prometheus(self):
+        """
+        Возвращает метрики в текстовом формате экспозиции Prometheus.
+
+        :rtype: str
+        """
+        def fmt(labels, extra=None):
+            items = sorted(labels.items()) + (extra or [])
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+        snap = self.snapshot()
+        lines = []
+        for kind, section in (("counter", "counters"), ("gauge", "gauges")):
+            for name, series in sorted(snap[section].items()):
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{fmt(s['labels'])} {_number(s['value'])}" for s in series)
+        for name, series in sorted(snap["histograms"].items()):
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for s in series:
+                for bound, count in s["buckets"].items():
+                    lines.append(f"{name}_bucket{fmt(s['labels'], [('le', bound)])} {count}")
+                lines.append(f"{name}_bucket{fmt(s['labels'], [('le', '+Inf')])} {s['count']}")
+                lines.append(f"{name}_sum{fmt(s['labels'])} {_number(s['sum'])}")
+                lines.append(f"{name}_count{fmt(s['labels'])} {s['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path):
+        """
+        Атомарно записывает снимок метрик в JSON-файл.
+
+        :param str path: путь к файлу
+        :return: None
+        """
+        folder = os.path.dirname(path) or "."
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"time": time.time(), **self.snapshot()}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+
+
+class BoundMetrics():
+    """Представление Metrics с постоянными метками (см. Metrics.bind)."""
+
+    def __init__(self, metrics, labels):
+        self._metrics = metrics
+        self._labels = labels
+
+    def bind(self, **labels):
+        return BoundMetrics(self._metrics, {**self._labels, **labels})
+
+    def inc(self, name, value=1, **labels):
+        self._metrics.inc(name, value, **self._labels, **labels)
+
+    def set(self, name, value, **labels):
+        self._metrics.set(name, value, **self._labels, **labels)
+
+    def observe(self, name, value, **labels):
+        self._metrics.observe(name, value, **self._labels, **labels)
+
+    def span(self, name, **labels):
+        return self._metrics.span(name, **self._labels, **labels)
+
+    def phases(self, name, **labels):
+        return PhaseTimer(self, name, labels)
+
+    def write_json(self, path):
+        self._metrics.write_json(path)
+
+
+class NullMetrics():
+    """Заглушка с интерфейсом Metrics, когда метрики не собираются."""
+
+    def bind(self, **labels):
+        return self
+
+    def inc(self, name, value=1, **labels):
+        pass
+
+    def set(self, name, value, **labels):
+        pass
+
+    def observe(self, name, value, **labels):
+        pass
+
+    @contextmanager
+    def span(self, name, **labels):
+        yield
+
+    def phases(self, name, **labels):
+        return PhaseTimer(self, name, labels)
+
+    def write_json(self, path):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    if isinstance(value, float) and not math.isfinite(value):
+        return "+Inf" if value > 0 else ("-Inf" if value < 0 else "NaN")
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class MetricsServer():
+    """
+    HTTP-эндпоинт /metrics в формате Prometheus, работающий в фоновом потоке.
+
+    :param Metrics metrics: реестр метрик
+    :param int port: порт (0 — выбрать свободный)
+    :param str host: адрес для прослушивания
+    """
+
+    def __init__(self, metrics, port, host="127.0.0.1"):
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server",
+                                        daemon=True)
+
+    def start(self):
+        """Запускает сервер; возвращает self."""
+        self._thread.start()
+        logging.getLogger(__name__).info(f"Метрики доступны на порту {self.port} (/metrics)")
+        return self
+
+    def stop(self):
+        """Останавливает сервер."""
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,173 @@
+"""
+Модуль remote_cache
+
+Кэш облачного дерева между циклами и запусками. Без него каждый цикл, которому нужно
+облако (полная сверка, двусторонний режим), заново перечисляет всю облачную папку
+и разбирает modified каждого файла, даже если в облаке ничего не изменилось.
+
+Перед листингом запрашивается ревизия Диска (Yandex_disc.get_revision) — одно поле,
+которое растёт при любом изменении на Диске. Если она совпадает с ревизией, при которой
+был сделан кэш, дерево берётся из кэша без листинга. Иначе облако перечисляется заново.
+Ревизия Диска запоминается до листинга, так что изменения, сделанные во время него,
+приведут к обновлению в следующем цикле.
+
+Отсечение поддеревьев (prune=True) дополнительно не запрашивает содержимое папки, чья
+ревизия в листинге родителя не изменилась. Оно выключено по умолчанию: API не обещает,
+что изменение во вложенной папке меняет ревизию всех её предков, а при устаревшем
+поддереве новые файлы выглядели бы удалёнными из облака. Пути, которые клиент изменил
+сам, сбрасываются из кэша вызовом invalidate.
+
+В памяти файл хранится кортежем RemoteEntry (с уже разобранным временем), папка —
+ревизией; в снимке состояния (SyncState) — таблицей remote, куда пишутся только
+изменившиеся строки.
+"""
+
+import logging
+from datetime import datetime
+from pathlib import PurePosixPath
+from typing import NamedTuple, Optional
+
+from metrics import NULL_METRICS
+
+
+class RemoteEntry(NamedTuple):
+    """Метаданные облачного файла: modified в формате API, он же в секундах, md5 и размер."""
+
+    modified: str
+    mtime: float
+    md5: Optional[str]
+    size: Optional[int]
+
+
+class RemoteCache():
+    """
+    Облачное дерево cloud_folder: файлы (путь → RemoteEntry) и папки (путь → ревизия),
+    пути относительные, через '/'.
+
+    :param state: SyncState, в котором кэш хранится между запусками; None — кэш
+                  не используется, и каждый refresh — полный листинг
+    :param bool prune: не перечислять папки, ревизия которых не изменилась
+    """
+
+    def __init__(self, state=None, prune=False):
+        self.state = state
+        self.prune = prune
+        self.files = {}
+        self.dirs = {}
+        self.folder = None
+        self.revision = None
+        # Последний refresh вернул дерево (целиком или частично) из кэша, а не из листинга
+        self.cached = False
+        if state is not None:
+            self.folder = state.get_meta("remote_folder")
+            revision = state.get_meta("remote_revision")
+            self.revision = int(revision) if revision else None
+            for path, is_dir, modified, mtime, md5, size, folder_revision in state.get_remote():
+                if is_dir:
+                    self.dirs[path] = folder_revision
+                else:
+                    self.files[path] = RemoteEntry(modified, mtime, md5, size)
+
+    def refresh(self, client, flat=False, metrics=NULL_METRICS, full=False):
+        """
+        Приводит кэш в соответствие с облаком и возвращает облачное дерево.
+
+        :param client: Yandex_disc (get_revision нужен, только если задан state)
+        :param bool flat: перечислять файлы через плоский эндпоинт (без папок; неизменные
+                          поддеревья при этом не пропускаются)
+        :param metrics: metrics.Metrics для счётчика remote_cache_total
+        :param bool full: перечислить облако целиком, не используя кэш
+        :return: (файлы: путь → RemoteEntry, папки: путь → ревизия или None)
+        :rtype: Tuple[Dict[str, RemoteEntry], Dict[str, Optional[int]]]
+        :raises requests.RequestException: при ошибке запроса — кэш при этом не меняется
+        """
+        reset = self.folder != client.cloud_folder
+        if reset:
+            self.files, self.dirs, self.revision = {}, {}, None
+
+        revision = client.get_revision() if self.state is not None else None
+        if revision is not None and revision == self.revision and not full:
+            logging.info(f"Облако не изменилось (ревизия {revision}), листинг пропущен")
+            metrics.inc("remote_cache_total", result="hit")
+            self.cached = True
+            return self.files, self.dirs
+
+        prefix = f"disk:/{client.cloud_folder}/"
+        files, dirs, pruned = {}, {}, set()
+
+        def prune(item):
+            rel = item["path"].removeprefix(prefix)
+            if item.get("revision") is not None and self.dirs.get(rel) == item["revision"]:
+                pruned.add(rel)
+                return True
+            return False
+
+        if self.prune and self.dirs and not flat and not full:
+            items = client.iter_items(flat=flat, prune=prune)
+        else:
+            items = client.iter_items(flat=flat)
+        for item in items:
+            path_disk = item["path"]
+            if not path_disk.startswith(prefix):
+                logging.warning(f"Неожиданный формат пути: {path_disk}")
+                continue
+            rel = path_disk.removeprefix(prefix)
+            if item.get("type") == "dir":
+                dirs[rel] = item.get("revision")
+                continue
+            old = self.files.get(rel)
+            mtime = old.mtime if old is not None and old.modified == item["modified"] else \
+                datetime.fromisoformat(item["modified"]).timestamp()
+            files[rel] = RemoteEntry(item["modified"], mtime, item.get("md5"), item.get("size"))
+
+        if pruned:
+            for path, entry in self.files.items():
+                if any(parent in pruned for parent in _parents(path)):
+                    files[path] = entry
+            for path, folder_revision in self.dirs.items():
+                if any(parent in pruned for parent in _parents(path)):
+                    dirs[path] = folder_revision
+            logging.info(f"Кэш облака: неизменных папок пропущено {len(pruned)}")
+        metrics.inc("remote_cache_total", result="incremental" if pruned else "full")
+
+        if self.state is not None:
+            self._save(files, dirs, revision, client.cloud_folder, reset)
+        self.files, self.dirs, self.revision, self.folder = files, dirs, revision, client.cloud_folder
+        self.cached = bool(pruned)
+        return files, dirs
+
+    def invalidate(self, paths):
+        """
+        Забывает пути, изменённые самим клиентом (загрузки, удаления, перемещения, новые
+        папки), и ревизии их папок-предков, а также ревизию Диска: следующий refresh
+        перечислит облако и эти папки заново.
+
+        :param Iterable[str] paths: относительные пути через '/'
+        """
+        paths = list(paths)
+        if not paths:
+            return
+        removed = set()
+        for path in paths:
+            for stale in (path, *_parents(path)):
+                if self.files.pop(stale, None) is not None or stale in self.dirs:
+                    self.dirs.pop(stale, None)
+                    removed.add(stale)
+        self.revision = None
+        if self.state is not None:
+            self.state.save_remote([], sorted(removed), clear=False)
+            self.state.set_meta("remote_revision", "")
+
+    def _save(self, files, dirs, revision, folder, reset):
+        """Записывает в снимок состояния только изменившиеся строки кэша."""
+        rows = [(path, 0, *entry, None) for path, entry in files.items() if self.files.get(path) != entry]
+        rows.extend((path, 1, None, None, None, None, folder_revision) for path, folder_revision in dirs.items()
+                    if path not in self.dirs or self.dirs[path] != folder_revision)
+        removed = [path for path in (*self.files, *self.dirs) if path not in files and path not in dirs]
+        self.state.save_remote(rows, removed, clear=reset)
+        self.state.set_meta("remote_folder", folder)
+        self.state.set_meta("remote_revision", "" if revision is None else revision)
+
+
+def _parents(path):
+    return [str(parent) for parent in PurePosixPath(path).parents if str(parent) != "."]
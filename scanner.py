@@ -0,0 +1,158 @@
+"""
+Модуль scanner
+
+Быстрый обход локального дерева на os.scandir:
+- тип записи берётся из DirEntry без лишних системных вызовов, stat делается один раз на файл,
+- каталоги обходятся без рекурсии и без слияния промежуточных словарей,
+- при workers > 1 каталоги читаются параллельно в пуле потоков (scandir и stat
+  отпускают GIL, что заметно на сетевых дисках),
+- результат хранится по столбцам (ScanResult) в компактных массивах array,
+- исключённые фильтром (filters.PathFilter) каталоги отсекаются при обходе и не читаются.
+"""
+
+import logging
+import os
+from array import array
+from collections.abc import Mapping
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import NamedTuple
+
+
+class FileStat(NamedTuple):
+    """Метаданные локального файла, по которым определяются изменения."""
+
+    size: int
+    mtime_ns: int
+    inode: int
+
+    @property
+    def mtime(self):
+        """Время последней модификации в секундах с плавающей точкой."""
+        return self.mtime_ns / 1e9
+
+
+class ScanResult(Mapping):
+    """
+    Результат обхода: относительный путь → FileStat, хранимый по столбцам.
+
+    Размеры, mtime и inode лежат в array('q'/'Q'), а не в отдельных объектах на каждый
+    файл; FileStat создаётся только при обращении к элементу. Поддерживает интерфейс
+    словаря только для чтения (in, [], get, items, keys). В skipped собираются пути
+    файлов, отложенных фильтром по размеру или возрасту: они существуют локально,
+    и их облачные копии нельзя считать удалёнными.
+    """
+
+    def __init__(self):
+        self.skipped = set()
+        self.paths = []
+        self.sizes = array("q")
+        self.mtimes_ns = array("q")
+        self.inodes = array("Q")
+        self._index = {}
+
+    def add(self, path, size, mtime_ns, inode):
+        """Добавляет файл в результат."""
+        self._index[path] = len(self.paths)
+        self.paths.append(path)
+        self.sizes.append(size)
+        self.mtimes_ns.append(mtime_ns)
+        self.inodes.append(inode)
+
+    def __getitem__(self, path):
+        i = self._index[path]
+        return FileStat(self.sizes[i], self.mtimes_ns[i], self.inodes[i])
+
+    def __contains__(self, path):
+        return path in self._index
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def total_size(self):
+        """Суммарный размер всех файлов в байтах."""
+        return sum(self.sizes)
+
+
+def _posix(rel):
+    """Путь с разделителем '/', в котором записываются правила фильтра."""
+    return rel if os.sep == "/" else rel.replace(os.sep, "/")
+
+
+def _scan_dir(full, rel, path_filter=None):
+    """
+    Читает один каталог.
+
+    :param str full: абсолютный путь каталога
+    :param str rel: путь каталога относительно корня ('' для корня)
+    :param path_filter: filters.PathFilter или None
+    :return: (список (rel_path, size, mtime_ns, inode), список (full, rel) подкаталогов,
+             список путей файлов, отложенных по размеру или возрасту)
+    """
+    files, subdirs, skipped = [], [], []
+    prefix = rel + os.sep if rel else ""
+    try:
+        entries = os.scandir(full)
+    except OSError as exc:
+        logging.warning(f"Нет доступа к каталогу {full}: {exc}")
+        return files, subdirs, skipped
+
+    with entries:
+        for entry in entries:
+            path = prefix + entry.name
+            try:
+                if entry.is_dir():
+                    if path_filter is None or not path_filter.excludes_dir(_posix(path)):
+                        subdirs.append((entry.path, path))
+                elif entry.is_file():
+                    if path_filter is not None and path_filter.excludes_path(_posix(path)):
+                        continue
+                    st = entry.stat()
+                    if path_filter is not None and path_filter.skips(st.st_size, st.st_mtime):
+                        skipped.append(path)
+                        continue
+                    files.append((path, st.st_size, st.st_mtime_ns, st.st_ino))
+            except OSError as exc:
+                logging.warning(f"Нет доступа к {entry.path}: {exc}")
+    return files, subdirs, skipped
+
+
+def scan_tree(root, start=None, workers=1, path_filter=None):
+    """
+    Обходит дерево каталогов и собирает метаданные файлов.
+
+    :param str root: абсолютный путь к корневой папке синхронизации
+    :param str start: каталог внутри root, с которого начать обход (по умолчанию root)
+    :param int workers: число потоков для параллельного чтения каталогов
+    :param path_filter: filters.PathFilter; исключённые каталоги не обходятся
+    :return: файлы с путями относительно root
+    :rtype: ScanResult
+    """
+    result = ScanResult()
+    start = os.fspath(start if start is not None else root)
+    rel = os.path.relpath(start, root)
+    first = (start, "" if rel == os.curdir else rel)
+
+    if workers <= 1:
+        stack = [first]
+        while stack:
+            files, subdirs, skipped = _scan_dir(*stack.pop(), path_filter)
+            for item in files:
+                result.add(*item)
+            result.skipped.update(skipped)
+            stack.extend(subdirs)
+        return result
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(_scan_dir, *first, path_filter)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirs, skipped = future.result()
+                for item in files:
+                    result.add(*item)
+                result.skipped.update(skipped)
+                pending.update(pool.submit(_scan_dir, *subdir, path_filter) for subdir in subdirs)
+    return result
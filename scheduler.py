@@ -0,0 +1,273 @@
+"""
+Модуль scheduler
+
+Планировщик передач между результатом сверки и клиентом Yandex_disc:
+- TransferScheduler выполняет операции пулом потоков в порядке приоритета (по умолчанию
+  сначала мелкие и недавно изменённые файлы), а не в порядке обхода множеств, так что
+  многогигабайтная загрузка не задерживает сотни мелких правок;
+- для отдельных видов операций можно ограничить число одновременных выполнений,
+  чтобы, например, массовое удаление не занимало все потоки;
+- один планировщик может обслуживать несколько заданий синхронизации сразу: потоки
+  общие, а задания из разных групп (по умолчанию — вызывающих потоков) выбираются
+  по очереди, так что крупное задание не вытесняет остальные;
+- при остановке (shutdown) не начатые задания отменяются, а начатые дорабатывают
+  в пределах заданного времени;
+- TokenBucket ограничивает суммарную скорость передачи данных всех потоков.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from collections import Counter
+
+# Правила приоритета: чем меньше ключ, тем раньше выполняется операция
+PRIORITY_RULES = {
+    "small": lambda size, mtime: size,
+    "large": lambda size, mtime: -size,
+    "recent": lambda size, mtime: -mtime,
+    "old": lambda size, mtime: mtime,
+}
+
+
+class TokenBucket():
+    """
+    Ограничитель скорости «ведро токенов», общий для всех потоков.
+
+    Токены (байты) пополняются со скоростью rate; запрос большего объёма, чем есть
+    в ведре, уводит баланс в минус, и поток ждёт, пока долг не будет погашен.
+
+    :param float rate: допустимая скорость в байтах в секунду (0 — без ограничения)
+    :param float burst: ёмкость ведра в байтах (по умолчанию — объём за одну секунду)
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount):
+        """
+        Списывает amount байт и при необходимости ждёт, чтобы не превысить скорость.
+
+        :param int amount: объём переданных (или передаваемых) данных в байтах
+        :return: None
+        """
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+
+def parse_rules(value):
+    """
+    Разбирает список правил приоритета вида "small, recent".
+
+    :param str value: имена правил через запятую
+    :return: кортеж имён правил
+    :rtype: Tuple[str, ...]
+    :raises ValueError: при неизвестном правиле
+    """
+    rules = tuple(rule.strip() for rule in value.split(",") if rule.strip())
+    unknown = [rule for rule in rules if rule not in PRIORITY_RULES]
+    if unknown:
+        raise ValueError(f"неизвестные правила приоритета: {', '.join(unknown)}")
+    return rules
+
+
+def parse_limits(value):
+    """
+    Разбирает ограничения параллельности вида "delete:2, download:4".
+
+    :param str value: пары операция:число через запятую
+    :return: словарь операция → максимум одновременных выполнений
+    :rtype: Dict[str, int]
+    :raises ValueError: при неверном формате или числе меньше 1
+    """
+    limits = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        action, _, count = item.partition(":")
+        limits[action.strip()] = int(count)
+        if limits[action.strip()] < 1:
+            raise ValueError(f"ограничение для {action.strip()} должно быть > 0")
+    return limits
+
+
+class SchedulerClosed(RuntimeError):
+    """
+    Планировщик остановлен, и часть заданий вызова run не была начата.
+
+    :param list results: результаты заданий в исходном порядке; у отменённых — None
+    """
+
+    def __init__(self, results):
+        super().__init__("планировщик остановлен")
+        self.results = results
+
+
+class _Batch():
+    """Задания одного вызова run: результаты, счётчик незавершённых и первая ошибка."""
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.results = [None] * len(jobs)
+        self.remaining = len(jobs)
+        self.error = None
+        self.cancelled = False
+        self.done = threading.Event()
+
+
+class TransferScheduler():
+    """
+    Выполняет операции в порядке приоритета с ограничением параллельности по видам.
+
+    Потоки создаются при первом вызове run и переиспользуются последующими, в том числе
+    одновременными вызовами из разных потоков. Группы (задания синхронизации)
+    обслуживаются по очереди — первой та, что дольше всех ждала, — внутри группы
+    задания выбираются по приоритету.
+
+    :param int max_workers: общее число одновременно выполняемых операций
+    :param rules: имена правил из PRIORITY_RULES; ключ приоритета — кортеж их значений,
+                  при равенстве сохраняется исходный порядок
+    :param limits: словарь вид операции → максимум одновременных выполнений
+    """
+
+    def __init__(self, max_workers=1, rules=("small", "recent"), limits=None):
+        self.max_workers = max(1, max_workers)
+        self.rules = tuple(rules)
+        self.limits = dict(limits or {})
+        self._cond = threading.Condition()
+        self._groups = {}
+        self._served = {}
+        self._running = Counter()
+        self._order = itertools.count()
+        self._threads = []
+        self._closed = False
+
+    def priority(self, size, mtime):
+        """
+        Считает ключ приоритета операции над файлом.
+
+        :param int size: размер файла в байтах
+        :param float mtime: время изменения файла в секундах
+        :return: ключ сортировки (меньше — раньше)
+        :rtype: tuple
+        """
+        return tuple(PRIORITY_RULES[rule](size, mtime) for rule in self.rules)
+
+    def run(self, jobs, group=None):
+        """
+        Выполняет задания и возвращает их результаты в исходном порядке.
+
+        Свободный поток берёт задание с наименьшим ключом среди видов операций,
+        не исчерпавших свой лимит; задания вида, упёршегося в лимит, ждут, не
+        занимая потоки.
+
+        :param jobs: список кортежей (action, key, func); func вызывается без аргументов
+        :param str group: имя группы для справедливой очереди (по умолчанию — имя
+                          вызывающего потока)
+        :return: список значений func() в порядке jobs
+        :rtype: list
+        :raises SchedulerClosed: если планировщик остановлен до начала части заданий
+                                 (после завершения уже начатых)
+        :raises Exception: исключение первого упавшего задания
+        """
+        batch = _Batch(jobs)
+        if not jobs:
+            return batch.results
+        group = group if group is not None else threading.current_thread().name
+
+        with self._cond:
+            if self._closed:
+                raise SchedulerClosed(batch.results)
+            queues = self._groups.setdefault(group, {})
+            for index, (action, key, _) in enumerate(jobs):
+                heapq.heappush(queues.setdefault(action, []), (key, next(self._order), batch, index))
+            while len(self._threads) < self.max_workers:
+                thread = threading.Thread(target=self._worker, daemon=True,
+                                          name=f"transfer-{len(self._threads) + 1}")
+                self._threads.append(thread)
+                thread.start()
+            self._cond.notify_all()
+
+        batch.done.wait()
+        if batch.error is not None:
+            raise batch.error
+        if batch.cancelled:
+            raise SchedulerClosed(batch.results)
+        return batch.results
+
+    def _take(self):
+        """Ждёт и забирает следующее задание; None — планировщик остановлен."""
+        with self._cond:
+            while not self._closed:
+                # Первой обслуживается группа, дольше всех не получавшая поток
+                for group in sorted(self._groups, key=lambda g: self._served.get(g, -1)):
+                    queues = self._groups[group]
+                    best = None
+                    for action, queue in queues.items():
+                        if queue and self._running[action] < self.limits.get(action, self.max_workers):
+                            if best is None or queue[0][:2] < queues[best][0][:2]:
+                                best = action
+                    if best is None:
+                        continue
+                    _, _, batch, index = heapq.heappop(queues[best])
+                    self._running[best] += 1
+                    self._served[group] = next(self._order)
+                    if not any(queues.values()):
+                        del self._groups[group]
+                    return best, batch, index
+                self._cond.wait()
+            return None
+
+    def _worker(self):
+        while (task := self._take()) is not None:
+            action, batch, index = task
+            try:
+                result = batch.jobs[index][2]()
+            except Exception as exc:
+                result = None
+                batch.error = batch.error or exc
+            with self._cond:
+                batch.results[index] = result
+                batch.remaining -= 1
+                if not batch.remaining:
+                    batch.done.set()
+                self._running[action] -= 1
+                self._cond.notify_all()
+
+    def shutdown(self, timeout=None):
+        """
+        Останавливает потоки после выполнения уже начатых заданий; ещё не начатые
+        отменяются, и ожидающие их вызовы run получают SchedulerClosed, как только
+        завершатся начатые задания того же вызова.
+
+        :param float timeout: сколько секунд ждать завершения начатых заданий; None — без ограничения
+        :return: True, если все потоки завершились за отведённое время
+        :rtype: bool
+        """
+        with self._cond:
+            self._closed = True
+            for queues in self._groups.values():
+                for queue in queues.values():
+                    for _, _, batch, _ in queue:
+                        batch.cancelled = True
+                        batch.remaining -= 1
+                        if not batch.remaining:
+                            batch.done.set()
+            self._groups.clear()
+            self._cond.notify_all()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        return not any(thread.is_alive() for thread in self._threads)
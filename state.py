@@ -0,0 +1,438 @@
+"""
+Модуль state
+
+Содержит класс SyncState — хранилище состояния последней успешной синхронизации
+в файле SQLite. Для каждого файла запоминаются размер, mtime (в наносекундах), inode
+и метаданные облачной копии (modified, md5). По этому снимку цикл синхронизации
+понимает, что локально ничего не изменилось, и не обращается к API.
+
+Там же хранится кэш md5 локальных файлов, действительный, пока не изменились
+size, mtime_ns и inode файла, и прогресс незавершённых загрузок частями
+(URL загрузки и подтверждённое смещение), чтобы продолжить их после перезапуска,
+хэши блоков файлов, загружаемых в режиме дельты (см. delta.py), и индексы архивных
+поддеревьев (см. archive.py), а также кэш облачного дерева (см. remote_cache.py).
+
+Журнал операций (write-ahead): перед началом каждой передачи, удаления или перемещения
+в него записывается строка, а после записи результатов цикла в снимок журнал очищается.
+Непустой журнал при запуске означает, что прошлый процесс прервался посреди цикла и
+исход этих операций неизвестен. Там же — служебные значения (таблица meta).
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+class SyncState():
+    """
+    Снимок состояния синхронизированных файлов, сохраняемый между запусками.
+
+    Все записи держатся в памяти (словарь path → строка таблицы) и дублируются в SQLite;
+    изменения фиксируются одной транзакцией на вызов, поэтому после сбоя база
+    остаётся в состоянии последнего завершённого цикла.
+
+    :param str db_path: путь к файлу базы; каталог создаётся при необходимости
+    :param bool in_memory: работать с копией базы в памяти: файл (если он есть) только
+                           читается, и изменения в него не попадают (для --dry-run)
+    """
+
+    def __init__(self, db_path, in_memory=False):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        if in_memory:
+            self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+            if os.path.exists(db_path):
+                source = sqlite3.connect(Path(db_path).absolute().as_uri() + "?mode=ro", uri=True)
+                try:
+                    source.backup(self._conn)
+                finally:
+                    source.close()
+        else:
+            folder = os.path.dirname(db_path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " inode INTEGER NOT NULL,"
+            " remote_modified TEXT,"
+            " md5 TEXT)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS hashes ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " inode INTEGER NOT NULL,"
+            " md5 TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " href TEXT NOT NULL,"
+            " offset INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS blocks ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " block_size INTEGER NOT NULL,"
+            " hashes BLOB NOT NULL,"
+            " patches INTEGER NOT NULL,"
+            " patch_bytes INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS archives ("
+            " prefix TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS journal ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " action TEXT NOT NULL,"
+            " path TEXT NOT NULL,"
+            " started REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS remote ("
+            " path TEXT PRIMARY KEY,"
+            " is_dir INTEGER NOT NULL,"
+            " modified TEXT,"
+            " mtime REAL,"
+            " md5 TEXT,"
+            " size INTEGER,"
+            " revision INTEGER)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        self._files = {
+            row[0]: row[1:]
+            for row in self._conn.execute(
+                "SELECT path, size, mtime_ns, inode, remote_modified, md5 FROM files")
+        }
+        logging.getLogger(__name__).info(f"Загружено состояние {len(self._files)} файлов из {db_path}")
+
+    def __len__(self):
+        return len(self._files)
+
+    def __contains__(self, path):
+        return path in self._files
+
+    def get(self, path):
+        """
+        Возвращает сохранённую запись файла.
+
+        :param str path: относительный путь файла
+        :return: кортеж (size, mtime_ns, inode, remote_modified, md5) или None
+        :rtype: Optional[tuple]
+        """
+        return self._files.get(path)
+
+    def items(self):
+        """
+        Возвращает копию записей снимка.
+
+        :return: список пар (path, (size, mtime_ns, inode, remote_modified, md5))
+        :rtype: List[tuple]
+        """
+        return list(self._files.items())
+
+    def paths_under(self, folder):
+        """
+        Возвращает пути файлов снимка внутри каталога (по индексу первичного ключа).
+
+        :param str folder: относительный путь каталога; пустая строка — весь снимок
+        :return: список относительных путей
+        :rtype: List[str]
+        """
+        if not folder:
+            return list(self._files)
+        # '0' идёт в ASCII сразу за '/', так что диапазон покрывает ровно folder/...
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path FROM files WHERE path > ? AND path < ?", (folder + "/", folder + "0"))
+            return [row[0] for row in rows]
+
+    def is_unchanged(self, path, stat):
+        """
+        Проверяет, совпадает ли локальный файл со снимком последней синхронизации.
+
+        :param str path: относительный путь файла
+        :param stat: объект с полями size, mtime_ns, inode
+        :rtype: bool
+        """
+        row = self._files.get(path)
+        return row is not None and row[:3] == (stat.size, stat.mtime_ns, stat.inode)
+
+    def matches(self, local_files):
+        """
+        Проверяет, что локальное дерево в точности совпадает со снимком.
+
+        :param local_files: словарь path → stat (поля size, mtime_ns, inode)
+        :return: True, если не появилось, не пропало и не изменилось ни одного файла
+        :rtype: bool
+        """
+        if len(local_files) != len(self._files):
+            return False
+        return all(self.is_unchanged(path, stat) for path, stat in local_files.items())
+
+    def update(self, synced=(), removed=()):
+        """
+        Записывает результаты цикла одной транзакцией.
+
+        :param synced: итерируемое из (path, stat, remote_modified, md5) для файлов,
+                       совпадающих с облаком после цикла
+        :param removed: итерируемое из путей, которых больше нет ни локально, ни в облаке
+        :return: None
+        """
+        rows = [(path, stat.size, stat.mtime_ns, stat.inode, remote_modified, md5)
+                for path, stat, remote_modified, md5 in synced]
+        removed = list(removed)
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO files (path, size, mtime_ns, inode, remote_modified, md5)"
+                    " VALUES (?, ?, ?, ?, ?, ?)", rows)
+                self._conn.executemany("DELETE FROM files WHERE path = ?", ((p,) for p in removed))
+                self._conn.executemany("DELETE FROM hashes WHERE path = ?", ((p,) for p in removed))
+                self._conn.executemany("DELETE FROM blocks WHERE path = ?", ((p,) for p in removed))
+            for row in rows:
+                self._files[row[0]] = row[1:]
+            for path in removed:
+                self._files.pop(path, None)
+
+    def get_hash(self, path, stat):
+        """
+        Возвращает закэшированный md5 файла, если файл не менялся с момента подсчёта.
+
+        :param str path: относительный путь файла
+        :param stat: объект с полями size, mtime_ns, inode
+        :return: md5 или None
+        :rtype: Optional[str]
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, inode, md5 FROM hashes WHERE path = ?", (path,)).fetchone()
+        if row is None or row[:3] != (stat.size, stat.mtime_ns, stat.inode):
+            return None
+        return row[3]
+
+    def put_hashes(self, rows):
+        """
+        Сохраняет посчитанные md5 одной транзакцией.
+
+        :param rows: итерируемое из (path, stat, md5)
+        :return: None
+        """
+        rows = [(path, stat.size, stat.mtime_ns, stat.inode, md5) for path, stat, md5 in rows]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO hashes (path, size, mtime_ns, inode, md5)"
+                    " VALUES (?, ?, ?, ?, ?)", rows)
+
+    def get_upload(self, path):
+        """
+        Возвращает прогресс незавершённой загрузки частями.
+
+        :param str path: относительный путь файла в облачной папке
+        :return: кортеж (size, mtime_ns, href, offset) или None
+        :rtype: Optional[tuple]
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT size, mtime_ns, href, offset FROM uploads WHERE path = ?", (path,)).fetchone()
+
+    def save_upload(self, path, size, mtime_ns, href, offset):
+        """
+        Запоминает, сколько байт файла подтверждено сервером.
+
+        :param str path: относительный путь файла в облачной папке
+        :param int size: размер загружаемого файла
+        :param int mtime_ns: mtime файла, по которому проверяется, что он не менялся
+        :param str href: URL загрузки
+        :param int offset: число подтверждённых байт
+        :return: None
+        """
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO uploads (path, size, mtime_ns, href, offset)"
+                    " VALUES (?, ?, ?, ?, ?)", (path, size, mtime_ns, href, offset))
+
+    def drop_upload(self, path):
+        """Забывает прогресс загрузки файла (после её завершения)."""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM uploads WHERE path = ?", (path,))
+
+    def get_blocks(self, path):
+        """
+        Возвращает хэши блоков файла, загруженного в режиме дельты.
+
+        :param str path: относительный путь файла в облачной папке
+        :return: кортеж (size, block_size, hashes, patches, patch_bytes), где hashes — список
+                 md5 блоков, patches и patch_bytes — число и объём загруженных патчей; или None
+        :rtype: Optional[tuple]
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, block_size, hashes, patches, patch_bytes FROM blocks WHERE path = ?",
+                (path,)).fetchone()
+        if row is None:
+            return None
+        hashes = [row[2][i:i + 16] for i in range(0, len(row[2]), 16)]
+        return row[0], row[1], hashes, row[3], row[4]
+
+    def save_blocks(self, path, size, block_size, hashes, patches, patch_bytes):
+        """
+        Запоминает хэши блоков файла и число патчей к его облачной копии.
+
+        :param str path: относительный путь файла в облачной папке
+        :param int size: размер файла
+        :param int block_size: размер блока
+        :param hashes: список md5 блоков (по 16 байт)
+        :param int patches: число патчей в облаке
+        :param int patch_bytes: суммарный объём патчей в байтах
+        :return: None
+        """
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO blocks (path, size, block_size, hashes, patches, patch_bytes)"
+                    " VALUES (?, ?, ?, ?, ?, ?)", (path, size, block_size, b"".join(hashes), patches, patch_bytes))
+
+    def drop_blocks(self, path):
+        """Забывает хэши блоков файла."""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM blocks WHERE path = ?", (path,))
+
+    def get_archive(self, prefix):
+        """
+        Возвращает индекс архивного поддерева.
+
+        :param str prefix: поддерево
+        :return: словарь {"files": {путь: [объект, size, mtime_ns]}, "objects": {объект: размер}}
+                 или None
+        :rtype: Optional[dict]
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM archives WHERE prefix = ?", (prefix,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def save_archive(self, prefix, index):
+        """
+        Сохраняет индекс архивного поддерева.
+
+        :param str prefix: поддерево
+        :param dict index: индекс (см. get_archive)
+        :return: None
+        """
+        data = json.dumps(index, ensure_ascii=False)
+        with self._lock:
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO archives (prefix, data) VALUES (?, ?)",
+                                   (prefix, data))
+
+    def get_remote(self):
+        """
+        Возвращает сохранённый кэш облачного дерева.
+
+        :return: список строк (path, is_dir, modified, mtime, md5, size, revision)
+        :rtype: List[tuple]
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT path, is_dir, modified, mtime, md5, size, revision FROM remote").fetchall()
+
+    def save_remote(self, rows=(), removed=(), clear=False):
+        """
+        Записывает изменения кэша облачного дерева одной транзакцией.
+
+        :param rows: итерируемое из (path, is_dir, modified, mtime, md5, size, revision)
+        :param removed: итерируемое из путей, которых больше нет в облаке
+        :param bool clear: удалить весь кэш перед записью
+        :return: None
+        """
+        with self._lock:
+            with self._conn:
+                if clear:
+                    self._conn.execute("DELETE FROM remote")
+                self._conn.executemany("DELETE FROM remote WHERE path = ?", ((p,) for p in removed))
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO remote (path, is_dir, modified, mtime, md5, size, revision)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def begin_operation(self, action, path):
+        """
+        Записывает в журнал операцию перед её началом.
+
+        :param str action: вид операции (load, reload, delete, move, ...)
+        :param str path: относительный путь
+        :return: None
+        """
+        with self._lock:
+            with self._conn:
+                self._conn.execute("INSERT INTO journal (action, path, started) VALUES (?, ?, ?)",
+                                   (action, path, time.time()))
+
+    def pending_operations(self):
+        """
+        Возвращает операции журнала, результаты которых ещё не записаны в снимок.
+
+        :return: список (action, path, started) в порядке начала
+        :rtype: List[tuple]
+        """
+        with self._lock:
+            return self._conn.execute("SELECT action, path, started FROM journal ORDER BY seq").fetchall()
+
+    def clear_journal(self):
+        """Очищает журнал после записи результатов цикла в снимок."""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM journal")
+
+    def get_meta(self, key):
+        """
+        Возвращает служебное значение.
+
+        :param str key: ключ
+        :return: значение или None
+        :rtype: Optional[str]
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def set_meta(self, key, value):
+        """
+        Сохраняет служебное значение.
+
+        :param str key: ключ
+        :param str value: значение
+        :return: None
+        """
+        with self._lock:
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def close(self):
+        """Закрывает соединение с базой."""
+        with self._lock:
+            self._conn.close()
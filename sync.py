@@ -6,98 +6,1096 @@
 - сравнение с данными облака,
 - загрузка новых файлов,
 - обновление изменённых,
-- удаление удалённых.
+- удаление удалённых,
+- в двустороннем режиме — скачивание изменений из облака и удаление локальных копий
+  файлов, удалённых в облаке.
+
+Передачи выполняются планировщиком (scheduler.TransferScheduler) в порядке приоритета
+пулом потоков ограниченного размера; результат каждой операции возвращается отдельно,
+так что ошибка одного файла не прерывает весь цикл.
+Если передан снимок состояния (state.SyncState), цикл без локальных изменений
+не обращается к API вовсе. Файл, присутствующий с обеих сторон, перезаписывается,
+только если его md5 отличается от md5 в облаке; сравнение mtime остаётся запасным
+вариантом, когда облако хэш не вернуло.
+
+В двустороннем режиме (two_way) направление для каждого файла выбирается по снимку
+последней синхронизации: изменилась только локальная копия — загрузка, только облачная —
+скачивание, обе — локальная копия сохраняется под именем «*.conflict-ДАТА» и скачивается
+облачная.
+
+Файлы архивных поддеревьев (archive.ArchiveSet) в этой логике не участвуют: после
+основных передач они упаковываются в сжатые пачки по своему индексу (archive.py).
+
+Цикл разделён на построение плана (plan_cycle) — сверку без побочных эффектов,
+результат которой можно показать (--dry-run) или оценить по объёму, — и его выполнение
+(apply_plan).
+
+Облачный листинг идёт через кэш облачного дерева (remote_cache.RemoteCache): если
+ревизия Диска не изменилась, облако не перечисляется.
+
+Если передан реестр метрик (metrics.Metrics), цикл замеряет длительность своих фаз
+(скан, листинг, сверка, перемещения, передачи, обновление снимка) и учитывает размер
+расхождения, результаты операций и объём переданных данных.
 """
 
 import logging
-from pathlib import Path
+import stat as stat_module
+import time
+from pathlib import PurePosixPath
 import os
 from datetime import datetime
+from typing import Any, NamedTuple, Optional
+
+from archive import ARCHIVE_ROOT, ArchiveSet, sync_archives
+from delta import is_sidecar
+from hashing import hash_files
+from metrics import NULL_METRICS
+from remote_cache import RemoteCache
+from scanner import FileStat, scan_tree
+from scheduler import SchedulerClosed, TransferScheduler
 
 
-def get_local_files(path, root):
+class TransferResult(NamedTuple):
+    """Итог одной операции синхронизации."""
+
+    action: str
+    path: str
+    ok: bool
+    error: Optional[str] = None
+    # Что вернула успешная загрузка (disc_API.Uploaded: md5 и modified) или None
+    uploaded: Optional[Any] = None
+
+
+def get_local_files(path, root, workers=1, path_filter=None):
     """
-    Собирает все файлы в папке и возвращает их относительные пути и время последней модификации.
+    Собирает все файлы в папке и возвращает их относительные пути и метаданные.
 
-    :param str root_path: абсолютный путь к корневой папке синхронизации
-    :return: словарь, где ключ — относительный путь файла от root_path, значение — время последней
-             модификации в секундах с плавающей точкой (mtime)
-    :rtype: Dict[str, float]
+    :param str path: каталог, с которого начинается обход
+    :param str root: абсолютный путь к корневой папке синхронизации
+    :param int workers: число потоков для параллельного обхода подкаталогов
+    :param path_filter: filters.PathFilter; исключённые каталоги не обходятся
+    :return: отображение, где ключ — относительный путь файла от root, значение — FileStat
+             (размер, mtime в наносекундах, inode)
+    :rtype: ScanResult
     """
-    files = {}
+    return scan_tree(root, start=path, workers=workers, path_filter=path_filter)
 
-    try:
-        entries = list(Path(path).iterdir())
-    except OSError as exc:
-        logging.warning(f"Нет доступа к каталогу {path}: {exc}")
-        return files
 
-    for entry in entries:
-        try:
-            if entry.is_dir():
-                files.update(get_local_files(entry, root))
-            elif entry.is_file():
-                rel = entry.relative_to(root)
-                files[str(rel)] = entry.stat().st_mtime
-        except OSError as exc:
-            logging.warning(f"Нет доступа к {entry}: {exc}")
+class PlannedOperation(NamedTuple):
+    """Операция плана синхронизации с оценкой объёма передачи."""
+
+    action: str
+    path: str
+    size: int = 0
+    mtime: float = 0.0
+    src: Optional[str] = None
+
+
+class SyncPlan():
+    """
+    План одного цикла синхронизации, построенный без побочных эффектов (plan_cycle).
+
+    Публичная часть — операции с оценкой объёма, недостающие папки облака и число файлов
+    архивных поддеревьев — сериализуется to_dict(); остальные поля нужны apply_plan для
+    выполнения операций и обновления снимка состояния.
+
+    :param str local_folder: абсолютный путь к локальной папке синхронизации
+    :param bool idle: локальное дерево совпадает со снимком, облако не запрашивалось
+    """
+
+    def __init__(self, local_folder, idle=False):
+        self.local_folder = local_folder
+        self.idle = idle
+        self.operations = []
+        self.mkdirs = []
+        self.archived = set()
+        self.state = None
+        self.archives = ArchiveSet()
+        self.local_files = {}
+        self.cloud_file = {}
+        self.cloud_meta = {}
+        self.cloud_dirs = set()
+        self.cloud_under = {}
+        self.move_groups = []
+        self.deletes = {}
+        self.remote_cache = None
+        self.unchanged = []
+        self.local_md5 = {}
+
+    def totals(self):
+        """
+        Сводка плана по видам операций.
+
+        :return: словарь action → {"count": число операций, "bytes": оценка объёма}
+        :rtype: Dict[str, Dict[str, int]]
+        """
+        totals = {}
+        for operation in self.operations:
+            total = totals.setdefault(operation.action, {"count": 0, "bytes": 0})
+            total["count"] += 1
+            total["bytes"] += operation.size
+        return totals
+
+    def to_dict(self):
+        """
+        Возвращает план в виде, пригодном для json.dumps.
+
+        :rtype: dict
+        """
+        return {
+            "local_folder": self.local_folder,
+            "idle": self.idle,
+            "mkdirs": list(self.mkdirs),
+            "operations": [{key: value for key, value in operation._asdict().items() if value is not None}
+                           for operation in self.operations],
+            "archived_files": len(self.archived),
+            "totals": self.totals(),
+            "upload_bytes": sum(op.size for op in self.operations if _DIRECTIONS.get(op.action) == "up"),
+            "download_bytes": sum(op.size for op in self.operations if _DIRECTIONS.get(op.action) == "down"),
+        }
+
+    def describe(self):
+        """
+        Описывает план построчно для вывода человеку.
 
-    return files
+        :rtype: List[str]
+        """
+        if self.idle:
+            return [f"{self.local_folder}: локальных изменений нет"]
+        lines = [f"{self.local_folder}:"]
+        lines.extend(f"  mkdir     {folder}" for folder in self.mkdirs)
+        for op in sorted(self.operations, key=lambda op: (op.action, op.path)):
+            target = f"{op.src} -> {op.path}" if op.src is not None else op.path
+            lines.append(f"  {op.action:<9} {target}" + (f" ({_format_size(op.size)})" if op.size else ""))
+        if self.archived:
+            lines.append(f"  archive   файлов в архивных поддеревьях: {len(self.archived)}")
+        summary = ", ".join(f"{action}: {total['count']} ({_format_size(total['bytes'])})"
+                            for action, total in sorted(self.totals().items()))
+        lines.append(f"  итого — {summary or 'изменений нет'}")
+        return lines
 
-def sync_cycle(disk_client, local_folder):
+
+def _format_size(size):
+    for unit in ("Б", "КБ", "МБ", "ГБ"):
+        if size < 1024 or unit == "ГБ":
+            return f"{size:.0f} {unit}" if unit == "Б" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def sync_cycle(disk_client, local_folder, flat_listing=False, max_workers=1, state=None,
+               force=False, hash_workers=None, scan_workers=1, two_way=False, scheduler=None,
+               path_filter=None, metrics=None, archives=None, remote_cache=None):
     """
-    Выполняет одну итерацию синхронизации: сверяет локальные файлы с облачными и вызывает
-    соответствующие методы клиента.
+    Выполняет одну итерацию синхронизации: строит план (plan_cycle) и выполняет его
+    (apply_plan).
 
     :param client: объект клиента с методами:
-                   - get_info() → dict с ключом '_embedded' → 'items' (список метаданных файлов);
+                   - iter_items(flat) → генератор метаданных ресурсов облачной папки
+                     (рекурсивно, папки помечены type == 'dir');
+                   - get_revision() → ревизия Диска (нужен только с remote_cache);
+                   - mkdir(remote_path: str) для создания папки в облаке;
                    - load(local_path: str, remote_path: str) для загрузки нового файла;
                    - reload(local_path: str, remote_path: str) для перезаписи существующего;
-                   - delete(remote_path: str) для удаления файла из облака.
+                   - delete(remote_path: str) для удаления файла из облака;
+                   - move(src: str, dst: str) для перемещения файла или папки в облаке;
+                   - download(remote_path, local_path, size, mtime) для скачивания
+                     (нужен только при two_way).
     :param str local_folder: абсолютный путь к локальной папке синхронизации
-    :return: None
-    :raises Exception: при ошибках чтения файлов или сетевых запросах
-    """
-    prefix = f"disk:/{disk_client.cloud_folder}/"
-    cloud_file = {}
-    local_files = get_local_files(local_folder, local_folder)
-    crude_remote_files = disk_client.get_info()
-    items = crude_remote_files.get('_embedded', {}).get('items', [])
-
-    for item in items:
-        path_disk = item['path']
-        if path_disk.startswith(prefix):
-            relative_path = path_disk.removeprefix(prefix)
-        else:
-            logging.warning(f"Неожиданный формат пути: {path_disk}")
+    :param bool flat_listing: получать облачный список через плоский эндпоинт файлов
+    :param int max_workers: сколько передач выполнять одновременно
+    :param state: необязательный SyncState; если локальное дерево совпадает со снимком,
+                  облако не запрашивается, а изменённость файлов определяется по снимку,
+                  а не по сравнению mtime с облаком
+    :param bool force: запрашивать облако, даже если локальное дерево совпадает со снимком
+                       (полная сверка)
+    :param int hash_workers: размер пула потоков для хэширования крупных файлов
+    :param int scan_workers: число потоков для обхода локального дерева
+    :param bool two_way: двусторонняя синхронизация: файлы, которых нет в снимке, скачиваются
+                         из облака, а не удаляются; изменения облачных копий скачиваются
+    :param scheduler: TransferScheduler, задающий порядок и параллельность передач
+                      (по умолчанию — пул из max_workers потоков, мелкие файлы первыми)
+    :param path_filter: filters.PathFilter; исключённые файлы не синхронизируются ни в одну
+                        сторону: локально они не обходятся, а в облачном листинге пропускаются
+    :param metrics: metrics.Metrics (или представление с меткой задания) для длительности
+                    фаз и счётчиков операций; None — не собирать
+    :param archives: archive.ArchiveSet; файлы этих поддеревьев загружаются сжатыми пачками
+                     (нужен state, где хранится индекс)
+    :param remote_cache: remote_cache.RemoteCache; облачное дерево берётся из кэша, если
+                         ревизия Диска не изменилась (клиенту нужен get_revision и
+                         iter_items(flat, prune)); None — полный листинг
+    :return: результаты операций перемещения, загрузки, перезаписи, скачивания и удаления
+    :rtype: List[TransferResult]
+    :raises Exception: при ошибках листинга облака или создания папок
+    """
+    metrics = metrics if metrics is not None else NULL_METRICS
+    started = time.perf_counter()
+    plan = plan_cycle(disk_client, local_folder, flat_listing=flat_listing, state=state, force=force,
+                      hash_workers=hash_workers, scan_workers=scan_workers, two_way=two_way,
+                      path_filter=path_filter, metrics=metrics, archives=archives,
+                      remote_cache=remote_cache)
+    results = apply_plan(disk_client, plan, max_workers=max_workers, scheduler=scheduler, metrics=metrics)
+    _record_cycle(metrics, started)
+    return results
+
+
+def plan_cycle(disk_client, local_folder, flat_listing=False, state=None, force=False,
+               hash_workers=None, scan_workers=1, two_way=False, path_filter=None, metrics=None,
+               archives=None, remote_cache=None):
+    """
+    Сверяет локальное дерево с облаком и строит план цикла, ничего не меняя ни локально,
+    ни в облаке (кроме кэша md5 в state). Параметры — как у sync_cycle.
+
+    Перемещения планируются как успешные: загрузки и удаления, которые они заменяют,
+    в план не входят и добавляются apply_plan, только если перемещение не удалось.
+
+    :return: план цикла
+    :rtype: SyncPlan
+    :raises Exception: при ошибках листинга облака
+    """
+    metrics = metrics if metrics is not None else NULL_METRICS
+    phases = metrics.phases("sync_phase_seconds")
+    phases.enter("scan")
+    local_files = get_local_files(local_folder, local_folder, workers=scan_workers,
+                                  path_filter=path_filter)
+    metrics.set("sync_files", len(local_files), side="local")
+
+    # В двустороннем режиме облако может измениться без локальных изменений
+    if state is not None and not force and not two_way and state.matches(local_files):
+        logging.info("Локальных изменений нет, запрос к облаку пропущен")
+        phases.finish()
+        return SyncPlan(local_folder, idle=True)
+
+    plan = SyncPlan(local_folder)
+    plan.state, plan.local_files = state, local_files
+    cloud_file, cloud_meta, cloud_dirs = plan.cloud_file, plan.cloud_meta, plan.cloud_dirs
+    archives = archives if archives and state is not None else ArchiveSet()
+    plan.archives = archives
+    plan.archived = {path for path in local_files if archives.covers(path)} if archives else set()
+
+    phases.enter("list")
+    plan.remote_cache = remote_cache
+    listing = remote_cache or RemoteCache()
+    remote_files, remote_dirs = listing.refresh(disk_client, flat_listing, metrics)
+    if two_way and listing.cached and state is not None and any(
+            path not in remote_files and state.is_unchanged(path, file_stat)
+            for path, file_stat in local_files.items()):
+        # Локальные копии удаляются только по свежему листингу, а не по кэшу
+        logging.info("Облачное дерево взято из кэша, а локальные файлы могут быть удалены: "
+                     "облако перечисляется заново")
+        remote_files, remote_dirs = listing.refresh(disk_client, flat_listing, metrics, full=True)
+    cloud_dirs.update(remote_dirs)
+    untracked = []
+    for relative_path, entry in remote_files.items():
+        # Патчи файлов, загруженных в режиме дельты, — служебные и не синхронизируются
+        if is_sidecar(relative_path) or (archives and archives.excludes_remote(relative_path)):
+            continue
+        cloud_dirs.update(str(p) for p in PurePosixPath(relative_path).parents)
+        if relative_path in local_files.skipped or (
+                path_filter and path_filter.excludes_remote(relative_path, entry.size)):
+            # Не синхронизируется, но удалять или перемещать его вместе с папкой нельзя
+            untracked.append(relative_path)
             continue
-        time_disk = datetime.fromisoformat(item['modified']).timestamp()
-        cloud_file[relative_path] = time_disk
+        cloud_file[relative_path] = entry.mtime
+        cloud_meta[relative_path] = (entry.modified, entry.md5, entry.size)
+    metrics.set("sync_files", len(cloud_file), side="cloud")
 
-    only_local = set(local_files) - set(cloud_file)
+    phases.enter("diff")
+    only_local = set(local_files) - set(cloud_file) - plan.archived
     only_cloud = set(cloud_file) - set(local_files)
     in_both = set(cloud_file) & set(local_files)
 
-    for path in only_local:
-        full_local = os.path.join(local_folder, path)
-        # try:
-        disk_client.load(full_local, path)
-            # logging.info(f"Загружен новый файл: {path}")
-        # except Exception as e:
-        #     logging.error(f"Ошибка при загрузке {path}: {e}")
-
-    for path in only_cloud:
-        # try:
-            disk_client.delete(path)
-        #     # logging.info(f"Файл {path} удален")
-        # except Exception as e:
-        #     logging.error(f"Не удалось удалить {path}: {e}")
+    downloads, local_deletes = [], []
+    if two_way:
+        # Облачный файл, которого нет в снимке (или изменённый после удаления локальной
+        # копии), скачивается; локальный файл из снимка, пропавший в облаке, удаляется,
+        # если его не успели изменить локально
+        for path in only_cloud:
+            row = state.get(path) if state is not None else None
+            if row is None or _remote_changed(row, *cloud_meta[path][:2]):
+                downloads.append(path)
+        for path in only_local:
+            if state is not None and state.is_unchanged(path, local_files[path]):
+                local_deletes.append(path)
+        only_cloud.difference_update(downloads)
+        only_local.difference_update(local_deletes)
+
+    moves = _detect_moves(only_local, only_cloud, local_files, state,
+                          {path: (cloud_meta[path][2], cloud_meta[path][1]) for path in only_cloud},
+                          local_folder, hash_workers)
+    if only_cloud:
+        for path in (*cloud_file, *untracked):
+            for parent in _parents(path):
+                plan.cloud_under.setdefault(parent, []).append(path)
+
+    if moves:
+        plan.move_groups = _group_moves(moves, lambda folder: plan.cloud_under.get(folder, []),
+                                        cloud_dirs.__contains__,
+                                        lambda folder: os.path.isdir(os.path.join(local_folder, folder)))
+        for src, dst in moves.items():
+            only_cloud.discard(src)
+            only_local.discard(dst)
+        plan.operations.extend(PlannedOperation("move", dst, src=src) for src, dst, _ in plan.move_groups)
+
+    moved_dirs = {parent for _, dst in moves.items() for parent in _parents(dst)}
+    plan.mkdirs = sorted(set(_missing_dirs([dst for _, dst, _ in plan.move_groups], cloud_dirs))
+                         | set(_missing_dirs(only_local, cloud_dirs | moved_dirs)),
+                         key=lambda p: (p.count("/"), p))
+
+    def local(action, path):
+        return PlannedOperation(action, path, local_files[path].size, local_files[path].mtime)
+
+    def remote(action, path):
+        return PlannedOperation(action, path, cloud_meta[path][2] or 0, cloud_file[path])
+
+    plan.operations.extend(local("load", path) for path in only_local)
+
+    local_dirs = {parent for path in (*local_files, *local_files.skipped) for parent in _parents(path)} \
+        if only_cloud else set()
+    plan.deletes = _collapse_deletes(only_cloud, lambda folder: plan.cloud_under.get(folder, []), local_dirs)
+    plan.operations.extend(PlannedOperation("delete", path) for path in plan.deletes)
+    plan.operations.extend(PlannedOperation("delete_local", path) for path in local_deletes)
+
+    conflicts = []
+    if two_way:
+        changed, pulled, conflicts, plan.unchanged, plan.local_md5 = _decide_two_way(
+            in_both, local_files, cloud_meta, state, local_folder, hash_workers)
+        downloads.extend(pulled)
+    else:
+        changed, plan.unchanged, plan.local_md5 = _decide_one_way(
+            in_both, local_files, cloud_meta, cloud_file, state, local_folder, hash_workers)
+
+    plan.operations.extend(local("reload", path) for path in changed)
+    plan.operations.extend(remote("download", path) for path in downloads)
+    plan.operations.extend(remote("conflict", path) for path in conflicts)
+
+    for kind, count in (("only_local", len(only_local)), ("only_cloud", len(plan.deletes)),
+                        ("changed", len(changed)), ("download", len(downloads)),
+                        ("conflict", len(conflicts)), ("delete_local", len(local_deletes)),
+                        ("moved", len(moves))):
+        metrics.set("sync_diff_files", count, kind=kind)
+    phases.finish()
+    return plan
+
 
+def apply_plan(disk_client, plan, max_workers=1, scheduler=None, metrics=None):
+    """
+    Выполняет план цикла: перемещения, создание папок, передачи и удаления, затем
+    обновляет снимок состояния и архивные поддеревья.
+
+    Если перемещение не удалось, вместо него выполняются загрузка нового пути
+    и удаление старого, как если бы перемещение не было обнаружено.
+
+    :param disk_client: клиент с методами, перечисленными в sync_cycle
+    :param SyncPlan plan: план, построенный plan_cycle для того же клиента
+    :param int max_workers: сколько передач выполнять одновременно
+    :param scheduler: TransferScheduler, задающий порядок и параллельность передач
+    :param metrics: metrics.Metrics для длительности фаз и счётчиков операций
+    :return: результаты операций
+    :rtype: List[TransferResult]
+    :raises Exception: при ошибках создания папок
+    """
+    if plan.idle:
+        return []
+    metrics = metrics if metrics is not None else NULL_METRICS
+    phases = metrics.phases("sync_phase_seconds")
+    state, local_folder, local_files = plan.state, plan.local_folder, plan.local_files
+    cloud_meta, cloud_file = plan.cloud_meta, plan.cloud_file
+    planned = [op for op in plan.operations if op.action != "move"]
+    deletes = dict(plan.deletes)
+
+    move_results, moved = [], []
+    if plan.move_groups:
+        phases.enter("move")
+        move_results, moved, _ = _run_moves(disk_client, plan.move_groups, plan.cloud_dirs, max_workers,
+                                            journal=state, scheduler=scheduler)
+        done = set(moved)
+        failed = [pair for _, _, pairs in plan.move_groups for pair in pairs if pair not in done]
+        planned.extend(PlannedOperation("load", dst, local_files[dst].size, local_files[dst].mtime)
+                       for _, dst in failed)
+        planned.extend(PlannedOperation("delete", src) for src, _ in failed)
+        deletes.update((src, [src]) for src, _ in failed)
+
+    phases.enter("transfer")
+    _ensure_cloud_dirs(disk_client, [op.path for op in planned if op.action == "load"], plan.cloud_dirs)
+    operations = [(op.action, op.path, *_bind(disk_client, plan, op)) for op in planned]
+    meta = {(op.action, op.path): (op.size, op.mtime) for op in planned}
+
+    def info(action, path):
+        return meta.get((action, path))
+
+    results = move_results + run_operations(operations, max_workers, scheduler, info, journal=state)
+
+    phases.enter("state")
+    if state is not None:
+        synced = [(path, local_files[path], *cloud_meta[path][:2]) for path in plan.unchanged]
+        synced.extend((dst, local_files[dst], *cloud_meta[src][:2]) for src, dst in moved)
+        removed = [src for src, _ in moved]
+        for result in results:
+            if not result.ok:
+                continue
+            if result.action == "delete":
+                removed.extend(deletes[result.path])
+            elif result.action == "delete_local":
+                removed.append(result.path)
+            elif result.action in ("download", "conflict"):
+                file_stat = _stat_local(os.path.join(local_folder, result.path))
+                if file_stat is not None:
+                    synced.append((result.path, file_stat, *cloud_meta[result.path][:2]))
+            elif result.action != "move":
+                synced.append((result.path, local_files[result.path], *_uploaded_meta(result, plan.local_md5)))
+        stale = [path for path, _ in state.items()
+                 if path not in local_files and path not in cloud_file and not plan.archives.covers(path)]
+        state.update(synced, removed + stale)
+        state.clear_journal()
+
+    if plan.archives:
+        phases.enter("archive")
+        results += [TransferResult(*result) for result in sync_archives(
+            disk_client, local_folder, plan.archives, {path: local_files[path] for path in plan.archived}, state)]
+
+    _forget_remote(plan.remote_cache, results, [src for src, _ in moved], plan.archives)
+    phases.finish()
+    _record_results(metrics, results, info)
+    return results
+
+
+def _forget_remote(remote_cache, results, moved_src=(), archives=None):
+    """
+    Сбрасывает в кэше облачного дерева пути, которые изменили успешные операции цикла
+    (и их папки-предки), чтобы следующий цикл не опирался на устаревшие записи.
+
+    :param remote_cache: remote_cache.RemoteCache или None
+    :param results: результаты операций
+    :param moved_src: исходные пути выполненных перемещений
+    :param archives: archive.ArchiveSet, если выполнялась синхронизация архивов
+    """
+    if remote_cache is None:
+        return
+    paths = [result.path for result in results
+             if result.ok and result.action in ("load", "reload", "delete", "move")]
+    paths.extend(moved_src)
+    if archives:
+        paths.extend((ARCHIVE_ROOT, *archives.prefixes))
+    remote_cache.invalidate(paths)
+
+
+def _uploaded_meta(result, local_md5):
+    """
+    Возвращает (modified, md5) облачной копии после успешной загрузки для снимка состояния.
+
+    md5 берётся из ответа клиента (хэш отправленного содержимого), а если клиент его
+    не сообщил — из посчитанных при планировании.
+    """
+    uploaded = result.uploaded
+    md5 = uploaded.md5 if uploaded is not None and uploaded.md5 else local_md5.get(result.path)
+    return (uploaded.modified if uploaded is not None else None), md5
+
+
+def _bind(disk_client, plan, op):
+    """Возвращает функцию и аргументы, выполняющие операцию плана."""
+    full = os.path.join(plan.local_folder, op.path)
+    if op.action == "load":
+        return disk_client.load, (full, op.path)
+    if op.action == "reload":
+        return disk_client.reload, (full, op.path)
+    if op.action == "delete":
+        return disk_client.delete, (op.path,)
+    if op.action == "delete_local":
+        return _remove_local, (plan.local_folder, op.path)
+    if op.action == "download":
+        return disk_client.download, (op.path, full, plan.cloud_meta[op.path][2], op.mtime)
+    if op.action == "conflict":
+        return _replace_with_remote, (disk_client, plan.local_folder, op.path, plan.cloud_meta[op.path][2], op.mtime)
+    raise ValueError(f"неизвестная операция плана: {op.action}")
+
+
+# Направление передачи данных для операций, которые их передают
+_DIRECTIONS = {"load": "up", "reload": "up", "download": "down", "conflict": "down"}
+
+
+def _record_results(metrics, results, info):
+    """
+    Учитывает в метриках результаты операций и объём переданных данных.
+
+    :param metrics: реестр метрик
+    :param results: список TransferResult
+    :param info: функция (action, path) → (size, mtime) или None, как в run_operations
+    :return: None
+    """
+    for result in results:
+        metrics.inc("sync_operations_total", action=result.action, result="ok" if result.ok else "error")
+        direction = _DIRECTIONS.get(result.action)
+        if result.ok and direction:
+            meta = info(result.action, result.path)
+            if meta is not None and meta[0]:
+                metrics.inc("sync_bytes_total", meta[0], direction=direction)
+
+
+def _record_cycle(metrics, started):
+    """Учитывает завершённый цикл: число, длительность и время окончания."""
+    metrics.inc("sync_cycles_total")
+    metrics.observe("sync_cycle_seconds", time.perf_counter() - started)
+    metrics.set("sync_last_cycle_timestamp", time.time())
+
+
+def _decide_one_way(in_both, local_files, cloud_meta, cloud_file, state, local_folder, hash_workers):
+    """
+    Определяет, какие файлы, присутствующие с обеих сторон, нужно перезаписать в облаке.
+
+    :return: (изменённые пути, неизменные пути, словарь посчитанных md5)
+    :rtype: Tuple[List[str], List[str], Dict[str, str]]
+    """
+    changed, unchanged, to_hash = [], [], {}
+    for path in in_both:
+        file_stat = local_files[path]
+        _, md5, size = cloud_meta[path]
+        if state is not None and state.is_unchanged(path, file_stat):
+            unchanged.append(path)
+        elif size is not None and size != file_stat.size:
+            changed.append(path)
+        elif md5:
+            to_hash[path] = file_stat
+        elif state is not None and path in state:
+            changed.append(path)
+        elif file_stat.mtime > cloud_file[path]:
+            changed.append(path)
+        else:
+            unchanged.append(path)
+
+    local_md5 = hash_files(local_folder, to_hash, cache=state, max_workers=hash_workers)
+    for path in to_hash:
+        if local_md5.get(path) == cloud_meta[path][1]:
+            unchanged.append(path)
+        else:
+            changed.append(path)
+    return changed, unchanged, local_md5
+
+
+def _decide_two_way(in_both, local_files, cloud_meta, state, local_folder, hash_workers):
+    """
+    Выбирает направление для файлов, присутствующих с обеих сторон, по снимку состояния.
+
+    Локальная копия считается изменённой, если её (size, mtime_ns, inode) отличаются от
+    снимка; облачная — если отличается md5 (или modified, когда md5 неизвестен). Если
+    изменились обе или снимка нет, а содержимое различается, это конфликт. Если снимок
+    не хранит ни md5, ни modified облачной копии, содержимое сверяется с локальным:
+    различие при неизменной локальной копии означает правку в облаке.
+
+    :return: (пути для загрузки, для скачивания, конфликты, неизменные, посчитанные md5)
+    :rtype: Tuple[List[str], List[str], List[str], List[str], Dict[str, str]]
+    """
+    uploads, downloads, conflicts, unchanged = [], [], [], []
+    to_hash, on_differ = {}, {}
     for path in in_both:
-        if local_files[path] > cloud_file[path]:
-            full_local = os.path.join(local_folder, path)
-            # try:
-            disk_client.reload(full_local, path)
-            #     # logging.info(f"Обновление файла завершено: {path}")
-            # except Exception as e:
-            #     logging.error(f"Ошибка при обновлении файла {path}: {e}")
\ No newline at end of file
+        file_stat = local_files[path]
+        modified, md5, size = cloud_meta[path]
+        row = state.get(path) if state is not None else None
+        differ = conflicts
+        if row is not None:
+            local_changed = not state.is_unchanged(path, file_stat)
+            remote_changed = _remote_changed(row, modified, md5)
+            if remote_changed is not None:
+                if not (local_changed or remote_changed):
+                    unchanged.append(path)
+                    continue
+                if not remote_changed:
+                    uploads.append(path)
+                    continue
+                if not local_changed:
+                    downloads.append(path)
+                    continue
+            elif not local_changed:
+                differ = downloads
+        # Изменились обе стороны, снимка нет или облачная версия в нём неизвестна:
+        # одинаковое содержимое — не изменение и не конфликт
+        if md5 and size == file_stat.size:
+            to_hash[path] = file_stat
+            on_differ[path] = differ
+        else:
+            differ.append(path)
+
+    local_md5 = hash_files(local_folder, to_hash, cache=state, max_workers=hash_workers)
+    for path in to_hash:
+        if local_md5.get(path) == cloud_meta[path][1]:
+            unchanged.append(path)
+        else:
+            on_differ[path].append(path)
+    if conflicts:
+        logging.warning(f"Конфликтов изменений: {len(conflicts)}, локальные копии будут сохранены")
+    return uploads, downloads, conflicts, unchanged, local_md5
+
+
+def _remote_changed(row, modified, md5):
+    """
+    Проверяет, изменилась ли облачная копия с момента последней синхронизации.
+
+    :param row: строка снимка (size, mtime_ns, inode, remote_modified, md5)
+    :param str modified: поле modified из листинга облака
+    :param str md5: поле md5 из листинга облака
+    :return: None, если сравнивать не с чем (снимок не хранит облачную версию)
+    :rtype: Optional[bool]
+    """
+    _, _, _, remote_modified, synced_md5 = row
+    if md5 and synced_md5:
+        return md5 != synced_md5
+    if modified and remote_modified:
+        return modified != remote_modified
+    return None
+
+
+def _conflict_name(path):
+    """Возвращает имя для сохранения конфликтующей локальной копии: a.conflict-ДАТА.txt."""
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.conflict-{datetime.now():%Y%m%d-%H%M%S}{ext}"
+
+
+def _replace_with_remote(disk_client, local_folder, path, size, mtime):
+    """
+    Разрешает конфликт: переименовывает локальную копию и скачивает облачную на её место.
+
+    Переименованная копия в следующем цикле загрузится в облако как новый файл.
+    """
+    full = os.path.join(local_folder, path)
+    kept = _conflict_name(full)
+    os.replace(full, kept)
+    logging.warning(f"Конфликт {path}: локальная копия сохранена как {os.path.basename(kept)}")
+    return disk_client.download(path, full, size, mtime)
+
+
+def _remove_local(local_folder, path):
+    """Удаляет локальный файл и ставшие пустыми родительские каталоги (кроме корня)."""
+    os.remove(os.path.join(local_folder, path))
+    for parent in _parents(path):
+        try:
+            os.rmdir(os.path.join(local_folder, parent))
+        except OSError:
+            break
+    logging.info(f"Файл {path} удалён локально, так как удалён в облаке")
+
+
+def _stat_local(full):
+    """Возвращает FileStat локального файла или None, если его нет."""
+    try:
+        st = os.stat(full)
+    except OSError:
+        return None
+    return FileStat(st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+def run_operations(operations, max_workers=1, scheduler=None, info=None, journal=None):
+    """
+    Выполняет операции синхронизации через планировщик и собирает их результаты.
+
+    Исключение или ответ False от метода клиента помечают операцию как неудачную,
+    остальные операции при этом продолжают выполняться. Если планировщик остановлен
+    (завершение программы), не начатые операции возвращаются неудачными, а результаты
+    уже выполненных сохраняются.
+
+    :param operations: список кортежей (action, path, func, args)
+    :param int max_workers: максимальное число одновременных операций (если scheduler не задан)
+    :param scheduler: TransferScheduler; по умолчанию создаётся на max_workers потоков
+    :param info: функция (action, path) → (size, mtime) или None для расчёта приоритета;
+                 операции без сведений (удаления папок и т. п.) считаются мелкими
+    :param journal: SyncState, в журнал которого каждая операция записывается перед началом
+    :return: результаты в порядке исходного списка
+    :rtype: List[TransferResult]
+    """
+    if not operations:
+        return []
+    owned = scheduler is None
+    if owned:
+        scheduler = TransferScheduler(max_workers)
+
+    def run(operation):
+        action, path, func, args = operation
+        try:
+            if journal is not None:
+                journal.begin_operation(action, path)
+            value = func(*args)
+        except Exception as exc:
+            logging.error(f"Ошибка операции {action} для {path}: {exc}")
+            return TransferResult(action, path, False, str(exc))
+        if value is False:
+            return TransferResult(action, path, False, "операция не выполнена")
+        return TransferResult(action, path, True, uploaded=value if hasattr(value, "md5") else None)
+
+    jobs = []
+    for operation in operations:
+        action, path = operation[:2]
+        meta = info(action, path) if info is not None else None
+        key = scheduler.priority(*(meta or (0, 0)))
+        jobs.append((action, key, lambda operation=operation: run(operation)))
+    try:
+        results = scheduler.run(jobs)
+    except SchedulerClosed as exc:
+        results = [result or TransferResult(action, path, False, "отменено при остановке")
+                   for result, (action, path, _, _) in zip(exc.results, operations)]
+    finally:
+        if owned:
+            scheduler.shutdown()
+
+    failed = sum(1 for r in results if not r.ok)
+    logging.info(f"Выполнено операций: {len(results)}, с ошибкой: {failed}")
+    return results
+
+
+def sync_paths(disk_client, local_folder, paths, state, max_workers=1, scheduler=None,
+               path_filter=None, metrics=None, archives=None, remote_cache=None):
+    """
+    Инкрементальная синхронизация только изменённых путей (без листинга облака).
+
+    Решение принимается по снимку состояния: файл, которого нет в снимке, загружается,
+    изменившийся — перезаписывается, пропавший — удаляется из облака. Пропавший каталог
+    удаляется одним запросом. Путь, чей предок тоже в наборе, покрывается обходом предка.
+
+    :param disk_client: клиент с методами mkdir, load, reload, delete
+    :param str local_folder: абсолютный путь к локальной папке синхронизации
+    :param Iterable[str] paths: относительные пути изменённых файлов и каталогов
+                                (пустая строка — вся папка)
+    :param state: SyncState со снимком последней синхронизации
+    :param int max_workers: сколько передач выполнять одновременно
+    :param scheduler: TransferScheduler, задающий порядок и параллельность передач
+    :param path_filter: filters.PathFilter; изменения исключённых путей пропускаются
+    :param metrics: metrics.Metrics для счётчиков операций и переданных байт; None — не собирать
+    :param archives: archive.ArchiveSet; затронутые архивные поддеревья пересобираются целиком
+    :param remote_cache: remote_cache.RemoteCache, в котором сбрасываются изменённые пути
+    :return: результаты операций
+    :rtype: List[TransferResult]
+    """
+    if path_filter:
+        paths = [path for path in paths if not path or not path_filter.excludes_remote(path)]
+    archives = archives or ArchiveSet()
+    touched = set()
+    if archives:
+        for path in paths:
+            prefix = archives.prefix_of(path)
+            if prefix is not None:
+                touched.add(prefix)
+            else:
+                touched.update(p for p in archives.prefixes if not path or p.startswith(path + "/"))
+        paths = [path for path in paths if not archives.covers(path)]
+    roots = _collapse_paths(paths)
+    local_files = {}
+    deleted_files = []
+    deleted_dirs = {}
+
+    for rel in roots:
+        full = os.path.join(local_folder, rel) if rel else local_folder
+        try:
+            st = os.stat(full)
+        except FileNotFoundError:
+            if rel in state:
+                deleted_files.append(rel)
+            else:
+                under = [p for p in state.paths_under(rel) if not archives.covers(p)]
+                if under:
+                    deleted_dirs[rel] = under
+            continue
+        except OSError as exc:
+            logging.warning(f"Нет доступа к {full}: {exc}")
+            continue
+
+        if stat_module.S_ISDIR(st.st_mode):
+            if rel and path_filter and path_filter.excludes_dir(rel):
+                continue
+            found = get_local_files(full, local_folder, path_filter=path_filter)
+            local_files.update((p, s) for p, s in found.items() if not archives.covers(p))
+            deleted_files.extend(p for p in state.paths_under(rel)
+                                 if p not in found and p not in found.skipped and not archives.covers(p)
+                                 and not (path_filter and path_filter.excludes_remote(p)))
+        elif stat_module.S_ISREG(st.st_mode):
+            if path_filter and (path_filter.excludes_path(rel) or path_filter.skips(st.st_size, st.st_mtime)):
+                continue
+            local_files[rel] = FileStat(st.st_size, st.st_mtime_ns, st.st_ino)
+
+    new_files = [path for path in local_files if path not in state]
+    known_dirs = {parent for path in new_files for parent in _parents(path)
+                  if state.paths_under(parent)}
+
+    gone = deleted_files + [path for under in deleted_dirs.values() for path in under]
+    moves = _detect_moves(new_files, gone, local_files, state,
+                          {path: (state.get(path)[0], state.get(path)[4]) for path in gone},
+                          local_folder)
+    move_results, moved = [], []
+    if moves:
+        grouped = _group_moves(moves, state.paths_under, lambda folder: bool(state.paths_under(folder)),
+                               lambda folder: os.path.isdir(os.path.join(local_folder, folder)))
+        move_results, moved, moved_dirs = _run_moves(disk_client, grouped, known_dirs, max_workers,
+                                                     journal=state, scheduler=scheduler)
+        moved_src = {src for src, _ in moved}
+        moved_dst = {dst for _, dst in moved}
+        state.update(((dst, local_files[dst], *state.get(src)[3:]) for src, dst in moved), moved_src)
+        new_files = [path for path in new_files if path not in moved_dst]
+        deleted_files = [path for path in deleted_files if path not in moved_src]
+        deleted_dirs = {folder: [p for p in under if p not in moved_src]
+                        for folder, under in deleted_dirs.items() if folder not in moved_dirs}
+
+    _ensure_cloud_dirs(disk_client, new_files, known_dirs)
+
+    # Файл того же размера с известным md5 облачной копии проверяется по содержимому:
+    # touch или восстановление из бэкапа не должны приводить к повторной загрузке
+    to_hash = {}
+    for path, file_stat in local_files.items():
+        row = state.get(path)
+        if row is not None and row[4] and row[0] == file_stat.size and not state.is_unchanged(path, file_stat):
+            to_hash[path] = file_stat
+    local_md5 = hash_files(local_folder, to_hash, cache=state)
+    same_content = [path for path in to_hash if local_md5.get(path) == state.get(path)[4]]
+    state.update((path, local_files[path], state.get(path)[3], state.get(path)[4]) for path in same_content)
+
+    operations = []
+    for path, file_stat in local_files.items():
+        if state.is_unchanged(path, file_stat):
+            continue
+        action = "reload" if path in state else "load"
+        func = disk_client.reload if path in state else disk_client.load
+        operations.append((action, path, func, (os.path.join(local_folder, path), path)))
+    for path in deleted_files:
+        operations.append(("delete", path, disk_client.delete, (path,)))
+    for path in deleted_dirs:
+        operations.append(("delete", path, disk_client.delete, (path,)))
+
+    def info(action, path):
+        file_stat = local_files.get(path)
+        return (file_stat.size, file_stat.mtime) if file_stat is not None else None
+
+    results = run_operations(operations, max_workers, scheduler, info, journal=state)
+
+    synced, removed = [], []
+    for result in results:
+        if not result.ok:
+            continue
+        if result.action != "delete":
+            synced.append((result.path, local_files[result.path], *_uploaded_meta(result, local_md5)))
+        elif result.path in deleted_dirs:
+            removed.extend(deleted_dirs[result.path])
+        else:
+            removed.append(result.path)
+    state.update(synced, removed)
+    state.clear_journal()
+
+    archived = {}
+    for prefix in touched:
+        full = os.path.join(local_folder, prefix)
+        if os.path.isdir(full):
+            archived.update(get_local_files(full, local_folder, path_filter=path_filter))
+    if touched:
+        results += [TransferResult(*result) for result in sync_archives(
+            disk_client, local_folder, ArchiveSet(touched), archived, state)]
+    _forget_remote(remote_cache, move_results + results, [src for src, _ in moved],
+                   ArchiveSet(touched))
+    _record_results(metrics if metrics is not None else NULL_METRICS, move_results + results, info)
+    return move_results + results
+
+
+def _collapse_deletes(paths, files_under, local_dirs):
+    """
+    Заменяет удаление всех файлов папки одним удалением самой верхней такой папки.
+
+    Папка удаляется целиком, если все облачные файлы внутри неё подлежат удалению
+    и такой папки нет локально. В files_under должны входить и облачные файлы,
+    которые цикл не синхронизирует (исключённые фильтром): они не дают удалить папку.
+
+    :param Iterable[str] paths: облачные файлы, которые нужно удалить
+    :param files_under: функция folder → список облачных файлов внутри папки
+    :param Set[str] local_dirs: относительные пути существующих локальных папок
+    :return: словарь «путь для DELETE» → список покрываемых им файлов
+    :rtype: Dict[str, List[str]]
+    """
+    remaining = set(paths)
+    targets = {}
+    folders = {parent for path in remaining for parent in _parents(path)}
+    for folder in sorted(folders, key=lambda f: (f.count("/"), f)):
+        if folder in local_dirs or any(parent in targets for parent in _parents(folder)):
+            continue
+        under = files_under(folder)
+        if under and all(f in remaining for f in under):
+            targets[folder] = under
+
+    covered = {f for under in targets.values() for f in under}
+    for path in sorted(remaining - covered):
+        targets[path] = [path]
+    if covered:
+        logging.info(f"Удаление {len(covered)} файлов сведено к {len(targets) - len(remaining - covered)} папкам")
+    return targets
+
+
+def _detect_moves(new_paths, gone_paths, local_files, state, remote_meta, local_folder,
+                  hash_workers=None):
+    """
+    Находит переименования: пары «пропавший в облаке путь → новый локальный путь».
+
+    Сначала сопоставляются inode из снимка состояния (при совпадении размера и mtime),
+    затем — размер и md5 облачной копии; локальные хэши считаются только для файлов,
+    размер которых совпал хотя бы с одним кандидатом.
+
+    :param Iterable[str] new_paths: файлы, которые есть только локально
+    :param Iterable[str] gone_paths: файлы, которые есть только в облаке
+    :param local_files: отображение path → FileStat
+    :param state: SyncState или None
+    :param remote_meta: словарь gone_path → (size, md5) облачной копии
+    :param str local_folder: абсолютный путь к локальной папке синхронизации
+    :param int hash_workers: размер пула потоков для хэширования
+    :return: словарь старый путь → новый путь
+    :rtype: Dict[str, str]
+    """
+    moves = {}
+    unmatched = set(new_paths)
+
+    if state is not None:
+        by_inode = {}
+        for path in gone_paths:
+            row = state.get(path)
+            if row is not None:
+                by_inode[row[2]] = path
+        for path in sorted(unmatched):
+            file_stat = local_files[path]
+            old = by_inode.pop(file_stat.inode, None)
+            if old is not None and state.get(old)[:2] == (file_stat.size, file_stat.mtime_ns):
+                moves[old] = path
+                unmatched.discard(path)
+
+    by_content = {}
+    for path in gone_paths:
+        size, md5 = remote_meta.get(path, (None, None))
+        if path not in moves and size is not None and md5:
+            by_content.setdefault((size, md5), []).append(path)
+    if by_content:
+        sizes = {size for size, _ in by_content}
+        candidates = {path: local_files[path] for path in unmatched if local_files[path].size in sizes}
+        local_md5 = hash_files(local_folder, candidates, cache=state, max_workers=hash_workers)
+        for path in sorted(candidates):
+            olds = by_content.get((candidates[path].size, local_md5.get(path)))
+            if olds:
+                moves[olds.pop()] = path
+
+    if moves:
+        logging.info(f"Обнаружено перемещений: {len(moves)}")
+    return moves
+
+
+def _group_moves(moves, files_under, remote_dir_exists, local_dir_exists):
+    """
+    Сворачивает перемещения файлов в перемещения целых папок, где это возможно.
+
+    Папка S переносится в D одним запросом, если все облачные файлы внутри S
+    перемещаются в D с теми же относительными путями, S больше нет локально,
+    а D ещё нет в облаке. Выбирается самая верхняя подходящая папка.
+
+    :param moves: словарь старый путь файла → новый путь
+    :param files_under: функция folder → список облачных файлов внутри папки
+    :param remote_dir_exists: функция folder → bool, есть ли папка в облаке
+    :param local_dir_exists: функция folder → bool, есть ли папка локально
+    :return: список (src, dst, [(старый путь файла, новый путь файла), ...])
+    :rtype: List[tuple]
+    """
+    candidates = set()
+    for src, dst in moves.items():
+        src_parts, dst_parts = src.split("/"), dst.split("/")
+        i = 1
+        while i < len(src_parts) and i < len(dst_parts) and src_parts[-i] == dst_parts[-i]:
+            candidates.add(("/".join(src_parts[:-i]), "/".join(dst_parts[:-i])))
+            i += 1
+
+    grouped, covered, accepted = [], set(), []
+    for src_dir, dst_dir in sorted(candidates, key=lambda c: (c[0].count("/"), c)):
+        if any(src_dir == a or src_dir.startswith(a + "/") for a in accepted):
+            continue
+        if dst_dir.startswith(src_dir + "/") or src_dir.startswith(dst_dir + "/"):
+            continue
+        under = files_under(src_dir)
+        if not under or remote_dir_exists(dst_dir) or local_dir_exists(src_dir):
+            continue
+        if all(moves.get(f) == dst_dir + f[len(src_dir):] for f in under):
+            accepted.append(src_dir)
+            covered.update(under)
+            grouped.append((src_dir, dst_dir, [(f, moves[f]) for f in under]))
+
+    grouped.extend((src, dst, [(src, dst)]) for src, dst in sorted(moves.items()) if src not in covered)
+    return grouped
+
+
+def _run_moves(disk_client, grouped, cloud_dirs, max_workers=1, journal=None, scheduler=None):
+    """
+    Выполняет перемещения в облаке: сначала папки, затем отдельные файлы.
+
+    :param grouped: перемещения, сгруппированные _group_moves
+    :param Set[str] cloud_dirs: папки, существующие в облаке; дополняется созданными
+                                и появившимися в результате перемещений
+    :param int max_workers: сколько перемещений выполнять одновременно (если scheduler не задан)
+    :param journal: SyncState для журнала операций
+    :param scheduler: общий TransferScheduler: при остановке программы не начатые
+                      перемещения отменяются вместе с остальными операциями
+    :return: (результаты операций, список успешно перемещённых пар файлов (старый, новый),
+             множество папок, перенесённых целиком)
+    :rtype: Tuple[List[TransferResult], List[Tuple[str, str]], Set[str]]
+    """
+    folders = [g for g in grouped if g[2] != [(g[0], g[1])]]
+    files = [g for g in grouped if g[2] == [(g[0], g[1])]]
+
+    results, moved, moved_dirs = [], [], set()
+    for batch in (folders, files):
+        _ensure_cloud_dirs(disk_client, [dst for _, dst, _ in batch], cloud_dirs)
+        batch_results = run_operations(
+            [("move", dst, disk_client.move, (src, dst)) for src, dst, _ in batch], max_workers, scheduler,
+            journal=journal)
+        for (src, _, pairs), result in zip(batch, batch_results):
+            if result.ok:
+                moved.extend(pairs)
+                if batch is folders:
+                    moved_dirs.add(src)
+                for _, dst in pairs:
+                    cloud_dirs.update(_parents(dst))
+        results.extend(batch_results)
+    return results, moved, moved_dirs
+
+
+def _collapse_paths(paths):
+    """
+    Убирает пути, чей предок тоже присутствует в наборе.
+
+    :param Iterable[str] paths: относительные пути (пустая строка — корень)
+    :return: минимальный набор путей, покрывающий исходный
+    :rtype: List[str]
+    """
+    result = []
+    for path in sorted(set(paths), key=lambda p: (p.count(os.sep), p)):
+        if "" in result:
+            break
+        if not any(parent in result for parent in _parents(path)):
+            result.append(path)
+    return result
+
+
+def _parents(path):
+    """Возвращает относительные пути всех каталогов-предков (без корня)."""
+    return [str(parent) for parent in PurePosixPath(path).parents if str(parent) != "."]
+
+
+def _ensure_cloud_dirs(disk_client, paths, cloud_dirs):
+    """
+    Создаёт в облаке недостающие родительские папки для загружаемых файлов.
+
+    Папки создаются от внешних к вложенным, каждая — не более одного раза.
+
+    :param disk_client: клиент с методом mkdir(remote_path)
+    :param Iterable[str] paths: относительные пути загружаемых файлов
+    :param Set[str] cloud_dirs: относительные пути папок, уже существующих в облаке;
+                                дополняется созданными папками
+    :return: None
+    """
+    for folder in _missing_dirs(paths, cloud_dirs):
+        disk_client.mkdir(folder)
+        cloud_dirs.add(folder)
+
+
+def _missing_dirs(paths, cloud_dirs):
+    """
+    Возвращает родительские папки путей, которых нет в облаке, от внешних к вложенным.
+
+    :param Iterable[str] paths: относительные пути файлов
+    :param Set[str] cloud_dirs: папки, уже существующие в облаке
+    :rtype: List[str]
+    """
+    missing = {parent for path in paths for parent in _parents(path) if parent not in cloud_dirs}
+    return sorted(missing, key=lambda p: (p.count("/"), p))
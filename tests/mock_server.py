@@ -0,0 +1,476 @@
+"""
+Локальная замена REST API Яндекс.Диска для сквозных тестов и бенчмарков.
+
+MockDiskServer поднимает HTTP-сервер на 127.0.0.1 и обслуживает:
+- GET/PUT/DELETE /v1/disk/resources (метаданные с постраничным листингом, создание
+  папки, удаление с асинхронной операцией для папок),
+- GET /v1/disk/resources/files (плоский список файлов),
+- GET /v1/disk/resources/upload и PUT /upload/<id> (загрузка содержимого, в том числе
+  частями с Content-Range: 202 на промежуточную часть, 201 на последнюю),
+- GET /v1/disk/resources/download и GET /download/<id> (скачивание, с поддержкой Range),
+- POST /v1/disk/resources/move,
+- GET /v1/disk/operations/<id>,
+- GET /v1/disk (ревизия Диска).
+
+Каждое изменение увеличивает ревизию Диска и записывает её в поле revision изменённого
+ресурса и всех папок-предков, так что по ревизии папки видно, менялось ли что-нибудь
+внутри неё.
+
+Задержка на запрос, пропускная способность тела, максимальный размер страницы и доля
+ответов 503 настраиваются; число вызовов по эндпоинтам считается в calls.
+Содержимое файлов хранится во временном каталоге, в памяти — только метаданные.
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+RESOURCES = "/v1/disk/resources"
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _normalize(path):
+    path = path.removeprefix("disk:").lstrip("/")
+    return "disk:/" + path.rstrip("/") if path else "disk:/"
+
+
+def _parent(path):
+    head = path.rsplit("/", 1)[0]
+    return head if head != "disk:" else "disk:/"
+
+
+class MockDiskServer():
+    """
+    In-memory Яндекс.Диск.
+
+    :param float latency: задержка перед ответом на каждый запрос в секундах
+    :param int bandwidth: ограничение скорости тела загрузки и скачивания в байтах/с
+                          (0 — без ограничения)
+    :param int max_page: максимальный limit листинга, как у настоящего API
+    :param float error_rate: доля запросов к API, на которые отвечать 503 с Retry-After: 0
+    :param bool async_delete: удалять папки через асинхронную операцию (202)
+    :param int seed: зерно генератора для воспроизводимой инъекции ошибок
+    """
+
+    def __init__(self, latency=0.0, bandwidth=0, max_page=1000, error_rate=0.0,
+                 async_delete=True, seed=0):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.max_page = max_page
+        self.error_rate = error_rate
+        self.async_delete = async_delete
+        self.calls = Counter()
+        self.bytes_uploaded = 0
+        self.bytes_downloaded = 0
+        # False — сервер игнорирует Range при скачивании и Content-Range при загрузке
+        self.support_ranges = True
+        # False — изменение отмечает ревизией только сам ресурс, но не его папки-предки
+        self.propagate_revisions = True
+        self.revision = 1
+        self.resources = {"disk:/": {"type": "dir", "modified": _now(), "revision": 1}}
+        self._uploads = {}
+        self._operations = {}
+        self._ids = itertools.count(1)
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._storage = tempfile.mkdtemp(prefix="mock-disk-")
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05},
+                                        daemon=True)
+
+    @property
+    def url(self):
+        """Адрес сервера вида http://127.0.0.1:port."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def base_url(self):
+        """Значение base_url для Yandex_disc."""
+        return self.url + RESOURCES
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        shutil.rmtree(self._storage, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls.clear()
+            self.bytes_uploaded = 0
+            self.bytes_downloaded = 0
+
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def add_file(self, path, data):
+        """Кладёт файл на «диск» напрямую, минуя API (папки создаются автоматически)."""
+        path = _normalize(path)
+        with self._lock:
+            parent = _parent(path)
+            missing = []
+            while parent not in self.resources:
+                missing.append(parent)
+                parent = _parent(parent)
+            for folder in reversed(missing):
+                self.resources[folder] = {"type": "dir", "modified": _now()}
+            self._store(path, data)
+
+    def remove(self, path):
+        """Удаляет файл или папку с «диска» напрямую, минуя API."""
+        with self._lock:
+            self._remove(_normalize(path))
+
+    def read_file(self, path):
+        """Возвращает содержимое файла с «диска»."""
+        with self._lock:
+            res = self.resources[_normalize(path)]
+        with open(res["blob"], "rb") as f:
+            return f.read()
+
+    def files(self, prefix="disk:/"):
+        """Возвращает пути всех файлов внутри prefix."""
+        prefix = _normalize(prefix).rstrip("/") + "/"
+        with self._lock:
+            return sorted(p for p, r in self.resources.items()
+                          if r["type"] == "file" and p.startswith(prefix))
+
+    def _store(self, path, data):
+        blob = os.path.join(self._storage, f"added-{next(self._ids)}")
+        with open(blob, "wb") as f:
+            f.write(data)
+        self._store_blob(path, blob, len(data), hashlib.md5(data).hexdigest(),
+                         hashlib.sha256(data).hexdigest())
+
+    def _store_blob(self, path, blob, size, md5, sha256):
+        old = self.resources.get(path, {}).get("blob")
+        if old and old != blob and os.path.exists(old):
+            os.remove(old)
+        self.resources[path] = {
+            "type": "file", "size": size, "md5": md5, "sha256": sha256, "modified": _now(), "blob": blob,
+        }
+        self._touch(path)
+
+    def _touch(self, path):
+        """Увеличивает ревизию Диска и отмечает ею ресурс и всех его предков."""
+        self.revision += 1
+        while True:
+            if path in self.resources:
+                self.resources[path]["revision"] = self.revision
+            if path == "disk:/" or not self.propagate_revisions:
+                return
+            path = _parent(path)
+
+    def _public(self, path):
+        res = self.resources[path]
+        item = {k: v for k, v in res.items() if k != "blob"}
+        item["path"] = path
+        item["name"] = path.rsplit("/", 1)[-1]
+        return item
+
+    def _children(self, path):
+        prefix = path.rstrip("/") + "/"
+        return sorted(p for p in self.resources
+                      if p.startswith(prefix) and "/" not in p[len(prefix):] and p != prefix)
+
+    def _remove(self, path):
+        prefix = path + "/"
+        for p in [p for p in self.resources if p == path or p.startswith(prefix)]:
+            blob = self.resources.pop(p).get("blob")
+            if blob and os.path.exists(blob):
+                os.remove(blob)
+        self._touch(_parent(path))
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body=None, headers=None):
+                payload = json.dumps(body).encode() if body is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _read_body(self, sink=None):
+                """Читает тело запроса блоками с учётом bandwidth; пишет в sink или отбрасывает."""
+                if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                    return self._read_chunked(sink)
+                length = int(self.headers.get("Content-Length", 0))
+                remaining = length
+                started = time.monotonic()
+                while remaining:
+                    chunk = self.rfile.read(min(remaining, 256 * 1024))
+                    if not chunk:
+                        break
+                    if sink is not None:
+                        sink(chunk)
+                    remaining -= len(chunk)
+                    if server.bandwidth:
+                        ahead = (length - remaining) / server.bandwidth - (time.monotonic() - started)
+                        if ahead > 0:
+                            time.sleep(ahead)
+                return length - remaining
+
+            def _read_chunked(self, sink):
+                """Читает тело с Transfer-Encoding: chunked (без учёта bandwidth)."""
+                total = 0
+                while True:
+                    size = int(self.rfile.readline().split(b";")[0], 16)
+                    if not size:
+                        while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                            pass
+                        return total
+                    chunk = self.rfile.read(size)
+                    self.rfile.readline()
+                    if sink is not None:
+                        sink(chunk)
+                    total += size
+
+            def _dispatch(self, method):
+                url = urlsplit(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                route = url.path
+                endpoint = f"{method} {route}"
+                if route.startswith(("/upload/", "/download/")):
+                    endpoint = f"{method} /{route.split('/')[1]}"
+                if route.startswith("/v1/disk/operations/"):
+                    endpoint = f"{method} /v1/disk/operations"
+                with server._lock:
+                    server.calls[endpoint] += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                if route.startswith("/v1/") and server.error_rate:
+                    with server._lock:
+                        fail = server._random.random() < server.error_rate
+                    if fail:
+                        if method == "PUT":
+                            self._read_body()
+                        return self._reply(503, {"error": "ServiceUnavailable"}, {"Retry-After": "0"})
+                handler = getattr(self, f"_{method.lower()}_{route.strip('/').split('/')[-1]}", None)
+                if route.startswith("/upload/"):
+                    handler = self._put_upload_blob
+                elif route.startswith("/download/"):
+                    handler = self._get_download_blob
+                elif route.startswith("/v1/disk/operations/"):
+                    handler = self._get_operation
+                if handler is None:
+                    return self._reply(404, {"error": "NotFound"})
+                with server._lock:
+                    return handler(query, route)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_PUT(self):
+                self._dispatch("PUT")
+
+            def do_DELETE(self):
+                self._dispatch("DELETE")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            # --- /v1/disk/resources ---
+            def _get_resources(self, query, route):
+                path = _normalize(query.get("path", ""))
+                if path not in server.resources:
+                    return self._reply(404, {"error": "DiskNotFoundError"})
+                body = server._public(path)
+                if body["type"] == "dir":
+                    children = server._children(path)
+                    limit = min(int(query.get("limit", 20)), server.max_page)
+                    offset = int(query.get("offset", 0))
+                    body["_embedded"] = {
+                        "items": [server._public(p) for p in children[offset:offset + limit]],
+                        "total": len(children), "limit": limit, "offset": offset, "path": path,
+                    }
+                return self._reply(200, body)
+
+            def _put_resources(self, query, route):
+                path = _normalize(query.get("path", ""))
+                if path in server.resources:
+                    return self._reply(409, {"error": "DiskPathPointsToExistentDirectoryError"})
+                if _parent(path) not in server.resources:
+                    return self._reply(409, {"error": "DiskPathDoesntExistsError"})
+                server.resources[path] = {"type": "dir", "modified": _now()}
+                server._touch(path)
+                return self._reply(201, {"href": f"{server.base_url}?path={path}"})
+
+            def _delete_resources(self, query, route):
+                path = _normalize(query.get("path", ""))
+                res = server.resources.get(path)
+                if res is None:
+                    return self._reply(404, {"error": "DiskNotFoundError"})
+                server._remove(path)
+                if res["type"] == "dir" and server.async_delete:
+                    op = str(next(server._ids))
+                    server._operations[op] = "success"
+                    return self._reply(202, {"href": f"{server.url}/v1/disk/operations/{op}"})
+                return self._reply(204)
+
+            # --- /v1/disk/resources/files ---
+            def _get_files(self, query, route):
+                limit = min(int(query.get("limit", 20)), server.max_page)
+                offset = int(query.get("offset", 0))
+                files = sorted(p for p, r in server.resources.items() if r["type"] == "file")
+                return self._reply(200, {"items": [server._public(p) for p in files[offset:offset + limit]],
+                                         "limit": limit, "offset": offset})
+
+            # --- /v1/disk/resources/upload ---
+            def _get_upload(self, query, route):
+                path = _normalize(query.get("path", ""))
+                if path in server.resources and query.get("overwrite") != "true":
+                    return self._reply(409, {"error": "DiskResourceAlreadyExistsError"})
+                if _parent(path) not in server.resources:
+                    return self._reply(409, {"error": "DiskPathDoesntExistsError"})
+                upload = str(next(server._ids))
+                server._uploads[upload] = path
+                return self._reply(200, {"href": f"{server.url}/upload/{upload}", "method": "PUT"})
+
+            def _put_upload_blob(self, query, route):
+                upload = route.rsplit("/", 1)[-1]
+                path = server._uploads.get(upload)
+                if path is None:
+                    self._read_body()
+                    return self._reply(404, {"error": "UploadNotFound"})
+                blob = os.path.join(server._storage, f"upload-{upload}")
+                content_range = self.headers.get("Content-Range") if server.support_ranges else None
+                start, total = 0, None
+                if content_range:
+                    first, total = content_range.removeprefix("bytes ").split("/")
+                    start, total = int(first.split("-")[0]), int(total)
+                    received = os.path.getsize(blob) if os.path.exists(blob) else 0
+                    if start != received:
+                        self._read_body()
+                        return self._reply(416, {"error": "RangeMismatch"},
+                                           {"Range": f"bytes=0-{received - 1}"})
+                server._lock.release()
+                try:
+                    with open(blob, "r+b" if start else "wb") as f:
+                        f.seek(start)
+                        size = self._read_body(f.write)
+                finally:
+                    server._lock.acquire()
+                server.bytes_uploaded += size
+                if total is not None and start + size < total:
+                    return self._reply(202, None, {"Range": f"bytes=0-{start + size - 1}"})
+                del server._uploads[upload]
+                md5, sha256 = hashlib.md5(), hashlib.sha256()
+                with open(blob, "rb") as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                        md5.update(chunk)
+                        sha256.update(chunk)
+                server._store_blob(path, blob, start + size, md5.hexdigest(), sha256.hexdigest())
+                return self._reply(201)
+
+            # --- /v1/disk/resources/download ---
+            def _get_download(self, query, route):
+                path = _normalize(query.get("path", ""))
+                res = server.resources.get(path)
+                if res is None or res["type"] != "file":
+                    return self._reply(404, {"error": "DiskNotFoundError"})
+                download = str(next(server._ids))
+                server._uploads[f"d{download}"] = res["blob"]
+                return self._reply(200, {"href": f"{server.url}/download/{download}", "method": "GET"})
+
+            def _get_download_blob(self, query, route):
+                blob = server._uploads.get(f"d{route.rsplit('/', 1)[-1]}")
+                if blob is None or not os.path.exists(blob):
+                    return self._reply(404, {"error": "NotFound"})
+                size = os.path.getsize(blob)
+                start, end, status = 0, size - 1, 200
+                requested = self.headers.get("Range")
+                if requested and server.support_ranges:
+                    first, last = requested.removeprefix("bytes=").split("-")
+                    start, end, status = int(first), min(int(last), size - 1), 206
+                self.send_response(status)
+                self.send_header("Content-Length", str(end - start + 1))
+                self.send_header("Accept-Ranges", "bytes" if server.support_ranges else "none")
+                if status == 206:
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+                self.end_headers()
+                server._lock.release()
+                try:
+                    started = time.monotonic()
+                    sent = 0
+                    with open(blob, "rb") as f:
+                        f.seek(start)
+                        remaining = end - start + 1
+                        while remaining:
+                            chunk = f.read(min(remaining, 256 * 1024))
+                            try:
+                                self.wfile.write(chunk)
+                            except (BrokenPipeError, ConnectionResetError):
+                                break  # клиент закрыл соединение (например, не дочитал ответ 200)
+                            remaining -= len(chunk)
+                            sent += len(chunk)
+                            if server.bandwidth:
+                                ahead = sent / server.bandwidth - (time.monotonic() - started)
+                                if ahead > 0:
+                                    time.sleep(ahead)
+                finally:
+                    server._lock.acquire()
+                server.bytes_downloaded += sent
+
+            # --- /v1/disk/resources/move ---
+            def _post_move(self, query, route):
+                src = _normalize(query.get("from", ""))
+                dst = _normalize(query.get("path", ""))
+                if src not in server.resources:
+                    return self._reply(404, {"error": "DiskNotFoundError"})
+                if dst in server.resources and query.get("overwrite") != "true":
+                    return self._reply(409, {"error": "DiskResourceAlreadyExistsError"})
+                if _parent(dst) not in server.resources:
+                    return self._reply(409, {"error": "DiskPathDoesntExistsError"})
+                for p in [p for p in server.resources if p == src or p.startswith(src + "/")]:
+                    server.resources[dst + p[len(src):]] = server.resources.pop(p)
+                server._touch(_parent(src))
+                server._touch(dst)
+                return self._reply(201, {"href": f"{server.base_url}?path={dst}"})
+
+            # --- /v1/disk ---
+            def _get_disk(self, query, route):
+                return self._reply(200, {"revision": server.revision})
+
+            # --- /v1/disk/operations ---
+            def _get_operation(self, query, route):
+                op = route.rsplit("/", 1)[-1]
+                if op not in server._operations:
+                    return self._reply(404, {"error": "NotFound"})
+                return self._reply(200, {"status": server._operations[op]})
+
+        return Handler
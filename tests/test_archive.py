@@ -0,0 +1,98 @@
+"""
+Сквозные тесты архивного режима (archive.py) против MockDiskServer:
+- упаковка мелких файлов в пачки и сжатие крупных на лету
+- число запросов и объём загрузки по сравнению с пофайловой загрузкой
+- листинг и восстановление по облачному индексу
+- обновление индекса, переупаковка и удаление ненужных объектов
+"""
+
+import os
+
+import pytest
+
+import archive
+from archive import ArchiveSet
+from disc_API import Yandex_disc
+from state import SyncState
+from sync import sync_cycle, sync_paths
+from tests.mock_server import MockDiskServer
+
+
+@pytest.fixture
+def server():
+    with MockDiskServer() as srv:
+        srv.add_file("backup/.keep", b"")
+        yield srv
+
+
+def _source_tree(root, count=200):
+    for i in range(count):
+        folder = root / "src" / f"pkg{i % 10}"
+        folder.mkdir(parents=True, exist_ok=True)
+        (folder / f"mod{i}.py").write_text(f"def function_{i}(value):\n    return value * {i}\n" * 40)
+    (root / "src" / "data.csv").write_text("id,name,value\n" + "".join(f"{i},item{i},{i * 3}\n" for i in range(5000)))
+    (root / "notes.txt").write_text("not archived")
+    (root / ".keep").write_bytes(b"")
+
+
+def _tree_bytes(folder):
+    return {os.path.relpath(os.path.join(d, f), folder): open(os.path.join(d, f), "rb").read()
+            for d, _, names in os.walk(folder) for f in names}
+
+
+def test_archive_cuts_requests_and_bytes(tmp_path, server, monkeypatch):
+    monkeypatch.setattr(archive, "LARGE_FILE", 64 * 1024)
+    root = tmp_path / "root"
+    _source_tree(root)
+    raw = sum(len(data) for data in _tree_bytes(root / "src").values())
+    state = SyncState(str(tmp_path / "state.db"))
+    client = Yandex_disc("backup", "token", base_url=server.base_url, backoff=0.001, upload_store=state)
+
+    results = sync_cycle(client, str(root), state=state, archives=ArchiveSet(["src"]))
+    assert all(r.ok for r in results)
+    uploads = server.calls["PUT /upload"]
+    # Файл вне архива, одна пачка, один сжатый крупный файл и индекс
+    assert uploads == 4
+    assert server.bytes_uploaded * 10 < raw
+    assert "disk:/backup/src" not in server.files("backup")
+
+    assert set(archive.list_files(client, "src")) == {p.replace(os.sep, "/") for p in
+                                                      (os.path.join("src", p) for p in _tree_bytes(root / "src"))}
+    restored = tmp_path / "restored"
+    assert archive.restore(client, "src", str(restored))
+    assert _tree_bytes(restored / "src") == _tree_bytes(root / "src")
+    assert os.stat(restored / "src" / "data.csv").st_mtime_ns == os.stat(root / "src" / "data.csv").st_mtime_ns
+
+    # Без изменений облако не запрашивается
+    server.reset_counters()
+    assert sync_cycle(client, str(root), state=state, archives=ArchiveSet(["src"])) == []
+    assert server.total_calls() == 0
+
+
+def test_archive_updates_and_repacks(tmp_path, server, monkeypatch):
+    monkeypatch.setattr(archive, "LARGE_FILE", 64 * 1024)
+    root = tmp_path / "root"
+    _source_tree(root, count=20)
+    state = SyncState(str(tmp_path / "state.db"))
+    client = Yandex_disc("backup", "token", base_url=server.base_url, backoff=0.001, upload_store=state)
+    archives = ArchiveSet(["src"])
+    sync_cycle(client, str(root), state=state, archives=archives)
+    first = set(client.list_names(".fsarchive/src"))
+
+    (root / "src" / "pkg1" / "mod1.py").write_text("changed")
+    results = sync_paths(client, str(root), ["src/pkg1/mod1.py"], state, archives=archives)
+    assert [r.action for r in results] == ["archive"]
+    assert set(client.list_names(".fsarchive/src")) > first
+
+    # Большая часть первой пачки удалена: остаток переупаковывается, пачка удаляется
+    for i in range(2, 20):
+        os.remove(root / "src" / f"pkg{i % 10}" / f"mod{i}.py")
+    results = sync_cycle(client, str(root), state=state, force=True, archives=archives)
+    assert all(r.ok for r in results)
+    names = set(client.list_names(".fsarchive/src"))
+    assert not {name for name in first if name.startswith("bundle-")} & names
+
+    restored = tmp_path / "restored"
+    assert archive.restore(client, "src", str(restored))
+    assert _tree_bytes(restored / "src") == _tree_bytes(root / "src")
+    assert (restored / "src" / "pkg1" / "mod1.py").read_text() == "changed"
@@ -0,0 +1,108 @@
+"""
+Набор тестов для режима дельты (delta.py и Yandex_disc с delta_threshold), проверяющий:
+- поиск изменённых участков по хэшам блоков (дописывание, правка в середине, уменьшение)
+- запись и применение патча
+- перезапись растущего файла патчем, объём которого зависит от изменения, а не от размера
+- восстановление файла из базы и патчей и полную перезагрузку при уменьшении файла
+"""
+
+import io
+import os
+
+import pytest
+
+import delta
+from disc_API import Yandex_disc
+from state import SyncState
+from sync import sync_cycle
+from tests.mock_server import MockDiskServer
+
+BLOCK = 1024
+
+
+def _write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def test_changed_ranges(tmp_path):
+    path = str(tmp_path / "f.bin")
+    data = os.urandom(10 * BLOCK + 100)
+    _write(path, data)
+    old = delta.block_hashes(path, BLOCK)
+    assert len(old) == 11
+
+    _write(path, data + b"x" * 300)
+    grown = delta.changed_ranges(path, len(data), old, len(data) + 300, delta.block_hashes(path, BLOCK), BLOCK)
+    assert grown == [(len(data), 300)]
+
+    edited = bytearray(data)
+    edited[3 * BLOCK + 5] ^= 0xFF
+    _write(path, bytes(edited))
+    assert delta.changed_ranges(path, len(data), old, len(data), delta.block_hashes(path, BLOCK), BLOCK) == \
+        [(3 * BLOCK, BLOCK)]
+
+    _write(path, data[:-1])
+    assert delta.changed_ranges(path, len(data), old, len(data) - 1, delta.block_hashes(path, BLOCK), BLOCK) is None
+
+
+def test_patch_roundtrip(tmp_path):
+    old = os.urandom(5000)
+    new = bytearray(old + os.urandom(700))
+    new[100:200] = os.urandom(100)
+    path = str(tmp_path / "new.bin")
+    _write(path, bytes(new))
+
+    patch = io.BytesIO()
+    delta.write_patch(path, [(100, 100), (5000, 700)], len(new), patch)
+    target = io.BytesIO(old)
+    patch.seek(0)
+    delta.apply_patch(patch, target)
+    assert target.getvalue() == bytes(new)
+
+    with pytest.raises(ValueError):
+        delta.apply_patch(io.BytesIO(b"garbage"), io.BytesIO())
+
+
+def test_growing_file_uploads_only_appended_bytes(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    log = root / "app.log"
+    data = os.urandom(20 * BLOCK)
+    _write(log, data)
+    state = SyncState(str(tmp_path / "state.db"))
+
+    with MockDiskServer() as server:
+        server.add_file("backup/.keep", b"")
+        client = Yandex_disc("backup", "token", base_url=server.base_url, backoff=0.001,
+                             upload_store=state, delta_threshold=1, delta_block_size=BLOCK)
+        (root / ".keep").write_bytes(b"")
+        assert all(r.ok for r in sync_cycle(client, str(root), state=state))
+        assert server.bytes_uploaded == len(data)
+
+        for step in range(3):
+            server.reset_counters()
+            server.bytes_uploaded = 0
+            data += os.urandom(50)
+            _write(log, data)
+            results = sync_cycle(client, str(root), state=state, force=True)
+            assert [(r.action, r.ok) for r in results] == [("reload", True)]
+            # Отправлены только новые байты и заголовок патча
+            assert server.bytes_uploaded < 200
+
+        # Патчи служебные: полная сверка их не удаляет и не скачивает
+        assert sync_cycle(client, str(root), state=state, force=True) == []
+        assert sorted(client.list_names("app.log.fsdelta")) == ["000001.patch", "000002.patch", "000003.patch"]
+        assert server.read_file("backup/app.log") != data
+
+        restored = tmp_path / "restored.log"
+        assert delta.restore(client, "app.log", str(restored))
+        assert restored.read_bytes() == data
+
+        # Уменьшенный файл загружается целиком, а патчи удаляются
+        data = data[:BLOCK]
+        _write(log, data)
+        sync_cycle(client, str(root), state=state, force=True)
+        assert server.read_file("backup/app.log") == data
+        assert client.list_names("app.log.fsdelta") == []
+        assert state.get_blocks("app.log")[3] == 0
@@ -5,103 +5,108 @@
 - reload
 - delete
 - get_info
+- iter_items (постраничный и рекурсивный листинг)
+- mkdir
 
 Перед запускам тестов, вставьте свой токен в config.ini
 """
 
 
+import hashlib
 import logging
+import threading
 import pytest
 import requests
-from unittest.mock import patch, Mock
+from unittest.mock import patch, MagicMock, Mock
 
-from disc_API import Yandex_disc
+from disc_API import Uploaded, Yandex_disc
 
 @pytest.fixture
 def client():
     return Yandex_disc('backup', 'token')
 
-@patch('disc_API.requests.get')
+@patch('disc_API.requests.Session.request')
 def test_get_upload_url_success(mock_get, client):
     mock_get.return_value = Mock(status_code=200, json=lambda: {'href': 'http://upload'})
     url = client._get_upload_url('file.txt', overwrite=True)
     assert url == 'http://upload'
 
-@patch('disc_API.requests.get')
+@patch('disc_API.requests.Session.request')
 def test_get_upload_url_http_error(mock_get, client):
-    resp = Mock()
+    resp = Mock(status_code=404)
     resp.raise_for_status.side_effect = requests.HTTPError("404 Not Found")
     mock_get.return_value = resp
     with pytest.raises(requests.HTTPError):
         client._get_upload_url('file.txt')
 
-@patch('disc_API.requests.put')
+@patch('disc_API.requests.Session.request')
 @patch.object(Yandex_disc, '_get_upload_url', return_value='http://upload')
 def test_load_success(mock_url, mock_put, client, tmp_path, caplog):
     file_path = tmp_path / "a.txt"
     file_path.write_bytes(b"data")
-    resp = Mock()
+    resp = Mock(status_code=200)
     resp.raise_for_status.return_value = None
     mock_put.return_value = resp
     caplog.set_level(logging.INFO)
-    client.load(str(file_path), 'a.txt')
+    # Mock не читает тело запроса, поэтому md5 отправленного содержимого неизвестен
+    assert client.load(str(file_path), 'a.txt') == Uploaded(None, None)
     assert any("успешно загружен" in rec.message for rec in caplog.records)
 
-@patch('disc_API.requests.put')
+@patch('disc_API.requests.Session.request')
 @patch.object(Yandex_disc, '_get_upload_url', return_value='http://upload')
 def test_load_failure(mock_url, mock_put, client, tmp_path, caplog):
     file_path = tmp_path / "b.txt"
     file_path.write_bytes(b"data")
-    resp = Mock()
+    resp = Mock(status_code=400)
     resp.raise_for_status.side_effect = requests.RequestException("fail")
     mock_put.return_value = resp
     caplog.set_level(logging.ERROR)
-    client.load(str(file_path), 'b.txt')
+    assert client.load(str(file_path), 'b.txt') is False
     assert any("Не удалось загрузить" in rec.message for rec in caplog.records)
 
-@patch('disc_API.requests.put')
+@patch('disc_API.requests.Session.request')
 @patch.object(Yandex_disc, '_get_upload_url', return_value='http://upload')
 def test_reload_success(mock_url, mock_put, client, tmp_path, caplog):
     file_path = tmp_path / "c.txt"
     file_path.write_bytes(b"data")
-    resp = Mock()
+    resp = Mock(status_code=200)
     resp.raise_for_status.return_value = None
     mock_put.return_value = resp
     caplog.set_level(logging.INFO)
     client.reload(str(file_path), 'c.txt')
     assert any("успешно перезаписан" in rec.message for rec in caplog.records)
 
-@patch('disc_API.requests.put')
+@patch('disc_API.requests.Session.request')
 @patch.object(Yandex_disc, '_get_upload_url', return_value='http://upload')
 def test_reload_failure(mock_url, mock_put, client, tmp_path, caplog):
     file_path = tmp_path / "d.txt"
     file_path.write_bytes(b"data")
-    resp = Mock()
+    resp = Mock(status_code=400)
     resp.raise_for_status.side_effect = requests.RequestException("fail")
     mock_put.return_value = resp
     caplog.set_level(logging.ERROR)
     client.reload(str(file_path), 'd.txt')
     assert any("Не удалось перезаписать" in rec.message for rec in caplog.records)
 
-@patch('disc_API.requests.delete')
+@patch('disc_API.requests.Session.request')
 def test_delete_success(mock_delete, client, caplog):
-    resp = Mock()
+    resp = Mock(status_code=200)
     resp.raise_for_status.return_value = None
     mock_delete.return_value = resp
     caplog.set_level(logging.INFO)
     client.delete('e.txt')
     assert any("успешно удален" in rec.message for rec in caplog.records)
 
-@patch('disc_API.requests.delete')
+@patch('disc_API.requests.Session.request')
 def test_delete_failure(mock_delete, client, caplog):
-    resp = Mock()
+    resp = Mock(status_code=403)
     resp.raise_for_status.side_effect = requests.RequestException("fail")
     mock_delete.return_value = resp
     caplog.set_level(logging.ERROR)
     client.delete('f.txt')
     assert any("Не удалось удалить" in rec.message for rec in caplog.records)
 
-@patch('disc_API.requests.get')
+@patch('disc_API.requests.Session.request')
 def test_get_info_success(mock_get, client, caplog):
     data = {'_embedded': {'items': [1, 2, 3]}}
     resp = Mock(status_code=200, json=lambda: data)
@@ -112,12 +117,201 @@ def test_get_info_success(mock_get, client, caplog):
     assert result == data
     assert any("найдено 3 элементов" in rec.message for rec in caplog.records)
 
-@patch('disc_API.requests.get')
+@patch('disc_API.requests.Session.request')
 def test_get_info_failure(mock_get, client, caplog):
-    resp = Mock()
+    resp = Mock(status_code=400)
     resp.raise_for_status.side_effect = requests.RequestException("fail")
     mock_get.return_value = resp
     caplog.set_level(logging.ERROR)
     result = client.get_info()
     assert result == {}
     assert any("Не удалось получить данные" in rec.message for rec in caplog.records)
+
+def _page(items, total):
+    resp = Mock(status_code=200)
+    resp.json.return_value = {'_embedded': {'items': items, 'total': total}}
+    resp.raise_for_status.return_value = None
+    return resp
+
+@patch('disc_API.requests.Session.request')
+def test_iter_items_paginates_and_recurses(mock_get):
+    client = Yandex_disc('backup', 'token', page_size=2)
+    mock_get.side_effect = [
+        _page([{'path': 'disk:/backup/a.txt', 'type': 'file'},
+               {'path': 'disk:/backup/sub', 'type': 'dir'}], 3),
+        _page([{'path': 'disk:/backup/b.txt', 'type': 'file'}], 3),
+        _page([{'path': 'disk:/backup/sub/c.txt', 'type': 'file'}], 1),
+    ]
+    paths = [item['path'] for item in client.iter_items()]
+    assert paths == ['disk:/backup/a.txt', 'disk:/backup/sub',
+                     'disk:/backup/b.txt', 'disk:/backup/sub/c.txt']
+    offsets = [call.kwargs['params']['offset'] for call in mock_get.call_args_list]
+    assert offsets == [0, 2, 0]
+    assert mock_get.call_args_list[2].kwargs['params']['path'] == 'disk:/backup/sub'
+    assert '_embedded.items.md5' in mock_get.call_args_list[0].kwargs['params']['fields']
+
+@patch('disc_API.requests.Session.request')
+def test_iter_items_raises_on_error(mock_get, client):
+    resp = Mock(status_code=401)
+    resp.raise_for_status.side_effect = requests.HTTPError("401")
+    mock_get.return_value = resp
+    with pytest.raises(requests.HTTPError):
+        list(client.iter_items())
+
+@patch('disc_API.requests.Session.request')
+def test_iter_items_flat_filters_by_folder(mock_get):
+    client = Yandex_disc('backup', 'token', page_size=2)
+    first = Mock(status_code=200)
+    first.json.return_value = {'items': [{'path': 'disk:/backup/a.txt'},
+                                         {'path': 'disk:/other/x.txt'}]}
+    second = Mock(status_code=200)
+    second.json.return_value = {'items': [{'path': 'disk:/backup/d/b.txt'}]}
+    mock_get.side_effect = [first, second]
+    paths = [item['path'] for item in client.iter_items(flat=True)]
+    assert paths == ['disk:/backup/a.txt', 'disk:/backup/d/b.txt']
+    assert mock_get.call_args_list[0].args[1].endswith('/resources/files')
+
+@patch('disc_API.requests.Session.request')
+def test_mkdir_ignores_existing(mock_put, client):
+    mock_put.return_value = Mock(status_code=409)
+    client.mkdir('dir')
+    mock_put.return_value.raise_for_status.assert_not_called()
+
+def _response(status, headers=None):
+    resp = Mock(status_code=status, headers=headers or {})
+    if status >= 400:
+        resp.raise_for_status.side_effect = requests.HTTPError(str(status))
+    return resp
+
+@patch('disc_API.time.sleep')
+@patch('disc_API.requests.Session.request')
+def test_request_retries_transient_errors(mock_request, mock_sleep, client):
+    mock_request.side_effect = [
+        _response(503),
+        requests.ConnectionError("reset"),
+        _response(429, {'Retry-After': '7'}),
+        _response(201),
+    ]
+    client.mkdir('dir')
+    assert mock_request.call_count == 4
+    assert mock_sleep.call_count == 3
+    assert mock_sleep.call_args_list[2].args[0] >= 7
+    stats = client.get_stats()['mkdir']
+    assert stats['calls'] == 4
+    assert stats['retries'] == 3
+    assert stats['errors'] == 3
+
+@patch('disc_API.time.sleep')
+@patch('disc_API.requests.Session.request')
+def test_request_gives_up_after_max_retries(mock_request, mock_sleep, tmp_path):
+    client = Yandex_disc('backup', 'token', max_retries=2)
+    mock_request.return_value = _response(503)
+    file_path = tmp_path / "g.txt"
+    file_path.write_bytes(b"data")
+    with patch.object(Yandex_disc, '_get_upload_url', return_value='http://upload'):
+        assert client.load(str(file_path), 'g.txt') is False
+    assert mock_request.call_count == 3
+
+@patch('disc_API.requests.Session.request')
+def test_delete_missing_is_success(mock_request, client):
+    mock_request.return_value = _response(404)
+    assert client.delete('gone.txt') is True
+
+@patch('disc_API.requests.Session.request')
+@patch.object(Yandex_disc, '_get_upload_url', return_value='http://upload')
+def test_load_streams_in_chunks(mock_url, mock_request, tmp_path):
+    progress = []
+    client = Yandex_disc('backup', 'token', chunk_size=4,
+                         progress=lambda name, sent, total, elapsed: progress.append((sent, total)))
+    file_path = tmp_path / "big.bin"
+    file_path.write_bytes(b"0123456789")
+    chunks = []
+
+    def consume(method, url, data=None, **kwargs):
+        assert len(data) == 10
+        while True:
+            chunk = data.read(8192)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return _response(201)
+
+    mock_request.side_effect = consume
+    assert client.load(str(file_path), 'big.bin') == Uploaded(hashlib.md5(b"0123456789").hexdigest(), None)
+    assert chunks == [b"0123", b"4567", b"89"]
+    assert progress == [(4, 10), (8, 10), (10, 10)]
+
+@patch('disc_API.time.sleep')
+@patch('disc_API.requests.Session.request')
+@patch.object(Yandex_disc, '_get_upload_url', return_value='http://upload')
+def test_load_retry_rewinds_body(mock_url, mock_request, mock_sleep, client, tmp_path):
+    file_path = tmp_path / "r.bin"
+    file_path.write_bytes(b"payload")
+    bodies = []
+
+    def consume(method, url, data=None, **kwargs):
+        bodies.append(data.read())
+        return _response(503 if len(bodies) == 1 else 201)
+
+    mock_request.side_effect = consume
+    assert client.reload(str(file_path), 'r.bin') == Uploaded(hashlib.md5(b"payload").hexdigest(), None)
+    assert bodies == [b"payload", b"payload"]
+
+@patch('disc_API.time.sleep')
+@patch('disc_API.requests.Session.request')
+def test_move_is_not_retried(mock_request, mock_sleep, client):
+    mock_request.return_value = _response(503)
+    assert client.move('a.txt', 'b/a.txt') is False
+    assert mock_request.call_count == 1
+    mock_request.return_value = _response(201)
+    assert client.move('a.txt', 'b/a.txt') is True
+    params = mock_request.call_args.kwargs['params']
+    assert params['from'] == 'backup/a.txt' and params['path'] == 'backup/b/a.txt'
+
+@patch('disc_API.time.sleep')
+@patch('disc_API.requests.Session.request')
+def test_delete_waits_for_async_operation(mock_request, mock_sleep):
+    client = Yandex_disc('backup', 'token', permanently=True)
+    accepted = _response(202)
+    accepted.json.return_value = {'href': 'http://op/1'}
+    pending = _response(200)
+    pending.json.return_value = {'status': 'in-progress'}
+    done = _response(200)
+    done.json.return_value = {'status': 'success'}
+    mock_request.side_effect = [accepted, pending, done]
+    assert client.delete('dir') is True
+    assert mock_request.call_args_list[0].kwargs['params']['permanently'] == 'true'
+    assert mock_request.call_args_list[2].args[:2] == ('GET', 'http://op/1')
+
+@patch('disc_API.time.sleep')
+@patch('disc_API.requests.Session.request')
+def test_delete_async_failure(mock_request, mock_sleep, client):
+    accepted = _response(202)
+    accepted.json.return_value = {'href': 'http://op/2'}
+    failed = _response(200)
+    failed.json.return_value = {'status': 'failed'}
+    mock_request.side_effect = [accepted, failed]
+    assert client.delete('dir') is False
+
+@patch('disc_API.requests.Session.request')
+def test_download_requests_all_ranges_at_once(mock_request, tmp_path):
+    client = Yandex_disc('backup', 'token', download_connections=4, range_threshold=16)
+    data = bytes(range(64))
+    # Ответы на диапазоны приходят, только когда запрошены все четыре
+    barrier = threading.Barrier(4, timeout=5)
+
+    def respond(method, url, headers=None, **kwargs):
+        if url.endswith('/download'):
+            resp = _response(200)
+            resp.json.return_value = {'href': 'http://dl'}
+            return resp
+        start, end = map(int, headers['Range'].removeprefix('bytes=').split('-'))
+        barrier.wait()
+        resp = MagicMock(status_code=206, headers={})
+        resp.iter_content.return_value = [data[start:end + 1]]
+        return resp
+
+    mock_request.side_effect = respond
+    assert client.download('big.bin', str(tmp_path / 'big.bin'), size=len(data))
+    assert (tmp_path / 'big.bin').read_bytes() == data
+    assert mock_request.call_count == 5
@@ -0,0 +1,234 @@
+"""
+Сквозные тесты: Yandex_disc и sync_cycle против локального MockDiskServer.
+Проверяются полная синхронизация вложенного дерева с постраничным листингом,
+повторы при ошибках 503, перемещение папки и удаление папки одним запросом,
+двустороннее скачивание (в том числе диапазонами и правки в облаке загруженных файлов),
+продолжение прерванной загрузки частями и проверка их поддержки без риска для файлов.
+"""
+
+import hashlib
+import os
+
+import pytest
+import requests
+
+from disc_API import Yandex_disc
+from state import SyncState
+from sync import sync_cycle, sync_paths
+from tests.mock_server import MockDiskServer
+
+
+@pytest.fixture
+def server():
+    with MockDiskServer(max_page=3) as srv:
+        srv.add_file("backup/.keep", b"")
+        yield srv
+
+
+def _client(server, **kwargs):
+    return Yandex_disc("backup", "token", base_url=server.base_url, page_size=3,
+                       backoff=0.001, poll_interval=0.001, **kwargs)
+
+
+def _tree(root):
+    (root / "docs" / "deep" / "er").mkdir(parents=True)
+    for i in range(5):
+        (root / f"top{i}.txt").write_text(f"top {i}")
+        (root / "docs" / f"d{i}.txt").write_text(f"doc {i}")
+    (root / "docs" / "deep" / "er" / "leaf.txt").write_text("leaf")
+    (root / ".keep").write_bytes(b"")
+
+
+def test_full_sync_then_idle(tmp_path, server):
+    root = tmp_path / "root"
+    _tree(root)
+    state = SyncState(str(tmp_path / "state.db"))
+    client = _client(server)
+
+    results = sync_cycle(client, str(root), state=state, max_workers=4)
+    assert all(r.ok for r in results)
+    assert len(server.files("backup")) == 12
+    assert server.read_file("backup/docs/deep/er/leaf.txt") == b"leaf"
+
+    server.reset_counters()
+    assert sync_cycle(client, str(root), state=state, force=True) == []
+    assert set(server.calls) == {"GET /v1/disk/resources"}
+
+
+def test_sync_survives_injected_errors(tmp_path, server):
+    root = tmp_path / "root"
+    _tree(root)
+    server.error_rate = 0.3
+    results = sync_cycle(_client(server, max_retries=20), str(root), max_workers=4)
+    assert all(r.ok for r in results)
+    assert len(server.files("backup")) == 12
+
+
+def test_move_and_delete_use_single_calls(tmp_path, server):
+    root = tmp_path / "root"
+    _tree(root)
+    state = SyncState(str(tmp_path / "state.db"))
+    client = _client(server)
+    sync_cycle(client, str(root), state=state)
+
+    (root / "docs").rename(root / "papers")
+    server.reset_counters()
+    sync_cycle(client, str(root), state=state)
+    assert server.calls["POST /v1/disk/resources/move"] == 1
+    assert server.calls["GET /v1/disk/resources/upload"] == 0
+    assert server.read_file("backup/papers/deep/er/leaf.txt") == b"leaf"
+
+    for path in sorted((root / "papers").rglob("*"), reverse=True):
+        path.rmdir() if path.is_dir() else path.unlink()
+    (root / "papers").rmdir()
+    server.reset_counters()
+    sync_cycle(client, str(root), state=state)
+    assert server.calls["DELETE /v1/disk/resources"] == 1
+    assert server.files("backup/papers") == []
+    assert len(state) == 6
+
+
+def test_two_way_downloads_remote_changes(tmp_path, server):
+    big = bytes(range(256)) * 4096
+    server.add_file("backup/media/big.bin", big)
+    server.add_file("backup/notes.txt", b"v1")
+    root = tmp_path / "root"
+    root.mkdir()
+    state = SyncState(str(tmp_path / "state.db"))
+    client = _client(server, range_threshold=64 * 1024, chunk_size=16 * 1024)
+
+    results = sync_cycle(client, str(root), state=state, two_way=True)
+    assert all(r.ok for r in results)
+    assert (root / "media" / "big.bin").read_bytes() == big
+    assert (root / "notes.txt").read_bytes() == b"v1"
+    assert server.calls["GET /download"] == client.download_connections + 2  # big.bin + notes + .keep
+    assert [p.name for p in (root / "media").iterdir()] == ["big.bin"]
+
+    server.add_file("backup/notes.txt", b"v2 from web")
+    server.reset_counters()
+    results = sync_cycle(client, str(root), state=state, two_way=True)
+    assert [(r.action, r.path) for r in results] == [("download", "notes.txt")]
+    assert (root / "notes.txt").read_bytes() == b"v2 from web"
+    assert server.bytes_uploaded == 0
+
+
+def test_two_way_detects_cloud_edit_of_uploaded_file(tmp_path, server):
+    root = tmp_path / "root"
+    root.mkdir()
+    (root / "report.txt").write_text("local v1")
+    state = SyncState(str(tmp_path / "state.db"))
+    client = _client(server, fetch_modified=True)
+
+    results = sync_cycle(client, str(root), state=state, two_way=True)
+    assert sorted((r.action, r.path) for r in results) == [("download", ".keep"), ("load", "report.txt")]
+    _, _, _, modified, md5 = state.get("report.txt")
+    assert md5 == hashlib.md5(b"local v1").hexdigest()
+    # md5 загрузки известен: отдельный запрос за modified не нужен
+    assert modified is None and "modified" not in client.get_stats()
+
+    server.add_file("backup/report.txt", b"edited in web")
+    results = sync_cycle(client, str(root), state=state, two_way=True)
+    assert [(r.action, r.path) for r in results] == [("download", "report.txt")]
+    assert (root / "report.txt").read_bytes() == b"edited in web"
+
+
+def test_sync_paths_records_uploaded_md5(tmp_path, server):
+    root = tmp_path / "root"
+    root.mkdir()
+    (root / "a.txt").write_text("content")
+    state = SyncState(str(tmp_path / "state.db"))
+    client = _client(server)
+    assert [(r.action, r.ok) for r in sync_paths(client, str(root), ["a.txt"], state)] == [("load", True)]
+    assert state.get("a.txt")[4] == hashlib.md5(b"content").hexdigest()
+
+    # touch без изменения содержимого не приводит к повторной загрузке
+    os.utime(root / "a.txt", (1_000_000, 1_000_000))
+    assert sync_paths(client, str(root), ["a.txt"], state) == []
+    assert server.calls["PUT /upload"] == 1
+
+
+def test_download_falls_back_without_ranges(tmp_path, server):
+    data = b"x" * 200_000
+    server.add_file("backup/f.bin", data)
+    server.support_ranges = False
+    client = _client(server, range_threshold=1024)
+    assert client.download("f.bin", str(tmp_path / "f.bin"), size=len(data), mtime=1_000_000.0)
+    assert (tmp_path / "f.bin").read_bytes() == data
+    assert (tmp_path / "f.bin").stat().st_mtime == 1_000_000.0
+    assert not client.download("missing.bin", str(tmp_path / "missing.bin"))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["f.bin"]
+
+
+def test_chunked_upload_resumes_after_interruption(tmp_path, server):
+    data = os.urandom(300 * 1024)
+    (tmp_path / "video.bin").write_bytes(data)
+    state = SyncState(str(tmp_path / "state.db"))
+    options = dict(resumable_threshold=100 * 1024, upload_part_size=64 * 1024, upload_store=state,
+                   max_retries=0)
+    client = _client(server, **options)
+    original, puts = client._request, []
+
+    def flaky(method, url, endpoint, **kwargs):
+        if endpoint == "upload":
+            puts.append(kwargs["headers"]["Content-Range"])
+            if len(puts) == 3:
+                raise requests.ConnectionError("обрыв")
+        return original(method, url, endpoint, **kwargs)
+
+    client._request = flaky
+    with pytest.raises(requests.ConnectionError):
+        client.load(str(tmp_path / "video.bin"), "video.bin")
+    assert state.get_upload("video.bin")[3] == 128 * 1024
+    assert server.bytes_uploaded == 128 * 1024 + 1  # и байт проверки поддержки частей
+
+    # «Перезапуск»: новый клиент продолжает с подтверждённого смещения
+    server.reset_counters()
+    resumed = _client(server, fetch_modified=True, **options)
+    uploaded = resumed.load(str(tmp_path / "video.bin"), "video.bin")
+    # md5 продолженной загрузки неизвестен, поэтому запрашивается modified
+    assert uploaded == (None, server.resources["disk:/backup/video.bin"]["modified"])
+    assert server.bytes_uploaded == len(data) - 128 * 1024
+    assert "GET /v1/disk/resources/upload" not in server.calls
+    assert server.read_file("backup/video.bin") == data
+    assert state.get_upload("video.bin") is None
+
+
+def test_chunked_upload_falls_back_to_single_put(tmp_path, server):
+    data = os.urandom(200 * 1024)
+    (tmp_path / "big.bin").write_bytes(data)
+    server.support_ranges = False
+    client = _client(server, resumable_threshold=100 * 1024, upload_part_size=64 * 1024)
+    assert client.load(str(tmp_path / "big.bin"), "big.bin")
+    assert server.read_file("backup/big.bin") == data
+    assert server.resources["disk:/backup/big.bin"]["md5"] == hashlib.md5(data).hexdigest()
+    assert not client._ranged_uploads
+
+
+def test_ranged_upload_probe_keeps_existing_file(tmp_path, server):
+    old = b"old version" * 1000
+    server.add_file("backup/big.bin", old)
+    data = os.urandom(200 * 1024)
+    (tmp_path / "big.bin").write_bytes(data)
+    server.support_ranges = False
+    state = SyncState(str(tmp_path / "state.db"))
+    options = dict(resumable_threshold=100 * 1024, upload_part_size=64 * 1024, upload_store=state)
+    client = _client(server, **options)
+    original, seen = client._put_file, []
+
+    def put_file(href, local_path, remote_path):
+        # Проверка прошла, а облачная копия ещё не тронута
+        seen.append(server.read_file("backup/big.bin"))
+        return original(href, local_path, remote_path)
+
+    client._put_file = put_file
+    assert client.reload(str(tmp_path / "big.bin"), "big.bin")
+    assert seen == [old]
+    assert server.read_file("backup/big.bin") == data
+    assert server.files("backup") == ["disk:/backup/.keep", "disk:/backup/big.bin"]
+    assert state.get_meta("ranged_uploads") == "0"
+
+    # Результат проверки сохранён: новый клиент сразу загружает одним запросом
+    server.reset_counters()
+    assert _client(server, **options).reload(str(tmp_path / "big.bin"), "big.bin")
+    assert server.calls["PUT /upload"] == 1
+    assert "PUT /v1/disk/resources" not in server.calls
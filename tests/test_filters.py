@@ -0,0 +1,79 @@
+"""
+Набор юнит-тестов для модуля filters.py, проверяющий:
+- семантику шаблонов в стиле .gitignore (глубина, привязка к корню, **, !, каталоги)
+- отсечение исключённых каталогов при обходе
+- одинаковое применение правил к локальным файлам и облачному листингу
+"""
+
+import os
+import time
+
+import scanner
+from filters import PathFilter, parse_patterns
+from scanner import scan_tree
+from sync import sync_cycle
+from tests.test_sync import DummyClient
+
+
+def test_gitignore_semantics():
+    f = PathFilter(["node_modules/", "*.swp", "/build", "docs/**/*.pdf", "*.log", "!keep.log"])
+    assert f.excludes_dir("node_modules") and f.excludes_dir("a/b/node_modules")
+    assert not f.excludes_path("node_modules")  # шаблон только для каталогов
+    assert f.excludes_path("a/.x.swp")
+    assert f.excludes_dir("build") and not f.excludes_dir("src/build")
+    assert f.excludes_path("docs/a/b/c.pdf") and f.excludes_path("docs/c.pdf")
+    assert not f.excludes_path("other/docs/c.pdf")
+    assert f.excludes_path("x/debug.log") and not f.excludes_path("x/keep.log")
+    assert f.excludes_remote("a/node_modules/pkg/index.js")
+    assert not f.excludes_remote("src/index.js")
+
+
+def test_directory_excluded_before_negation_stays_excluded():
+    f = PathFilter(["build/", "!build/keep.txt"])
+    assert f.excludes_remote("build/keep.txt")
+
+
+def test_size_and_age_rules():
+    f = PathFilter(max_size=100, min_age=60)
+    now = time.time()
+    assert f.skips(101, now - 3600)
+    assert f.skips(10, now - 1)
+    assert not f.skips(10, now - 3600)
+    assert f.excludes_remote("big.bin", size=101) and not f.excludes_remote("big.bin", size=100)
+
+
+def test_parse_patterns():
+    assert parse_patterns("*.tmp, .git/\nnode_modules/\n\n") == ["*.tmp", ".git/", "node_modules/"]
+
+
+def test_scan_prunes_excluded_directories(tmp_path, monkeypatch):
+    (tmp_path / "node_modules" / "pkg").mkdir(parents=True)
+    (tmp_path / "node_modules" / "pkg" / "index.js").write_text("x")
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "main.py").write_text("x")
+    (tmp_path / "src" / "main.py.swp").write_text("x")
+    scanned = []
+    original = scanner.os.scandir
+
+    def scandir(path):
+        scanned.append(os.path.relpath(path, tmp_path))
+        return original(path)
+
+    monkeypatch.setattr(scanner.os, "scandir", scandir)
+    result = scan_tree(str(tmp_path), path_filter=PathFilter(["node_modules/", "*.swp"]))
+    assert set(result) == {os.path.join("src", "main.py")}
+    assert not any(path.startswith("node_modules") for path in scanned)
+
+
+def test_sync_cycle_applies_rules_to_remote_listing(tmp_path):
+    (tmp_path / "fresh.txt").write_text("still writing")
+    (tmp_path / "a.txt").write_text("a")
+    os.utime(tmp_path / "a.txt", (time.time() - 3600,) * 2)
+    client = DummyClient(items=[
+        {'path': 'disk:/backup/node_modules/x.js', 'modified': '2025-07-01T00:00:00+00:00'},
+        {'path': 'disk:/backup/fresh.txt', 'modified': '2025-07-01T00:00:00+00:00'},
+    ])
+    sync_cycle(client, str(tmp_path), path_filter=PathFilter(["node_modules/"], min_age=60))
+    # Исключённое в облаке не удаляется, отложенный по возрасту файл — тоже
+    assert client.deleted == []
+    assert [remote for _, remote in client.loaded] == ["a.txt"]
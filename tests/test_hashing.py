@@ -0,0 +1,45 @@
+"""
+Набор юнит-тестов для модуля hashing.py, проверяющий:
+- подсчёт md5 файла
+- использование кэша SyncState при неизменном файле
+- хэширование крупных файлов в пуле потоков
+"""
+
+import hashlib
+
+import hashing
+from hashing import file_md5, hash_files
+from state import SyncState
+from sync import get_local_files
+
+
+def test_file_md5(tmp_path):
+    f = tmp_path / "a.bin"
+    f.write_bytes(b"x" * 3_000_000)
+    assert file_md5(str(f)) == hashlib.md5(b"x" * 3_000_000).hexdigest()
+
+
+def test_hash_files_uses_cache(tmp_path, monkeypatch):
+    root = tmp_path / "root"
+    root.mkdir()
+    (root / "a.txt").write_text("a")
+    state = SyncState(str(tmp_path / "state.db"))
+    files = get_local_files(str(root), str(root))
+    first = hash_files(str(root), files, cache=state)
+    assert first == {"a.txt": hashlib.md5(b"a").hexdigest()}
+
+    def fail(path):
+        raise AssertionError("файл не должен перечитываться")
+
+    monkeypatch.setattr(hashing, "file_md5", fail)
+    assert hash_files(str(root), files, cache=state) == first
+
+
+def test_hash_files_process_pool(tmp_path, monkeypatch):
+    monkeypatch.setattr(hashing, "POOL_THRESHOLD", 10)
+    (tmp_path / "big.bin").write_bytes(b"b" * 100)
+    (tmp_path / "small.bin").write_bytes(b"s")
+    files = get_local_files(str(tmp_path), str(tmp_path))
+    result = hash_files(str(tmp_path), files, max_workers=1)
+    assert result == {"big.bin": hashlib.md5(b"b" * 100).hexdigest(),
+                      "small.bin": hashlib.md5(b"s").hexdigest()}
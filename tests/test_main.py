@@ -0,0 +1,196 @@
+"""
+Набор юнит-тестов для main.py, проверяющий чтение config.ini:
+- основное задание из [SETTINGS]
+- дополнительные задания [job:*] с наследованием параметров из [SETTINGS]
+- ошибки конфигурации
+- пробный запуск --dry-run
+- выбор тёплого старта по снимку состояния и журналу операций
+"""
+
+import functools
+import json
+import sqlite3
+
+import pytest
+
+import main
+from disc_API import Yandex_disc
+from main import _load_and_validate_config, _warm_start
+from state import SyncState
+from sync import sync_cycle
+from tests.mock_server import MockDiskServer
+from tests.test_sync import DummyClient
+
+
+def _write_config(tmp_path, text):
+    path = tmp_path / "config.ini"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_jobs_inherit_settings(tmp_path):
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "photos").mkdir()
+    path = _write_config(tmp_path, f"""
+[SETTINGS]
+local_folder = {tmp_path / "docs"}
+cloud_folder = docs
+token = T1
+sync_period = 60
+log_path = {tmp_path / "logs" / "sync.log"}
+max_workers = 8
+two_way = true
+
+[job:photos]
+local_folder = {tmp_path / "photos"}
+cloud_folder = photos
+token = T2
+sync_period = 300
+""")
+    log_path, options, jobs = _load_and_validate_config(path)
+    assert log_path.endswith("sync.log")
+    assert options["max_workers"] == 8
+    assert [(j.name, j.cloud_folder, j.token, j.sync_period) for j in jobs] == [
+        ("main", "docs", "T1", 60), ("photos", "photos", "T2", 300)]
+    assert jobs[1].options["two_way"] is True
+
+
+def test_only_job_sections(tmp_path):
+    (tmp_path / "a").mkdir()
+    path = _write_config(tmp_path, f"""
+[SETTINGS]
+token = T
+sync_period = 30
+log_path = {tmp_path / "sync.log"}
+
+[job:a]
+local_folder = {tmp_path / "a"}
+cloud_folder = a
+""")
+    _, _, jobs = _load_and_validate_config(path)
+    assert [(j.name, j.token, j.sync_period) for j in jobs] == [("a", "T", 30)]
+
+
+def test_duplicate_local_folder_is_rejected(tmp_path, capsys):
+    path = _write_config(tmp_path, f"""
+[SETTINGS]
+local_folder = {tmp_path}
+cloud_folder = a
+token = T
+sync_period = 30
+log_path = {tmp_path / "sync.log"}
+
+[job:b]
+local_folder = {tmp_path}
+cloud_folder = b
+""")
+    with pytest.raises(SystemExit):
+        _load_and_validate_config(path)
+    assert "не должны повторяться" in capsys.readouterr().out
+
+
+def test_negative_float_option_is_rejected(tmp_path, capsys):
+    path = _write_config(tmp_path, f"""
+[SETTINGS]
+local_folder = {tmp_path}
+cloud_folder = a
+token = T
+sync_period = 30
+log_path = {tmp_path / "sync.log"}
+min_file_age = -0.5
+""")
+    with pytest.raises(SystemExit):
+        _load_and_validate_config(path)
+    assert "min_file_age должен быть числом >= 0" in capsys.readouterr().out
+
+
+def test_dry_run_prints_plan_without_changes(tmp_path, monkeypatch, capsys):
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "new.txt").write_text("hello")
+    path = _write_config(tmp_path, f"""
+[SETTINGS]
+local_folder = {tmp_path / "docs"}
+cloud_folder = backup
+token = T
+sync_period = 60
+log_path = {tmp_path / "logs" / "sync.log"}
+""")
+    with MockDiskServer() as server:
+        server.add_file("backup/old.txt", b"old")
+        monkeypatch.setattr(main, "Yandex_disc", functools.partial(Yandex_disc, base_url=server.base_url,
+                                                                   backoff=0.001))
+        with pytest.raises(SystemExit) as exc:
+            main.main(["--config", path, "--dry-run", "--format", "json"])
+        assert exc.value.code == 0
+        assert server.calls["PUT /upload"] == 0
+        assert set(server.files("backup")) == {"disk:/backup/old.txt"}
+
+    plan = json.loads(capsys.readouterr().out)["main"]
+    assert sorted((op["action"], op["path"]) for op in plan["operations"]) == [
+        ("delete", "old.txt"), ("load", "new.txt")]
+    assert plan["upload_bytes"] == 5
+
+
+def test_dry_run_does_not_write_state(tmp_path, monkeypatch, capsys):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "a.txt").write_text("a")
+    path = _write_config(tmp_path, f"""
+[SETTINGS]
+local_folder = {docs}
+cloud_folder = backup
+token = T
+sync_period = 60
+log_path = {tmp_path / "logs" / "sync.log"}
+""")
+    db = tmp_path / "logs" / "state.db"
+    with MockDiskServer() as server:
+        server.add_file("backup/.keep", b"")
+        client = Yandex_disc("backup", "token", base_url=server.base_url, backoff=0.001)
+        state = SyncState(str(db))
+        sync_cycle(client, str(docs), state=state, two_way=True)
+        state.close()
+        dump = list(sqlite3.connect(db).iterdump())
+
+        # Изменение mtime без изменения содержимого: при планировании считается md5
+        (docs / "a.txt").touch()
+        server.add_file("backup/b.txt", b"b")
+        monkeypatch.setattr(main, "Yandex_disc", functools.partial(Yandex_disc, base_url=server.base_url,
+                                                                   backoff=0.001))
+        with pytest.raises(SystemExit) as exc:
+            main.main(["--config", path, "--dry-run"])
+        assert exc.value.code == 0
+
+    assert "b.txt" in capsys.readouterr().out
+    assert list(sqlite3.connect(db).iterdump()) == dump
+
+
+def test_warm_start_requires_clean_journal(tmp_path):
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "a.txt").write_text("a")
+    path = _write_config(tmp_path, f"""
+[SETTINGS]
+local_folder = {tmp_path / "docs"}
+cloud_folder = backup
+token = T
+sync_period = 60
+log_path = {tmp_path / "sync.log"}
+""")
+    job = _load_and_validate_config(path)[2][0]
+    state = SyncState(str(tmp_path / "state.db"))
+    assert not _warm_start(job, state)
+
+    journaled = []
+    client = DummyClient()
+    client.load = lambda local, remote: journaled.extend(state.pending_operations())
+    sync_cycle(client, job.local_folder, state=state)
+    assert [(action, p) for action, p, _ in journaled] == [("load", "a.txt")]
+    assert state.pending_operations() == []
+    # Снимок другой облачной папки не годится для тёплого старта
+    assert not _warm_start(job, state)
+    state.set_meta("cloud_folder", "backup")
+    assert _warm_start(job, state)
+
+    # Прерванный цикл оставляет журнал — следующий запуск делает полную сверку
+    state.begin_operation("reload", "a.txt")
+    assert not _warm_start(job, state)
@@ -0,0 +1,124 @@
+"""
+Набор юнит-тестов для модуля metrics.py, проверяющий:
+- счётчики, gauge и гистограммы с метками, в том числе через bind
+- формат Prometheus и JSON-снимок
+- HTTP-эндпоинт /metrics
+- метрики, которые записывают sync_cycle и клиент Yandex_disc
+"""
+
+import json
+
+import requests
+
+from disc_API import Yandex_disc
+from metrics import NULL_METRICS, Metrics, MetricsServer
+from state import SyncState
+from sync import sync_cycle
+from tests.mock_server import MockDiskServer
+from tests.test_sync import DummyClient
+
+
+def _value(snapshot, section, name, **labels):
+    for series in snapshot[section].get(name, []):
+        if series["labels"] == labels:
+            return series
+    return None
+
+
+def test_histogram_and_bound_labels():
+    metrics = Metrics()
+    job = metrics.bind(job="photos")
+    job.observe("api_request_seconds", 0.02, endpoint="list")
+    job.observe("api_request_seconds", 3.0, endpoint="list")
+    job.inc("api_retries_total", endpoint="list")
+    job.inc("api_retries_total", 2, endpoint="list")
+    metrics.set("sync_files", 7, side="local")
+
+    snap = metrics.snapshot()
+    hist = _value(snap, "histograms", "api_request_seconds", job="photos", endpoint="list")
+    assert hist["count"] == 2 and abs(hist["sum"] - 3.02) < 1e-9
+    assert hist["buckets"]["0.01"] == 0 and hist["buckets"]["0.025"] == 1 and hist["buckets"]["5.0"] == 2
+    assert _value(snap, "counters", "api_retries_total", job="photos", endpoint="list")["value"] == 3
+
+    text = metrics.render_prometheus()
+    assert "# TYPE api_request_seconds histogram" in text
+    assert 'api_request_seconds_bucket{endpoint="list",job="photos",le="+Inf"} 2' in text
+    assert 'api_retries_total{endpoint="list",job="photos"} 3' in text
+    assert 'sync_files{side="local"} 7' in text
+
+
+def test_phases_and_null_metrics():
+    metrics = Metrics()
+    phases = metrics.phases("sync_phase_seconds")
+    phases.enter("scan")
+    phases.enter("list")
+    phases.finish()
+    phases.finish()
+    snap = metrics.snapshot()
+    assert {tuple(s["labels"].items()) for s in snap["histograms"]["sync_phase_seconds"]} == \
+        {(("phase", "scan"),), (("phase", "list"),)}
+
+    with NULL_METRICS.span("client_seconds", op="load"):
+        NULL_METRICS.inc("x")
+    NULL_METRICS.phases("sync_phase_seconds").enter("scan")
+
+
+def test_write_json_and_server(tmp_path):
+    metrics = Metrics()
+    metrics.inc("sync_cycles_total", job="main")
+    path = tmp_path / "out" / "metrics.json"
+    metrics.write_json(str(path))
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert data["counters"]["sync_cycles_total"] == [{"labels": {"job": "main"}, "value": 1}]
+
+    server = MetricsServer(metrics, 0).start()
+    try:
+        response = requests.get(f"http://127.0.0.1:{server.port}/metrics", timeout=5)
+        assert response.status_code == 200
+        assert 'sync_cycles_total{job="main"} 1' in response.text
+        assert requests.get(f"http://127.0.0.1:{server.port}/other", timeout=5).status_code == 404
+    finally:
+        server.stop()
+
+
+def test_sync_cycle_records_phases_and_operations(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    (root / "a.txt").write_text("hello")
+    (root / "b.txt").write_text("hi")
+    client = DummyClient(items=[{'path': 'disk:/backup/gone.txt', 'modified': '2025-07-01T00:00:00+00:00'}])
+    metrics = Metrics()
+    state = SyncState(str(tmp_path / "state.db"))
+    sync_cycle(client, str(root), state=state, metrics=metrics)
+
+    snap = metrics.snapshot()
+    phases = {s["labels"]["phase"] for s in snap["histograms"]["sync_phase_seconds"]}
+    assert {"scan", "list", "diff", "transfer", "state"} <= phases
+    assert _value(snap, "counters", "sync_operations_total", action="load", result="ok")["value"] == 2
+    assert _value(snap, "counters", "sync_operations_total", action="delete", result="ok")["value"] == 1
+    assert _value(snap, "counters", "sync_bytes_total", direction="up")["value"] == 7
+    assert _value(snap, "gauges", "sync_diff_files", kind="only_local")["value"] == 2
+    assert _value(snap, "gauges", "sync_files", side="cloud")["value"] == 1
+
+    # Цикл без изменений тоже учитывается
+    sync_cycle(client, str(root), state=state, metrics=metrics)
+    assert _value(metrics.snapshot(), "counters", "sync_cycles_total")["value"] == 2
+
+
+def test_client_records_api_latency_and_retries(tmp_path):
+    (tmp_path / "f.txt").write_text("data")
+    metrics = Metrics()
+    with MockDiskServer(error_rate=0.5, seed=1) as server:
+        server.add_file("backup/.keep", b"")
+        client = Yandex_disc("backup", "token", base_url=server.base_url, backoff=0.001,
+                             max_retries=20, metrics=metrics.bind(job="main"))
+        list(client.iter_items())
+        client.load(str(tmp_path / "f.txt"), "f.txt")
+
+    snap = metrics.snapshot()
+    stats = client.get_stats()
+    retries = {s["labels"]["endpoint"]: s["value"] for s in snap["counters"]["api_retries_total"]}
+    assert retries and retries == {name: stat["retries"] for name, stat in stats.items() if stat["retries"]}
+    latency = {s["labels"]["endpoint"]: s["count"] for s in snap["histograms"]["api_request_seconds"]}
+    assert latency == {name: stat["calls"] for name, stat in stats.items()}
+    assert _value(snap, "histograms", "client_seconds", job="main", op="load")["count"] == 1
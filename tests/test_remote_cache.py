@@ -0,0 +1,143 @@
+"""
+Сквозные тесты кэша облачного дерева (remote_cache.py) против MockDiskServer:
+- цикл без изменений в облаке обходится одним запросом ревизии
+- при изменении облако перечисляется заново, а с prune=True — только папки
+  с изменившейся ревизией
+- кэш сохраняется в снимке состояния между запусками
+- собственные операции сбрасывают кэш, а локальные удаления не опираются на него,
+  даже если ревизия папки не отражает изменения внутри неё
+"""
+
+import pytest
+
+from disc_API import Yandex_disc
+from metrics import Metrics
+from remote_cache import RemoteCache
+from state import SyncState
+from sync import sync_cycle, sync_paths
+from tests.mock_server import MockDiskServer
+
+
+@pytest.fixture
+def server():
+    with MockDiskServer() as srv:
+        srv.add_file("backup/.keep", b"")
+        yield srv
+
+
+def _tree(root):
+    for folder in ("a", "b"):
+        (root / folder).mkdir(parents=True)
+        for i in range(3):
+            (root / folder / f"{folder}{i}.txt").write_text(f"{folder}{i}")
+    (root / "top.txt").write_text("top")
+    (root / ".keep").write_bytes(b"")
+
+
+def test_unchanged_cloud_costs_one_request(tmp_path, server):
+    root = tmp_path / "root"
+    _tree(root)
+    db = str(tmp_path / "state.db")
+    state = SyncState(db)
+    client = Yandex_disc("backup", "token", base_url=server.base_url, backoff=0.001)
+    cache = RemoteCache(state)
+    metrics = Metrics()
+
+    assert all(r.ok for r in sync_cycle(client, str(root), state=state, remote_cache=cache))
+    # Собственные загрузки меняют ревизию: следующий цикл перечисляет облако заново
+    assert sync_cycle(client, str(root), state=state, force=True, remote_cache=cache) == []
+
+    server.reset_counters()
+    assert sync_cycle(client, str(root), state=state, force=True, remote_cache=cache, metrics=metrics) == []
+    assert dict(server.calls) == {"GET /v1/disk": 1}
+    assert metrics.snapshot()["counters"]["remote_cache_total"] == [{"labels": {"result": "hit"}, "value": 1}]
+
+    # Изменение в облаке: облако перечисляется заново целиком
+    server.add_file("backup/b/extra.txt", b"extra")
+    server.reset_counters()
+    results = sync_cycle(client, str(root), state=state, force=True, remote_cache=cache)
+    assert [(r.action, r.path, r.ok) for r in results] == [("delete", "b/extra.txt", True)]
+    assert server.calls["GET /v1/disk/resources"] == 3
+    # Удалённый циклом файл сброшен из кэша
+    assert set(cache.files) == {".keep", "top.txt", "a/a0.txt", "a/a1.txt", "a/a2.txt",
+                                "b/b0.txt", "b/b1.txt", "b/b2.txt"}
+    sync_cycle(client, str(root), state=state, force=True, remote_cache=cache)
+    state.close()
+
+    # После перезапуска кэш читается из снимка
+    reopened = SyncState(db)
+    restored = RemoteCache(reopened)
+    assert restored.files == cache.files and restored.dirs == cache.dirs
+    server.reset_counters()
+    assert sync_cycle(client, str(root), state=reopened, force=True, remote_cache=restored) == []
+    assert dict(server.calls) == {"GET /v1/disk": 1}
+
+
+def test_cache_of_other_folder_is_discarded(tmp_path, server):
+    server.add_file("other/x.txt", b"x")
+    state = SyncState(str(tmp_path / "state.db"))
+    cache = RemoteCache(state)
+    cache.refresh(Yandex_disc("other", "token", base_url=server.base_url))
+    assert set(cache.files) == {"x.txt"}
+
+    files, _ = RemoteCache(state).refresh(Yandex_disc("backup", "token", base_url=server.base_url))
+    assert set(files) == {".keep"}
+    assert {row[0] for row in state.get_remote()} == {".keep"}
+
+
+def test_prune_lists_only_changed_folders(tmp_path, server):
+    root = tmp_path / "root"
+    _tree(root)
+    state = SyncState(str(tmp_path / "state.db"))
+    client = Yandex_disc("backup", "token", base_url=server.base_url, backoff=0.001)
+    cache = RemoteCache(state, prune=True)
+    sync_cycle(client, str(root), state=state, remote_cache=cache)
+    sync_cycle(client, str(root), state=state, force=True, remote_cache=cache)
+
+    # Перечисляются корень и изменившаяся папка, папка a берётся из кэша
+    server.add_file("backup/b/extra.txt", b"extra")
+    server.reset_counters()
+    results = sync_cycle(client, str(root), state=state, force=True, remote_cache=cache)
+    assert [(r.action, r.path, r.ok) for r in results] == [("delete", "b/extra.txt", True)]
+    assert server.calls["GET /v1/disk/resources"] == 2
+    assert "a/a0.txt" in cache.files
+
+
+@pytest.mark.parametrize("prune", [False, True])
+@pytest.mark.parametrize("two_way", [False, True])
+def test_own_uploads_with_non_propagating_revisions(tmp_path, server, prune, two_way):
+    server.propagate_revisions = False
+    root = tmp_path / "root"
+    _tree(root)
+    state = SyncState(str(tmp_path / "state.db"))
+    client = Yandex_disc("backup", "token", base_url=server.base_url, backoff=0.001)
+    cache = RemoteCache(state, prune=prune)
+    sync_cycle(client, str(root), state=state, two_way=two_way, remote_cache=cache)
+    assert sync_cycle(client, str(root), state=state, force=True, two_way=two_way, remote_cache=cache) == []
+
+    (root / "a" / "new.txt").write_text("new")
+    results = sync_cycle(client, str(root), state=state, force=True, two_way=two_way, remote_cache=cache)
+    assert [(r.action, r.path) for r in results] == [("load", "a/new.txt")]
+    # Ревизия папки a не изменилась, но собственная загрузка сбросила её в кэше
+    assert sync_cycle(client, str(root), state=state, force=True, two_way=two_way, remote_cache=cache) == []
+    assert (root / "a" / "new.txt").exists()
+    assert server.calls["PUT /upload"] == 1 + 6 + 1  # .keep, top.txt, a/*, b/* и a/new.txt
+
+
+def test_local_delete_is_confirmed_by_fresh_listing(tmp_path, server):
+    server.propagate_revisions = False
+    root = tmp_path / "root"
+    _tree(root)
+    state = SyncState(str(tmp_path / "state.db"))
+    client = Yandex_disc("backup", "token", base_url=server.base_url, backoff=0.001)
+    cache = RemoteCache(state, prune=True)
+    sync_cycle(client, str(root), state=state, two_way=True, remote_cache=cache)
+    sync_cycle(client, str(root), state=state, force=True, two_way=True, remote_cache=cache)
+
+    # Загрузка мимо кэша: по ревизии папки a её содержимое выглядит неизменным
+    (root / "a" / "side.txt").write_text("side")
+    assert [r.ok for r in sync_paths(client, str(root), ["a/side.txt"], state)] == [True]
+    results = sync_cycle(client, str(root), state=state, force=True, two_way=True, remote_cache=cache)
+    assert results == []
+    assert (root / "a" / "side.txt").read_text() == "side"
+    assert "a/side.txt" in cache.files
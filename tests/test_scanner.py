@@ -0,0 +1,44 @@
+"""
+Набор юнит-тестов для модуля scanner.py, проверяющий:
+- обход вложенных каталогов последовательно и в несколько потоков
+- обход поддерева с путями относительно корня
+- интерфейс отображения ScanResult
+"""
+
+import os
+
+from scanner import FileStat, ScanResult, scan_tree
+
+
+def _make_tree(root):
+    for d in range(3):
+        sub = root / f"d{d}" / "inner"
+        sub.mkdir(parents=True)
+        for f in range(4):
+            (sub / f"f{f}.txt").write_text("x" * f)
+    (root / "top.txt").write_text("top")
+
+
+def test_scan_tree_sequential_and_parallel_match(tmp_path):
+    _make_tree(tmp_path)
+    sequential = scan_tree(str(tmp_path))
+    parallel = scan_tree(str(tmp_path), workers=4)
+    assert len(sequential) == 13
+    assert dict(sequential.items()) == dict(parallel.items())
+    stat = os.stat(tmp_path / "d1" / "inner" / "f3.txt")
+    assert sequential[os.path.join("d1", "inner", "f3.txt")] == FileStat(3, stat.st_mtime_ns, stat.st_ino)
+
+
+def test_scan_tree_subtree_relative_to_root(tmp_path):
+    _make_tree(tmp_path)
+    result = scan_tree(str(tmp_path), start=str(tmp_path / "d2"))
+    assert set(result) == {os.path.join("d2", "inner", f"f{f}.txt") for f in range(4)}
+
+
+def test_scan_result_mapping():
+    result = ScanResult()
+    result.add("a.txt", 5, 10, 1)
+    assert "a.txt" in result and "b.txt" not in result
+    assert result.get("a.txt").mtime == 10 / 1e9
+    assert result.get("b.txt") is None
+    assert result.total_size() == 5
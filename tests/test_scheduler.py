@@ -0,0 +1,135 @@
+"""
+Набор юнит-тестов для модуля scheduler.py, проверяющий:
+- порядок выполнения по правилам приоритета
+- ограничение параллельности по видам операций
+- ограничение скорости TokenBucket
+- разбор параметров конфигурации
+- остановку: отмену не начатых заданий и ожидание начатых
+"""
+
+import threading
+import time
+
+import pytest
+
+from scheduler import SchedulerClosed, TokenBucket, TransferScheduler, parse_limits, parse_rules
+from sync import run_operations
+
+
+def test_small_and_recent_files_first():
+    scheduler = TransferScheduler(1, rules=("small", "recent"))
+    order = []
+    jobs = [("load", scheduler.priority(size, mtime), lambda name=name: order.append(name) or name)
+            for name, size, mtime in [("huge", 10**9, 5), ("old", 10, 1), ("new", 10, 9), ("mid", 500, 0)]]
+    assert scheduler.run(jobs) == ["huge", "old", "new", "mid"]
+    assert order == ["new", "old", "mid", "huge"]
+
+
+def test_limited_action_does_not_occupy_all_workers():
+    scheduler = TransferScheduler(3, limits={"delete": 1})
+    lock = threading.Lock()
+    running, peak = {"delete": 0, "load": 0}, {"delete": 0, "load": 0}
+    finished = []
+
+    def job(action):
+        with lock:
+            running[action] += 1
+            peak[action] = max(peak[action], running[action])
+        time.sleep(0.01)
+        with lock:
+            running[action] -= 1
+            finished.append(action)
+
+    jobs = [("delete", (0,), lambda: job("delete")) for _ in range(10)]
+    jobs += [("load", (100,), lambda: job("load")) for _ in range(3)]
+    scheduler.run(jobs)
+    assert peak["delete"] == 1
+    # Загрузки с худшим приоритетом не ждут окончания всех удалений
+    assert finished.index("load") < finished.index("delete", 5)
+
+
+def test_run_operations_uses_scheduler_priority():
+    order = []
+    operations = [("load", name, order.append, (name,)) for name in ("big", "small")]
+    sizes = {"big": (10**6, 0), "small": (10, 0)}
+    results = run_operations(operations, scheduler=TransferScheduler(1),
+                             info=lambda action, path: sizes[path])
+    assert order == ["small", "big"]
+    assert [r.path for r in results] == ["big", "small"]
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(100_000)
+    started = time.monotonic()
+    for _ in range(3):
+        bucket.consume(50_000)
+    # 150 КБ при 100 КБ/с и ведре на 100 КБ: не меньше 0.5 с ожидания
+    assert time.monotonic() - started >= 0.45
+
+
+def test_token_bucket_unlimited():
+    started = time.monotonic()
+    TokenBucket(0).consume(10**12)
+    assert time.monotonic() - started < 0.1
+
+
+def test_parse_config_values():
+    assert parse_rules("small, recent") == ("small", "recent")
+    assert parse_limits("delete:2, download : 4") == {"delete": 2, "download": 4}
+    with pytest.raises(ValueError):
+        parse_rules("smallest")
+    with pytest.raises(ValueError):
+        parse_limits("delete:0")
+
+
+def test_shared_scheduler_alternates_between_groups():
+    scheduler = TransferScheduler(1)
+    order = []
+    started = threading.Event()
+
+    def blocker():
+        started.wait()
+        order.append("a0")
+
+    big = [("load", (0,), blocker)] + [("load", (i,), lambda i=i: order.append(f"a{i}")) for i in range(1, 4)]
+    small = [("load", (0,), lambda i=i: order.append(f"b{i}")) for i in range(2)]
+    first = threading.Thread(target=scheduler.run, args=(big,), kwargs={"group": "a"})
+    first.start()
+    while not scheduler._running["load"]:
+        time.sleep(0.001)
+    second = threading.Thread(target=scheduler.run, args=(small,), kwargs={"group": "b"})
+    second.start()
+    time.sleep(0.05)
+    started.set()
+    first.join()
+    second.join()
+    scheduler.shutdown()
+    assert order == ["a0", "b0", "a1", "b1", "a2", "a3"]
+
+
+def test_shutdown_cancels_queued_and_keeps_finished():
+    scheduler = TransferScheduler(1)
+    started, release = threading.Event(), threading.Event()
+    done = []
+
+    def slow(path):
+        started.set()
+        release.wait()
+        done.append(path)
+
+    operations = [("load", "first", slow, ("first",))] + [("load", f"f{i}", done.append, (f"f{i}",))
+                                                           for i in range(3)]
+    results = []
+    runner = threading.Thread(target=lambda: results.extend(run_operations(operations, scheduler=scheduler)))
+    runner.start()
+    started.wait()
+    # Начатое задание не укладывается в срок, затем дорабатывает
+    assert scheduler.shutdown(timeout=0.05) is False
+    release.set()
+    runner.join()
+    assert done == ["first"]
+    assert [(r.path, r.ok) for r in results] == [("first", True), ("f0", False), ("f1", False), ("f2", False)]
+    assert results[1].error == "отменено при остановке"
+
+    with pytest.raises(SchedulerClosed):
+        scheduler.run([("load", (0,), lambda: None)])
@@ -0,0 +1,55 @@
+"""
+Набор юнит-тестов для класса SyncState, проверяющий:
+- сохранение снимка между открытиями базы
+- сравнение локального дерева со снимком
+- удаление записей
+- журнал операций и служебные значения
+"""
+
+from state import SyncState
+from sync import FileStat
+
+
+def test_state_persists_between_runs(tmp_path):
+    db = tmp_path / "state" / "state.db"
+    state = SyncState(str(db))
+    state.update([("a.txt", FileStat(1, 10, 100), "2025-07-01T00:00:00+00:00", "abc")])
+    state.close()
+
+    reopened = SyncState(str(db))
+    assert reopened.get("a.txt") == (1, 10, 100, "2025-07-01T00:00:00+00:00", "abc")
+    assert len(reopened) == 1
+
+
+def test_state_matches_detects_changes(tmp_path):
+    state = SyncState(str(tmp_path / "state.db"))
+    state.update([("a.txt", FileStat(1, 10, 100), None, None),
+                  ("b.txt", FileStat(2, 20, 200), None, None)])
+    local = {"a.txt": FileStat(1, 10, 100), "b.txt": FileStat(2, 20, 200)}
+    assert state.matches(local)
+    assert not state.matches({"a.txt": FileStat(1, 10, 100)})
+    assert not state.matches({"a.txt": FileStat(1, 11, 100), "b.txt": FileStat(2, 20, 200)})
+    assert not state.matches({"a.txt": FileStat(1, 10, 100), "c.txt": FileStat(2, 20, 200)})
+
+
+def test_state_remove(tmp_path):
+    state = SyncState(str(tmp_path / "state.db"))
+    state.update([("a.txt", FileStat(1, 10, 100), None, None)])
+    state.update(removed=["a.txt"])
+    assert "a.txt" not in state
+    assert len(SyncState(str(tmp_path / "state.db"))) == 0
+
+
+def test_journal_and_meta_survive_restart(tmp_path):
+    db = str(tmp_path / "state.db")
+    state = SyncState(db)
+    state.begin_operation("load", "a.txt")
+    state.begin_operation("delete", "old")
+    state.set_meta("cloud_folder", "backup")
+    state.close()
+
+    reopened = SyncState(db)
+    assert [(action, path) for action, path, _ in reopened.pending_operations()] == [("load", "a.txt"), ("delete", "old")]
+    assert reopened.get_meta("cloud_folder") == "backup" and reopened.get_meta("other") is None
+    reopened.clear_journal()
+    assert reopened.pending_operations() == []
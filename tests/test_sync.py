@@ -3,13 +3,21 @@
 - get_local_files: сбор локальных файлов с учётом вложенных каталогов
 - sync_cycle: корректная загрузка новых файлов, удаление удалённых в облаке,
   обновление при более поздней локальной версии и отсутствие действий, если
-  облачная версия новее.
+  облачная версия новее,
+- двусторонний режим: скачивание, удаление локальных копий и конфликты,
+- plan_cycle и apply_plan: план без побочных эффектов и его выполнение.
 
 """
 
+import hashlib
+import json
 import os
+import threading
 from datetime import datetime, timedelta
-from sync import get_local_files, sync_cycle
+from filters import PathFilter
+from scheduler import TransferScheduler
+from state import SyncState
+from sync import apply_plan, get_local_files, plan_cycle, sync_cycle, sync_paths, run_operations
 
 class DummyClient:
     def __init__(self, cloud_folder='backup', items=None):
@@ -17,11 +25,23 @@ class DummyClient:
         self.loaded = []
         self.reloaded = []
         self.deleted = []
+        self.created = []
+        self.moved = []
         self.items = items or []
 
     def get_info(self):
         return {'_embedded': {'items': self.items}}
 
+    def iter_items(self, flat=False):
+        self.listed = getattr(self, 'listed', 0) + 1
+        return iter(self.items)
+
+    def mkdir(self, remote):
+        self.created.append(remote)
+
+    def move(self, src, dst):
+        self.moved.append((src, dst))
+
     def load(self, local, remote):
         self.loaded.append((local, remote))
 
@@ -31,6 +51,12 @@ class DummyClient:
     def delete(self, remote):
         self.deleted.append(remote)
 
+    def download(self, remote, local, size=None, mtime=None):
+        self.downloaded = getattr(self, 'downloaded', []) + [remote]
+        os.makedirs(os.path.dirname(local), exist_ok=True)
+        with open(local, 'w') as f:
+            f.write(self.contents[remote])
+
 def test_get_local_files_nested(tmp_path):
     (tmp_path / "dir").mkdir()
     f1 = tmp_path / "file1.txt"
@@ -83,3 +109,358 @@ def test_sync_cycle_no_action_if_older(tmp_path):
     assert client.loaded == []
     assert client.deleted == []
     assert client.reloaded == []
+
+def test_sync_cycle_nested_creates_missing_dirs(tmp_path):
+    (tmp_path / "a" / "b").mkdir(parents=True)
+    (tmp_path / "a" / "b" / "new.txt").write_text("data")
+    (tmp_path / "a" / "c.txt").write_text("data")
+    client = DummyClient(items=[
+        {'path': 'disk:/backup/a', 'type': 'dir'},
+        {'path': 'disk:/backup/a/old.txt', 'type': 'file',
+         'modified': '2025-07-01T00:00:00+00:00'},
+    ])
+    sync_cycle(client, str(tmp_path))
+    assert client.created == ['a/b']
+    assert {remote for _, remote in client.loaded} == {'a/b/new.txt', 'a/c.txt'}
+    assert client.deleted == ['a/old.txt']
+
+def test_sync_cycle_keeps_folder_with_skipped_local_file(tmp_path):
+    (tmp_path / "d").mkdir()
+    (tmp_path / "d" / "f.bin").write_bytes(b"x" * 100)
+    client = DummyClient(items=[
+        {'path': 'disk:/backup/d/f.bin', 'modified': '2025-07-01T00:00:00+00:00', 'size': 100},
+        {'path': 'disk:/backup/d/g.txt', 'modified': '2025-07-01T00:00:00+00:00', 'size': 1},
+    ])
+    sync_cycle(client, str(tmp_path), path_filter=PathFilter(max_size=10))
+    # Папка d есть локально, хотя её единственный файл отложен по размеру
+    assert client.deleted == ['d/g.txt']
+
+def test_sync_cycle_keeps_folder_with_excluded_remote_file(tmp_path):
+    (tmp_path / "a.txt").write_text("a")
+    client = DummyClient(items=[
+        {'path': 'disk:/backup/d/x.tmp', 'modified': '2025-07-01T00:00:00+00:00', 'size': 1},
+        {'path': 'disk:/backup/d/g.txt', 'modified': '2025-07-01T00:00:00+00:00', 'size': 1},
+    ])
+    sync_cycle(client, str(tmp_path), path_filter=PathFilter(["*.tmp"]))
+    # Исключённый файл не синхронизируется ни в одну сторону и не удаляется вместе с папкой
+    assert client.deleted == ['d/g.txt']
+
+def test_sync_cycle_parallel_reports_failures(tmp_path):
+    for name in ("a.txt", "b.txt", "c.txt"):
+        (tmp_path / name).write_text("data")
+
+    class FailingClient(DummyClient):
+        def load(self, local, remote):
+            if remote == "b.txt":
+                raise OSError("boom")
+            if remote == "c.txt":
+                return False
+            return super().load(local, remote)
+
+    client = FailingClient()
+    results = sync_cycle(client, str(tmp_path), max_workers=3)
+    by_path = {r.path: r for r in results}
+    assert by_path["a.txt"].ok
+    assert not by_path["b.txt"].ok and "boom" in by_path["b.txt"].error
+    assert not by_path["c.txt"].ok
+    assert [remote for _, remote in client.loaded] == ["a.txt"]
+
+def test_run_operations_keeps_order():
+    ops = [("load", str(i), lambda i=i: i, ()) for i in range(10)]
+    results = run_operations(ops, max_workers=4)
+    assert [r.path for r in results] == [str(i) for i in range(10)]
+    assert all(r.ok for r in results)
+
+def test_sync_cycle_skips_listing_when_state_matches(tmp_path):
+    (tmp_path / "a.txt").write_text("data")
+    state = SyncState(str(tmp_path.parent / (tmp_path.name + ".db")))
+    client = DummyClient()
+    sync_cycle(client, str(tmp_path), state=state)
+    assert [remote for _, remote in client.loaded] == ["a.txt"]
+    assert "a.txt" in state
+
+    client.items = [{'path': 'disk:/backup/a.txt', 'modified': '2000-01-01T00:00:00+00:00'}]
+    assert sync_cycle(client, str(tmp_path), state=state) == []
+    assert client.listed == 1
+
+def test_sync_cycle_state_decides_reload(tmp_path):
+    f = tmp_path / "a.txt"
+    f.write_text("v1")
+    state = SyncState(str(tmp_path.parent / (tmp_path.name + ".db")))
+    future = (datetime.now() + timedelta(days=1)).isoformat() + "+00:00"
+    client = DummyClient(items=[{'path': 'disk:/backup/a.txt', 'modified': future}])
+    (tmp_path / "b.txt").write_text("new")
+    sync_cycle(client, str(tmp_path), state=state)
+    assert client.reloaded == []
+    assert "a.txt" in state
+
+    f.write_text("v2 longer")
+    sync_cycle(client, str(tmp_path), state=state)
+    assert [remote for _, remote in client.reloaded] == ["a.txt"]
+
+def test_sync_paths_incremental(tmp_path):
+    root = tmp_path / "root"
+    (root / "dir").mkdir(parents=True)
+    (root / "keep.txt").write_text("k")
+    (root / "edit.txt").write_text("v1")
+    (root / "gone.txt").write_text("x")
+    (root / "dir" / "a.txt").write_text("a")
+    (root / "dir" / "b.txt").write_text("b")
+    state = SyncState(str(tmp_path / "state.db"))
+    client = DummyClient()
+    sync_cycle(client, str(root), state=state)
+    assert len(state) == 5
+
+    client = DummyClient()
+    (root / "edit.txt").write_text("v2 longer")
+    (root / "gone.txt").unlink()
+    (root / "dir" / "a.txt").unlink()
+    (root / "dir" / "b.txt").unlink()
+    (root / "dir").rmdir()
+    (root / "fresh").mkdir()
+    (root / "fresh" / "n.txt").write_text("n")
+    results = sync_paths(client, str(root),
+                         {"edit.txt", "gone.txt", "dir", "dir/a.txt", "fresh", "fresh/n.txt"},
+                         state)
+    assert all(r.ok for r in results)
+    assert [remote for _, remote in client.reloaded] == ["edit.txt"]
+    assert [remote for _, remote in client.loaded] == ["fresh/n.txt"]
+    assert client.created == ["fresh"]
+    assert sorted(client.deleted) == ["dir", "gone.txt"]
+    assert sorted(p for p, _ in state.items()) == ["edit.txt", "fresh/n.txt", "keep.txt"]
+
+def test_sync_cycle_compares_md5(tmp_path):
+    (tmp_path / "touched.txt").write_text("same")
+    (tmp_path / "edited.txt").write_text("new!")
+    old = (datetime.now() - timedelta(days=1)).isoformat() + "+00:00"
+    client = DummyClient(items=[
+        {'path': 'disk:/backup/touched.txt', 'modified': old, 'size': 4,
+         'md5': hashlib.md5(b"same").hexdigest()},
+        {'path': 'disk:/backup/edited.txt', 'modified': old, 'size': 4,
+         'md5': hashlib.md5(b"old!").hexdigest()},
+    ])
+    sync_cycle(client, str(tmp_path))
+    assert [remote for _, remote in client.reloaded] == ["edited.txt"]
+
+def test_sync_cycle_detects_file_move_by_md5(tmp_path):
+    (tmp_path / "new").mkdir()
+    (tmp_path / "new" / "renamed.txt").write_text("content")
+    client = DummyClient(items=[
+        {'path': 'disk:/backup/old.txt', 'modified': '2025-07-01T00:00:00+00:00',
+         'size': 7, 'md5': hashlib.md5(b"content").hexdigest()},
+    ])
+    results = sync_cycle(client, str(tmp_path))
+    assert client.moved == [("old.txt", "new/renamed.txt")]
+    assert client.created == ["new"]
+    assert client.loaded == [] and client.deleted == []
+    assert [r.action for r in results] == ["move"]
+
+def test_sync_cycle_moves_whole_directory(tmp_path):
+    root = tmp_path / "root"
+    (root / "photos" / "2024").mkdir(parents=True)
+    items = [{'path': 'disk:/backup/album', 'type': 'dir'},
+             {'path': 'disk:/backup/album/2024', 'type': 'dir'}]
+    for name in ("a.jpg", "b.jpg", "2024/c.jpg"):
+        (root / "photos" / name).write_text(name)
+        items.append({'path': f'disk:/backup/album/{name}', 'type': 'file',
+                      'modified': '2025-07-01T00:00:00+00:00', 'size': len(name),
+                      'md5': hashlib.md5(name.encode()).hexdigest()})
+    state = SyncState(str(tmp_path / "state.db"))
+    client = DummyClient(items=items)
+    sync_cycle(client, str(root), state=state)
+    assert client.moved == [("album", "photos")]
+    assert client.loaded == [] and client.deleted == [] and client.created == []
+    assert sorted(p for p, _ in state.items()) == ["photos/2024/c.jpg", "photos/a.jpg", "photos/b.jpg"]
+
+def test_sync_paths_detects_rename_by_inode(tmp_path):
+    root = tmp_path / "root"
+    (root / "dir").mkdir(parents=True)
+    (root / "dir" / "a.txt").write_text("a")
+    (root / "dir" / "b.txt").write_text("b")
+    state = SyncState(str(tmp_path / "state.db"))
+    sync_cycle(DummyClient(), str(root), state=state)
+
+    (root / "dir").rename(root / "renamed")
+    client = DummyClient()
+    results = sync_paths(client, str(root), {"dir", "renamed"}, state)
+    assert all(r.ok for r in results)
+    assert client.moved == [("dir", "renamed")]
+    assert client.loaded == [] and client.reloaded == [] and client.deleted == []
+    assert sorted(p for p, _ in state.items()) == ["renamed/a.txt", "renamed/b.txt"]
+
+def test_sync_cycle_collapses_deletes_to_folder(tmp_path):
+    (tmp_path / "keep").mkdir()
+    (tmp_path / "keep" / "k.txt").write_text("k")
+    modified = '2025-07-01T00:00:00+00:00'
+    items = [{'path': 'disk:/backup/keep/k.txt', 'modified': modified},
+             {'path': 'disk:/backup/keep/gone.txt', 'modified': modified}]
+    items += [{'path': f'disk:/backup/build/{d}/{i}.o', 'modified': modified}
+              for d in ("x", "y") for i in range(50)]
+    client = DummyClient(items=items)
+    (tmp_path / "keep" / "k.txt").touch()
+    sync_cycle(client, str(tmp_path))
+    assert sorted(client.deleted) == ["build", "keep/gone.txt"]
+
+
+def _md5(text):
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+def test_sync_cycle_two_way_directions(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    (root / "kept.txt").write_text("same")
+    (root / "gone_remote.txt").write_text("bye")
+    state = SyncState(str(tmp_path / "state.db"))
+    client = DummyClient(items=[
+        {'path': 'disk:/backup/kept.txt', 'modified': '2025-07-01T00:00:00+00:00',
+         'md5': _md5("same"), 'size': 4},
+        {'path': 'disk:/backup/gone_remote.txt', 'modified': '2025-07-01T00:00:00+00:00',
+         'md5': _md5("bye"), 'size': 3},
+    ])
+    sync_cycle(client, str(root), state=state, two_way=True)
+    assert client.loaded == [] and client.reloaded == []
+
+    # В облаке: новый файл из веб-интерфейса, удалён gone_remote.txt
+    client.items = [client.items[0], {'path': 'disk:/backup/web/new.txt',
+                                      'modified': '2025-07-02T00:00:00+00:00',
+                                      'md5': _md5("web"), 'size': 3}]
+    client.contents = {'web/new.txt': 'web'}
+    results = sync_cycle(client, str(root), state=state, two_way=True)
+
+    assert sorted((r.action, r.path) for r in results) == [
+        ('delete_local', 'gone_remote.txt'), ('download', 'web/new.txt')]
+    assert client.deleted == []
+    assert not (root / "gone_remote.txt").exists()
+    assert (root / "web" / "new.txt").read_text() == "web"
+    assert state.is_unchanged('web/new.txt', get_local_files(str(root), str(root))['web/new.txt'])
+    assert 'gone_remote.txt' not in state
+
+
+def test_sync_cycle_two_way_remote_change_and_conflict(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    (root / "a.txt").write_text("a1")
+    (root / "b.txt").write_text("b1")
+    state = SyncState(str(tmp_path / "state.db"))
+    client = DummyClient(items=[
+        {'path': f'disk:/backup/{name}', 'modified': '2025-07-01T00:00:00+00:00',
+         'md5': _md5(text), 'size': 2} for name, text in (('a.txt', 'a1'), ('b.txt', 'b1'))
+    ])
+    sync_cycle(client, str(root), state=state, two_way=True)
+
+    # a.txt изменён только в облаке, b.txt — с обеих сторон
+    client.items = [
+        {'path': f'disk:/backup/{name}', 'modified': '2025-07-02T00:00:00+00:00',
+         'md5': _md5(text), 'size': 2} for name, text in (('a.txt', 'a2'), ('b.txt', 'b2'))
+    ]
+    client.contents = {'a.txt': 'a2', 'b.txt': 'b2'}
+    (root / "b.txt").write_text("b-local")
+    results = sync_cycle(client, str(root), state=state, two_way=True)
+
+    assert sorted((r.action, r.path) for r in results) == [('conflict', 'b.txt'), ('download', 'a.txt')]
+    assert client.reloaded == []
+    assert (root / "a.txt").read_text() == "a2"
+    assert (root / "b.txt").read_text() == "b2"
+    kept = [p for p in os.listdir(root) if p.startswith("b.conflict-")]
+    assert len(kept) == 1 and (root / kept[0]).read_text() == "b-local"
+
+    # Следующий цикл загружает сохранённую копию как новый файл
+    sync_cycle(client, str(root), state=state, two_way=True)
+    assert [remote for _, remote in client.loaded] == kept
+
+def test_sync_cycle_two_way_remote_change_without_baseline(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    (root / "a.txt").write_text("a1")
+    state = SyncState(str(tmp_path / "state.db"))
+    client = DummyClient()
+    sync_cycle(client, str(root), state=state, two_way=True)
+    # Клиент не сообщил md5 загрузки: облачная версия в снимке неизвестна
+    assert [remote for _, remote in client.loaded] == ['a.txt']
+
+    client.items = [{'path': 'disk:/backup/a.txt', 'modified': '2025-07-02T00:00:00+00:00',
+                     'md5': _md5('a2'), 'size': 2}]
+    client.contents = {'a.txt': 'a2'}
+    results = sync_cycle(client, str(root), state=state, two_way=True)
+    assert [(r.action, r.path) for r in results] == [('download', 'a.txt')]
+    assert (root / "a.txt").read_text() == "a2"
+
+    # Скачанная версия стала базовой: следующий цикл ничего не делает
+    assert sync_cycle(client, str(root), state=state, two_way=True) == []
+
+def test_plan_cycle_has_no_side_effects(tmp_path):
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "new.txt").write_text("hello")
+    (tmp_path / "renamed.txt").write_text("content")
+    client = DummyClient(items=[
+        {'path': 'disk:/backup/old.txt', 'modified': '2025-07-01T00:00:00+00:00',
+         'size': 7, 'md5': hashlib.md5(b"content").hexdigest()},
+        {'path': 'disk:/backup/gone.txt', 'modified': '2025-07-01T00:00:00+00:00', 'size': 100},
+    ])
+    plan = plan_cycle(client, str(tmp_path))
+    assert client.loaded == [] and client.deleted == [] and client.moved == [] and client.created == []
+
+    data = json.loads(json.dumps(plan.to_dict()))
+    assert data["mkdirs"] == ["docs"]
+    assert sorted((op["action"], op["path"], op["size"]) for op in data["operations"]) == [
+        ("delete", "gone.txt", 0), ("load", "docs/new.txt", 5), ("move", "renamed.txt", 0)]
+    assert data["totals"]["load"] == {"count": 1, "bytes": 5}
+    assert data["upload_bytes"] == 5 and data["download_bytes"] == 0
+    assert any("docs/new.txt" in line for line in plan.describe())
+
+    results = apply_plan(client, plan)
+    assert sorted((r.action, r.path) for r in results) == [
+        ("delete", "gone.txt"), ("load", "docs/new.txt"), ("move", "renamed.txt")]
+    assert client.moved == [("old.txt", "renamed.txt")] and client.created == ["docs"]
+
+def test_apply_plan_moves_are_cancelled_on_shutdown(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    items = []
+    for i in range(3):
+        (root / f"new{i}.txt").write_text(f"content {i}")
+        items.append({'path': f'disk:/backup/old{i}.txt', 'modified': '2025-07-01T00:00:00+00:00',
+                      'size': 9, 'md5': _md5(f"content {i}")})
+    started, release = threading.Event(), threading.Event()
+
+    class SlowMoveClient(DummyClient):
+        def move(self, src, dst):
+            started.set()
+            release.wait()
+            super().move(src, dst)
+
+    client = SlowMoveClient(items=items)
+    plan = plan_cycle(client, str(root))
+    scheduler = TransferScheduler(1)
+    results = []
+    runner = threading.Thread(target=lambda: results.extend(apply_plan(client, plan, scheduler=scheduler)))
+    runner.start()
+    started.wait()
+    try:
+        # Перемещения идут через общий планировщик: остановка отменяет ещё не начатые
+        assert scheduler.shutdown(timeout=0.05) is False
+    finally:
+        release.set()
+        runner.join()
+
+    assert len(client.moved) == 1
+    assert client.loaded == [] and client.deleted == []
+    cancelled = [r for r in results if not r.ok]
+    assert {r.error for r in cancelled} == {"отменено при остановке"}
+    assert sum(1 for r in results if r.action == "move" and r.ok) == 1
+
+def test_apply_plan_falls_back_when_move_fails(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    (root / "renamed.txt").write_text("content")
+    client = DummyClient(items=[
+        {'path': 'disk:/backup/old.txt', 'modified': '2025-07-01T00:00:00+00:00',
+         'size': 7, 'md5': hashlib.md5(b"content").hexdigest()},
+    ])
+    client.move = lambda src, dst: False
+    state = SyncState(str(tmp_path / "state.db"))
+    results = apply_plan(client, plan_cycle(client, str(root), state=state))
+    assert sorted((r.action, r.path, r.ok) for r in results) == [
+        ("delete", "old.txt", True), ("load", "renamed.txt", True), ("move", "renamed.txt", False)]
+    assert [p for p, _ in state.items()] == ["renamed.txt"]
@@ -0,0 +1,83 @@
+"""
+Набор юнит-тестов для модуля watcher.py, проверяющий:
+- DirtyQueue: объединение повторных событий, задержку выдачи и закрытие
+- InotifyWatcher: события во вложенных и новых каталогах (только Linux)
+- PollingWatcher: обнаружение изменений сравнением снимков
+"""
+
+import sys
+import threading
+import time
+
+import pytest
+
+from watcher import DirtyQueue, InotifyWatcher, PollingWatcher
+
+
+def _collect(queue, expected, timeout=5.0):
+    seen = set()
+    deadline = time.monotonic() + timeout
+    while not expected <= seen and time.monotonic() < deadline:
+        seen |= queue.get(timeout=0.2)
+    return seen
+
+
+def test_dirty_queue_coalesces_and_debounces():
+    queue = DirtyQueue(debounce=0.1)
+    queue.put("a.txt")
+    queue.put("a.txt")
+    queue.put("b.txt")
+    assert queue.get(timeout=0) == set()
+    assert queue.get(timeout=1) == {"a.txt", "b.txt"}
+    assert queue.get(timeout=0.05) == set()
+
+
+def test_dirty_queue_max_delay():
+    queue = DirtyQueue(debounce=10, max_delay=0.1)
+    queue.put("a.txt")
+    started = time.monotonic()
+    assert queue.get(timeout=2) == {"a.txt"}
+    assert time.monotonic() - started < 1
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify есть только в Linux")
+def test_inotify_watcher_tracks_new_dirs(tmp_path):
+    (tmp_path / "sub").mkdir()
+    queue = DirtyQueue(debounce=0.05)
+    watcher = InotifyWatcher(str(tmp_path), queue)
+    watcher.start()
+    try:
+        (tmp_path / "sub" / "a.txt").write_text("a")
+        assert "sub/a.txt" in _collect(queue, {"sub/a.txt"})
+        (tmp_path / "new").mkdir()
+        assert "new" in _collect(queue, {"new"})
+        (tmp_path / "new" / "b.txt").write_text("b")
+        assert "new/b.txt" in _collect(queue, {"new/b.txt"})
+    finally:
+        watcher.stop()
+
+
+def test_polling_watcher(tmp_path):
+    (tmp_path / "old.txt").write_text("a")
+    queue = DirtyQueue(debounce=0.05)
+    watcher = PollingWatcher(str(tmp_path), queue, interval=0.05)
+    watcher.start()
+    try:
+        (tmp_path / "new.txt").write_text("b")
+        (tmp_path / "old.txt").unlink()
+        assert _collect(queue, {"new.txt", "old.txt"}) == {"new.txt", "old.txt"}
+    finally:
+        watcher.stop()
+
+
+def test_dirty_queue_close_wakes_waiter():
+    queue = DirtyQueue()
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(queue.get()))
+    waiter.start()
+    time.sleep(0.05)
+    queue.close()
+    waiter.join(timeout=2)
+    assert result == [set()]
+    queue.put("a.txt")
+    assert queue.get(timeout=1) == set()
@@ -0,0 +1,278 @@
+"""
+Модуль watcher
+
+Отслеживает изменения в локальной папке и складывает относительные пути изменённых
+файлов и каталогов в очередь DirtyQueue:
+- InotifyWatcher — события ядра Linux через inotify (ctypes, без сторонних пакетов),
+- PollingWatcher — периодическое сравнение снимков дерева, запасной вариант для
+  других ОС и для случая, когда не хватает inotify-watch'ей.
+
+Очередь объединяет повторные события одного пути и отдаёт пачку только после
+паузы debounce, чтобы серия записей в файл превращалась в одну загрузку.
+На каталоги, исключённые фильтром (filters.PathFilter), watch не ставится.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+from sync import get_local_files
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR)
+
+_EVENT = struct.Struct("iIII")
+
+
+class DirtyQueue():
+    """
+    Потокобезопасное множество «грязных» путей с задержкой выдачи.
+
+    :param float debounce: сколько секунд тишины ждать перед выдачей пачки
+    :param float max_delay: максимальная задержка от первого события до выдачи,
+                            чтобы постоянно меняющийся файл не откладывал синхронизацию бесконечно
+    """
+
+    def __init__(self, debounce=0.5, max_delay=5.0):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._paths = set()
+        self._first = None
+        self._last = None
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def put(self, path):
+        """
+        Отмечает путь как изменённый. Пустая строка означает корень синхронизации.
+
+        :param str path: относительный путь файла или каталога
+        :return: None
+        """
+        with self._cond:
+            now = time.monotonic()
+            if not self._paths:
+                self._first = now
+            self._paths.add(path)
+            self._last = now
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """
+        Ждёт пачку изменений и забирает её из очереди.
+
+        :param float timeout: сколько секунд ждать; None — без ограничения
+        :return: множество относительных путей (пустое, если время вышло или очередь закрыта)
+        :rtype: Set[str]
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._closed:
+                now = time.monotonic()
+                if self._paths:
+                    ready_at = min(self._last + self.debounce, self._first + self.max_delay)
+                    if now >= ready_at:
+                        paths, self._paths = self._paths, set()
+                        return paths
+                    wait = ready_at - now
+                else:
+                    wait = None
+                if deadline is not None:
+                    if now >= deadline:
+                        return set()
+                    wait = deadline - now if wait is None else min(wait, deadline - now)
+                self._cond.wait(wait)
+            return set()
+
+    def close(self):
+        """
+        Закрывает очередь при завершении программы: ожидающий get сразу возвращает
+        пустое множество. Ещё не выданные пути не теряются — их найдёт обход дерева
+        при следующем запуске.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class InotifyWatcher(threading.Thread):
+    """
+    Рекурсивное наблюдение за деревом каталогов через inotify.
+
+    На каждый каталог ставится отдельный watch; новые каталоги подхватываются по
+    событиям IN_CREATE/IN_MOVED_TO. При переполнении очереди ядра в DirtyQueue
+    кладётся корень, что означает полную сверку.
+
+    :param str root: абсолютный путь к папке синхронизации
+    :param DirtyQueue queue: очередь, куда складываются изменённые пути
+    :param path_filter: filters.PathFilter или None; исключённые пути не отслеживаются
+    :raises OSError: если inotify недоступен или не хватает watch'ей (ENOSPC)
+    """
+
+    def __init__(self, root, queue, path_filter=None):
+        super().__init__(name="inotify-watcher", daemon=True)
+        self.root = root
+        self.queue = queue
+        self.path_filter = path_filter
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._dirs = {}
+        self._stopping = threading.Event()
+        try:
+            self._add_tree("")
+        except OSError:
+            os.close(self._fd)
+            raise
+        logging.info(f"inotify: наблюдение за {len(self._dirs)} каталогами в {root}")
+
+    def _add_tree(self, rel):
+        """Ставит watch на каталог rel и все его подкаталоги."""
+        stack = [rel]
+        while stack:
+            current = stack.pop()
+            full = os.path.join(self.root, current) if current else self.root
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(full), WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                    continue
+                raise OSError(err, f"inotify_add_watch {full}: {os.strerror(err)}")
+            self._dirs[wd] = current
+            try:
+                with os.scandir(full) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            child = os.path.join(current, entry.name) if current else entry.name
+                            if not (self.path_filter and self.path_filter.excludes_dir(child)):
+                                stack.append(child)
+            except OSError as exc:
+                logging.warning(f"Нет доступа к каталогу {full}: {exc}")
+
+    def run(self):
+        while not self._stopping.is_set():
+            ready, _, _ = select.select([self._fd], [], [], 1.0)
+            if not ready:
+                continue
+            try:
+                data = os.read(self._fd, 1024 * 1024)
+            except BlockingIOError:
+                continue
+            self._handle(data)
+
+    def _handle(self, data):
+        """Разбирает буфер событий inotify и отмечает изменённые пути."""
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                logging.warning("inotify: переполнение очереди событий, будет выполнена полная сверка")
+                self.queue.put("")
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            parent = self._dirs.get(wd)
+            if parent is None:
+                continue
+            rel = os.path.join(parent, name) if parent and name else (name or parent)
+            if rel and self.path_filter and (self.path_filter.excludes_remote(rel) or (
+                    mask & IN_ISDIR and self.path_filter.excludes_dir(rel))):
+                continue
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                try:
+                    self._add_tree(rel)
+                except OSError as exc:
+                    logging.warning(f"inotify: не удалось добавить {rel}: {exc}")
+                    self.queue.put("")
+                    continue
+            self.queue.put(rel)
+
+    def stop(self):
+        """Останавливает поток и закрывает дескриптор inotify."""
+        self._stopping.set()
+        self.join()
+        os.close(self._fd)
+
+
+class PollingWatcher(threading.Thread):
+    """
+    Запасной наблюдатель: раз в interval секунд сравнивает снимок дерева с предыдущим.
+
+    :param str root: абсолютный путь к папке синхронизации
+    :param DirtyQueue queue: очередь, куда складываются изменённые пути
+    :param float interval: период опроса в секундах
+    :param path_filter: filters.PathFilter или None; исключённые каталоги не обходятся
+    """
+
+    def __init__(self, root, queue, interval=2.0, path_filter=None):
+        super().__init__(name="polling-watcher", daemon=True)
+        self.root = root
+        self.queue = queue
+        self.interval = interval
+        self.path_filter = path_filter
+        self._stopping = threading.Event()
+        self._snapshot = get_local_files(root, root, path_filter=path_filter)
+
+    def run(self):
+        while not self._stopping.wait(self.interval):
+            current = get_local_files(self.root, self.root, path_filter=self.path_filter)
+            previous, self._snapshot = self._snapshot, current
+            for path, stat in current.items():
+                if previous.get(path) != stat:
+                    self.queue.put(path)
+            for path in previous.keys() - current.keys():
+                self.queue.put(path)
+
+    def stop(self):
+        """Останавливает поток опроса."""
+        self._stopping.set()
+        self.join()
+
+
+def start_watcher(root, queue, poll_interval=2.0, path_filter=None):
+    """
+    Запускает наблюдатель: inotify на Linux, иначе (или при ошибке) — опрос.
+
+    :param str root: абсолютный путь к папке синхронизации
+    :param DirtyQueue queue: очередь изменённых путей
+    :param float poll_interval: период опроса для запасного наблюдателя
+    :param path_filter: filters.PathFilter или None
+    :return: запущенный поток-наблюдатель с методом stop()
+    """
+    watcher = None
+    if sys.platform.startswith("linux"):
+        try:
+            watcher = InotifyWatcher(root, queue, path_filter)
+        except (OSError, AttributeError) as exc:
+            logging.warning(f"inotify недоступен ({exc}), используется опрос каждые {poll_interval} с")
+    if watcher is None:
+        watcher = PollingWatcher(root, queue, poll_interval, path_filter)
+    watcher.start()
+    return watcher